@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from src.core.hashing import dhash, hamming
+from src.core.preview import exif_datetime
+
+
+def exif_capture_time(img: Image.Image) -> Optional[float]:
+    """DateTimeOriginal (+ SubSecTimeOriginal) as a timestamp, from an opened image's header."""
+    try:
+        exif = img.getexif().get_ifd(0x8769)
+    except Exception:
+        return None
+    stamp = exif.get(0x9003)
+    return exif_datetime(stamp, exif.get(0x9291)) if stamp else None
+
+
+class BurstGrouper:
+    """
+    Groups crops of consecutive burst frames of the same bird.
+
+    A crop joins an open group of the same folder when it was captured
+    within `max_gap` seconds of the group's time span and its dHash is
+    within `max_distance` bits of the group's latest crop (so a bird that
+    slowly moves stays in its group). Frames may arrive slightly out of
+    capture order from the parallel stages, hence the span. Several birds
+    in one burst form parallel groups. A group closes when a later frame
+    of the folder is past the gap, when it has not grown for `max_wait_ms`,
+    when it reaches `max_size`, or at the end of input.
+
+    Crops carry 'captured_at' (EXIF seconds; the file mtime stands in when
+    unknown), 'crop' (PIL image) and optionally its 'crop_phash'.
+    """
+
+    def __init__(self, max_gap: float = 1.0, max_distance: int = 10,
+                 max_wait_ms: float = 1000, max_size: int = 60):
+        self.max_gap = max_gap
+        self.max_distance = max_distance
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_size = max(1, int(max_size))
+        self.groups: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _close(self, groups) -> List[List[Any]]:
+        for group in groups:
+            self.groups.remove(group)
+        return [group['items'] for group in groups]
+
+    def add(self, item) -> List[List[Any]]:
+        """Add a crop. Returns the groups that closed because of it."""
+        folder = os.path.dirname(item['entry'].path)
+        captured = item.get('captured_at')
+        if captured is None:
+            captured = item['entry'].mtime_ns / 1e9
+        item_hash = item.get('crop_phash')
+        if item_hash is None:
+            item_hash = dhash(item['crop'])
+        with self._lock:
+            same_folder = [g for g in self.groups if g['folder'] == folder]
+            # Time moved past these groups: the burst is over
+            closed = [g for g in same_folder if captured - g['last_time'] > self.max_gap]
+            best, best_distance = None, None
+            for group in same_folder:
+                if (group in closed or captured < group['first_time'] - self.max_gap
+                        or captured > group['last_time'] + self.max_gap):
+                    continue
+                distance = hamming(item_hash, group['hash'])
+                if distance <= self.max_distance and (best is None or distance < best_distance):
+                    best, best_distance = group, distance
+
+            if best is None:
+                best = {'folder': folder, 'items': []}
+                self.groups.append(best)
+            best['items'].append(item)
+            best['hash'] = item_hash
+            best['first_time'] = min(captured, best.get('first_time', captured))
+            best['last_time'] = max(captured, best.get('last_time', captured))
+            best['touched'] = time.monotonic()
+            if len(best['items']) >= self.max_size:
+                closed.append(best)
+            return self._close(closed)
+
+    def due(self, now: Optional[float] = None) -> List[List[Any]]:
+        """Groups that have not grown for max_wait_ms."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._close([g for g in self.groups if now - g['touched'] >= self.max_wait])
+
+    def drain(self) -> List[List[Any]]:
+        with self._lock:
+            return self._close(list(self.groups))
+
+    @staticmethod
+    def representative(group: List[Any]):
+        """The sharpest frame stands for the group; the others ride along as 'burst_members'."""
+        best = max(group, key=lambda item: item.get('sharpness') or 0.0)
+        best['burst_members'] = [item for item in group if item is not best]
+        if best['burst_members']:
+            logging.debug(f"Burst of {len(group)} frames: recognizing {best['entry'].name}")
+        return best
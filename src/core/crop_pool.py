@@ -0,0 +1,83 @@
+import io
+import os
+import logging
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+from PIL import Image
+
+from src.core.image import DecodedImage
+from src.core.processor import ImageProcessor
+
+
+def _crop_worker(shm_name: str, shape: Tuple[int, int, int], box: List[float],
+                 padding: int, target_size: int) -> Tuple[Tuple[int, int], bytes, bytes]:
+    """
+    Runs in a pool process: crop + LANCZOS resize + JPEG encode from the
+    shared pixel buffer. Returns (size, raw RGB bytes, JPEG bytes) of the crop.
+    """
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # does not hand ownership over: the parent still unlinks the block.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = DecodedImage(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+        crop = ImageProcessor._resize(image.crop(box, padding), target_size)
+        image.close()
+
+        buf = io.BytesIO()
+        crop.save(buf, format='JPEG', quality=95)
+        return crop.size, crop.tobytes(), buf.getvalue()
+    finally:
+        shm.close()
+
+
+class CropPool:
+    """
+    Process-pool backend for the crop stage.
+
+    Crop, resize and encode are CPU-bound and mostly hold the GIL, so with
+    threads they use about two cores. Here each box runs in a worker process
+    that attaches to the DecodedImage's shared-memory buffer by name; only
+    the box goes in and the (small) finished crop comes back.
+
+    Workers are started with 'spawn', which is safe next to the pipeline's
+    threads and the loaded models (unlike fork).
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = max(1, int(processes or os.cpu_count() or 1))
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        logging.info(f"Crop pool: {self.processes} worker processes")
+
+    def crop(self, image: DecodedImage, boxes: List[List[float]],
+             target_size: int = 640, padding: int = 10) -> List[Optional[Tuple[Image.Image, bytes]]]:
+        """
+        Crop every box of one decoded image in parallel.
+        Returns one (crop image, JPEG bytes) per box, or None where it failed.
+        """
+        if image.shm_name is None:
+            raise ValueError("CropPool needs a DecodedImage created with shared=True")
+
+        shape = image.pixels.shape
+        futures = [
+            self._executor.submit(_crop_worker, image.shm_name, shape, list(box), padding, target_size)
+            for box in boxes
+        ]
+
+        results = []
+        for future in futures:
+            try:
+                size, raw, jpeg = future.result()
+                results.append((Image.frombytes('RGB', size, raw), jpeg))
+            except Exception as e:
+                logging.error(f"Crop worker failed: {e}")
+                results.append(None)
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
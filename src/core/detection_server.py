@@ -0,0 +1,92 @@
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class DetectionServer:
+    """
+    Owner of the detector model(s).
+
+    Pipeline threads never call YOLO directly: they submit frames to one
+    request queue, and each replica (its own model instance, built by
+    `factory`) is served by exactly one thread. A replica that reloads its
+    model after an error only affects itself, and no model object is used
+    from two threads at once. Requests waiting in the queue are merged into
+    one forward pass of up to `max_batch_size` frames.
+
+    Same detect()/detect_batch() interface as BirdDetector, so it can stand
+    in for it.
+    """
+
+    def __init__(self, factory: Callable[[], Any], replicas: int = 1, max_batch_size: int = 8):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.requests: "queue.Queue" = queue.Queue()
+        self.replicas = [factory() for _ in range(max(1, int(replicas)))]
+        self.threads = [
+            threading.Thread(target=self._serve, args=(replica,), name=f"detector-{i}", daemon=True)
+            for i, replica in enumerate(self.replicas)
+        ]
+        for thread in self.threads:
+            thread.start()
+        if len(self.replicas) > 1:
+            logging.info(f"Detection server: {len(self.replicas)} replicas")
+
+    @property
+    def model_hash(self) -> str:
+        # All replicas load the same weights
+        return self.replicas[0].model_hash
+
+    def submit(self, images: List[Any]) -> Future:
+        """Queue frames for detection. The future resolves to one box list per frame."""
+        future = Future()
+        if not images:
+            future.set_result([])
+        else:
+            self.requests.put((list(images), future))
+        return future
+
+    def detect_batch(self, images: List[Any]):
+        return self.submit(images).result()
+
+    def detect(self, image):
+        return self.detect_batch([image])[0]
+
+    def _serve(self, detector):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch, count = [request], len(request[0])
+            # Merge whatever else is already waiting into the same forward pass
+            while count < self.max_batch_size:
+                try:
+                    pending = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    # Stop signal: leave it for after this batch
+                    self.requests.put(None)
+                    break
+                batch.append(pending)
+                count += len(pending[0])
+
+            images = [image for frames, _ in batch for image in frames]
+            try:
+                results = detector.detect_batch(images)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            pos = 0
+            for frames, future in batch:
+                future.set_result(results[pos:pos + len(frames)])
+                pos += len(frames)
+
+    def close(self):
+        """Stop the replica threads once the queued requests are served."""
+        for _ in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join()
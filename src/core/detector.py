@@ -1,15 +1,53 @@
 import yaml
 from ultralytics import YOLO
 import logging
+import hashlib
+import importlib.util
+import shutil
 from pathlib import Path
 import torch
 import os
+import numpy as np
+
+# Runtimes needed to export/run each exported backend
+BACKEND_MODULES = {
+    'onnx': ('onnx', 'onnxruntime'),
+    'openvino': ('openvino',),
+}
+
+def _iou(a, b) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
 
 class BirdDetector:
-    def __init__(self, model_path: str, confidence: float = 0.5, device: str = "auto"):
+    # YOLO input size: cascade windows are cut at this size from the detection input
+    TILE_SIZE = 640
+
+    def __init__(self, model_path: str, confidence: float = 0.5, device: str = "auto",
+                 backend: str = "torch", int8: bool = False, cache_dir: str = "data/models",
+                 cascade: bool = False, candidate_confidence: float = 0.1, max_tiles: int = 4):
         """
         Initialize the YOLOv8 bird detector.
+        backend: 'torch' (default), 'onnx', 'openvino', or 'auto' (ONNX Runtime on
+        CPU when installed, else torch). Exported models are cached in cache_dir,
+        keyed by the weights' hash and input size; the first run pays for the
+        export. int8 adds dynamic INT8 quantization (ONNX only).
+        cascade: after the normal pass, re-detect at native resolution in up to
+        max_tiles windows around weak candidates (score >= candidate_confidence).
         """
+        self.cascade = cascade
+        self.candidate_confidence = min(candidate_confidence, confidence)
+        self.max_tiles = max_tiles
+        if backend not in ('auto', 'torch') and backend not in BACKEND_MODULES:
+            raise ValueError(f"Unknown detector backend: {backend}")
+        self.backend = backend
+        self.int8 = int8
+        self.cache_dir = Path(cache_dir)
+        self._model_hash = None
         self.confidence = confidence
         self.bird_class_id = 14  # COCO class for 'bird'
         self.model_path = model_path  # Store for reloading
@@ -29,26 +67,106 @@ class BirdDetector:
         # Load model
         self._load_model()
 
-    def _load_model(self):
-        """Load or reload the YOLO model."""
+    def _load_torch_model(self):
         if not os.path.exists(self.model_path):
             logging.warning(f"YOLO model not found at {self.model_path}, downloading yolov8n.pt...")
-            self.model = YOLO("yolov8n.pt")
-        else:
-            self.model = YOLO(self.model_path)
+            return YOLO("yolov8n.pt")
+        return YOLO(self.model_path)
+
+    def _resolve_backend(self) -> str:
+        """Pick the runtime: exported backends are for CPU and need their packages installed."""
+        if self.backend == 'torch':
+            return 'torch'
+        if self.device != 'cpu':
+            if self.backend != 'auto':
+                logging.info(f"Detector backend '{self.backend}' is CPU only; using torch on {self.device}")
+            return 'torch'
+        backend = 'onnx' if self.backend == 'auto' else self.backend
+        missing = [m for m in BACKEND_MODULES[backend] if importlib.util.find_spec(m) is None]
+        if missing:
+            if self.backend != 'auto':
+                logging.warning(f"Detector backend '{backend}' needs {', '.join(missing)}; falling back to torch")
+            return 'torch'
+        return backend
+
+    def _load_model(self):
+        """Load or reload the YOLO model."""
+        self.active_backend = self._resolve_backend()
+        if self.active_backend != 'torch':
+            try:
+                self.model = YOLO(str(self._exported_model(self.active_backend)), task='detect')
+                logging.info(f"YOLO detector initialized on cpu ({self.active_backend})")
+                return
+            except Exception as e:
+                logging.warning(f"Detector backend '{self.active_backend}' unavailable ({e}); falling back to torch")
+                self.active_backend = 'torch'
+        self.model = self._load_torch_model()
         logging.info(f"YOLO detector initialized on {self.device}")
 
-    def detect(self, image_path: str):
+    def _weights_path(self) -> Path:
+        # Missing weights are replaced by the downloaded yolov8n.pt (see _load_torch_model)
+        weights = Path(self.model_path)
+        return weights if weights.exists() else Path("yolov8n.pt")
+
+    @property
+    def model_hash(self) -> str:
+        """Short sha256 of the torch weights: identifies the model in caches."""
+        if self._model_hash is None:
+            with open(self._weights_path(), 'rb') as f:
+                self._model_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+        return self._model_hash
+
+    def _exported_model(self, backend: str) -> Path:
         """
-        Detect birds in the image.
+        Export the torch weights for `backend` on first use and cache the result
+        as data/models/<stem>-<weights hash>-<imgsz>[-int8].onnx (or an OpenVINO
+        folder).
+        Later runs load the cached artifact directly.
         """
+        torch_model = None
+        weights = self._weights_path()
+        if not weights.exists():
+            torch_model = self._load_torch_model()
+            weights = Path(torch_model.ckpt_path)
+
+        stem = f"{weights.stem}-{self.model_hash}-{self.TILE_SIZE}"
+        if backend == 'onnx':
+            target = self.cache_dir / (f"{stem}-int8.onnx" if self.int8 else f"{stem}.onnx")
+        else:
+            # Ultralytics recognizes OpenVINO models by the folder suffix
+            target = self.cache_dir / f"{stem}_openvino_model"
+        if target.exists():
+            return target
+
+        logging.info(f"Exporting {weights.name} to {backend} (first use, cached in {self.cache_dir})...")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        torch_model = torch_model or YOLO(str(weights))
+        # Dynamic axes: detect_batch sends a varying number of frames
+        exported = Path(torch_model.export(format=backend, imgsz=self.TILE_SIZE, dynamic=True, device='cpu'))
+
+        if backend == 'onnx':
+            staging = target.with_name(target.name + '.tmp')
+            if self.int8:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(str(exported), str(staging), weight_type=QuantType.QUInt8)
+                exported.unlink()
+            else:
+                shutil.move(str(exported), str(staging))
+            os.replace(staging, target)
+        else:
+            if self.int8:
+                logging.info("INT8 quantization is only applied to the ONNX backend")
+            shutil.move(str(exported), str(target))
+        return target
+
+    def _predict(self, source, conf=None):
+        """
+        model.predict restricted to the bird class, with the reload/CPU fallbacks.
+        Raises when detection fails: an empty result would read as "no bird".
+        """
+        kwargs = dict(conf=conf or self.confidence, classes=[self.bird_class_id], verbose=False)
         try:
-            results = self.model.predict(
-                source=image_path,
-                conf=self.confidence,
-                verbose=False,
-                device=self.device
-            )
+            return self.model.predict(source=source, device=self.device, **kwargs)
         except Exception as e:
             error_str = str(e)
             # Handle model compatibility errors - reload model once
@@ -56,35 +174,98 @@ class BirdDetector:
                 if self.reload_count < 2:  # Limit reload attempts
                     self.reload_count += 1
                     self._load_model()
-                    results = self.model.predict(
-                        source=image_path,
-                        conf=self.confidence,
-                        verbose=False,
-                        device=self.device
-                    )
-                else:
-                    return []
+                    return self.model.predict(source=source, device=self.device, **kwargs)
+                raise
             elif "CUDA" in error_str and self.device != "cpu":
                 self.device = "cpu"
-                results = self.model.predict(
-                    source=image_path,
-                    conf=self.confidence,
-                    verbose=False,
-                    device="cpu"
-                )
-            else:
-                return []
-
-        bird_boxes = []
-        for result in results:
-            for box in result.boxes:
-                if int(box.cls) == self.bird_class_id:
-                    # Convert to list of floats [x1, y1, x2, y2]
-                    coords = box.xyxy[0].tolist()
-                    score = float(box.conf[0])
-                    bird_boxes.append((coords, score))
-
-        return bird_boxes
+                return self.model.predict(source=source, device="cpu", **kwargs)
+            raise
+
+    def _bird_boxes(self, result, conf=None):
+        """
+        One image's result as [([x1, y1, x2, y2], score), ...], highest score
+        first. Only bird boxes at or above the threshold are kept, whatever
+        the runtime returned (exported models do not all honour `classes`).
+        """
+        threshold = conf or self.confidence
+        boxes = [(coords, float(score)) for coords, score, cls in
+                 zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist(), result.boxes.cls.tolist())
+                 if int(cls) == self.bird_class_id and score >= threshold]
+        return sorted(boxes, key=lambda box: -box[1])
+
+    def detect(self, image_path):
+        """
+        Detect birds in the image.
+        image_path: file path, or an in-memory image (BGR numpy array / PIL.Image).
+        """
+        return self.detect_batch([image_path])[0]
+
+    def detect_batch(self, images):
+        """
+        Detect birds in several images with one forward pass.
+        images: list of file paths or in-memory images (BGR numpy arrays / PIL.Image).
+        Returns one box list per image, in input order; raises if detection fails.
+        Only the bird class goes through NMS, instead of all 80 COCO classes.
+        """
+        if not images:
+            return []
+        if self.cascade:
+            return self._detect_cascade(list(images))
+        results = self._predict(list(images))
+        return [self._bird_boxes(result) for result in results]
+
+    def _window(self, box, width, height):
+        """Square window (at least TILE_SIZE, twice the box) centred on box, shifted inside the image."""
+        size = int(max(self.TILE_SIZE, 2 * (box[2] - box[0]), 2 * (box[3] - box[1])))
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        x0 = int(min(max(0, cx - size / 2), max(0, width - size)))
+        y0 = int(min(max(0, cy - size / 2), max(0, height - size)))
+        return x0, y0, min(width, x0 + size), min(height, y0 + size)
+
+    def _detect_cascade(self, images):
+        """
+        Coarse-to-fine detection. The coarse pass sees every frame downscaled to
+        the model input and also keeps weak bird candidates. Only around those
+        candidates (small or distant birds the coarse pass was unsure about) are
+        windows cut at native resolution and detected again, in one batch.
+        Frames without candidates cost a single coarse pass.
+        """
+        coarse = self._predict(images, conf=self.candidate_confidence)
+
+        final, windows = [], []
+        for i, (image, result) in enumerate(zip(images, coarse)):
+            boxes = self._bird_boxes(result, self.candidate_confidence)
+            confident = [b for b in boxes if b[1] >= self.confidence]
+            final.append(confident)
+            if not isinstance(image, np.ndarray):
+                continue
+            height, width = image.shape[:2]
+            if max(width, height) < self.TILE_SIZE * 1.5:
+                # Coarse pass already ran at (near) native resolution
+                continue
+            candidates = [
+                box for box, score in boxes
+                if score < self.confidence and not any(_iou(box, c) > 0.3 for c, _ in confident)
+            ]
+            for box in candidates[:self.max_tiles]:
+                x0, y0, x1, y1 = self._window(box, width, height)
+                windows.append((i, x0, y0, np.ascontiguousarray(image[y0:y1, x0:x1])))
+
+        if windows:
+            fine = self._predict([tile for _, _, _, tile in windows])
+            for (i, x0, y0, _), result in zip(windows, fine):
+                for (x1, y1, x2, y2), score in self._bird_boxes(result):
+                    final[i].append(([x1 + x0, y1 + y0, x2 + x0, y2 + y0], score))
+        return [self._suppress(boxes) for boxes in final]
+
+    @staticmethod
+    def _suppress(boxes, iou_threshold: float = 0.5):
+        """Greedy NMS over coarse + window boxes, highest score first."""
+        kept = []
+        for box, score in sorted(boxes, key=lambda b: b[1], reverse=True):
+            if all(_iou(box, k) <= iou_threshold for k, _ in kept):
+                kept.append((box, score))
+        return kept
 
 if __name__ == "__main__":
     # Quick test if run directly
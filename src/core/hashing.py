@@ -0,0 +1,78 @@
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+
+def dhash(image: Union[Image.Image, np.ndarray], size: int = 8) -> int:
+    """
+    Difference hash: 64-bit fingerprint of the image's coarse gradients.
+    Robust to scaling, small shifts and exposure changes, so frames of the
+    same subject get hashes a few bits apart. Takes a PIL image or an
+    HxWx3 RGB array (e.g. DecodedImage.pixels, not copied).
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    small = image.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes under the Hamming distance: finds all
+    hashes within a radius without comparing against every stored one.
+    Each node keeps the items stored under its exact hash.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item: Any = None):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int, Any]]:
+        """(distance, hash, item) of every stored item within `radius` bits, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, node[0], item) for item in node[1])
+            # Triangle inequality: only subtrees at distance-radius..distance+radius can match
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+        found.sort(key=lambda f: f[0])
+        return found
+
+
+def same_capture(a: Optional[float], b: Optional[float]) -> bool:
+    """
+    Whether two EXIF capture times (seconds) may belong to the same frame:
+    equal to the millisecond, or unknown on either side. Keeps burst frames,
+    which look alike, from being taken for copies of each other.
+    """
+    return a is None or b is None or abs(a - b) < 0.001
@@ -0,0 +1,146 @@
+import io
+import logging
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image, ImageOps
+from typing import List, Optional, Tuple
+
+
+class DecodedImage:
+    """
+    A source frame decoded once and shared down the pipeline.
+
+    Detection, image size and every crop are taken from the same RGB pixel
+    buffer, so a photo with several birds is not decoded again per step.
+    EXIF orientation is applied at decode time, so detection boxes and crops
+    refer to the same (upright) coordinates.
+
+    With shared=True the buffer lives in a named shared-memory block, so
+    worker processes (see CropPool) can attach to it instead of receiving
+    a pickled copy.
+    """
+
+    def __init__(self, pixels: np.ndarray, shm: Optional[shared_memory.SharedMemory] = None):
+        # HxWx3 uint8, RGB
+        self.pixels = pixels
+        self._shm = shm
+
+    @staticmethod
+    def open(data: bytes) -> Image.Image:
+        """Open encoded bytes lazily (header only). Useful to size buffers before decoding."""
+        return Image.open(io.BytesIO(data))
+
+    # EXIF orientation -> transpose that makes the image upright
+    _ORIENTATION_TRANSPOSE = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }
+
+    @classmethod
+    def from_image(cls, img: Image.Image, shared: bool = False,
+                   orientation: Optional[int] = None) -> "DecodedImage":
+        """
+        Decode `img` to RGB. Orientation comes from the image's own EXIF unless
+        given (e.g. an embedded preview takes the orientation of its main image).
+        """
+        if orientation is None:
+            img = ImageOps.exif_transpose(img)
+        elif orientation in cls._ORIENTATION_TRANSPOSE:
+            img = img.transpose(cls._ORIENTATION_TRANSPOSE[orientation])
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if not shared:
+            return cls(np.asarray(img))
+
+        shape = (img.height, img.width, 3)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, img.width * img.height * 3))
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        pixels[...] = np.asarray(img)
+        return cls(pixels, shm)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, shared: bool = False) -> "DecodedImage":
+        with cls.open(data) as img:
+            return cls.from_image(img, shared)
+
+    @property
+    def shm_name(self) -> Optional[str]:
+        """Name of the shared-memory block holding the pixels, if any."""
+        return self._shm.name if self._shm is not None else None
+
+    @classmethod
+    def reduced(cls, img: Image.Image, min_size: int,
+                orientation: Optional[int] = None) -> "DecodedImage":
+        """
+        Decode at reduced resolution for detection. JPEGs use libjpeg DCT
+        scaling (1/2, 1/4 or 1/8, keeping both edges >= min_size), so the
+        full-resolution image is never materialized. Other formats decode
+        at full size. Call before the image has been loaded.
+        """
+        img.draft('RGB', (min_size, min_size))
+        return cls.from_image(img, orientation=orientation)
+
+    @staticmethod
+    def oriented_size(img: Image.Image, orientation: Optional[int] = None) -> Tuple[int, int]:
+        """Full-resolution (width, height) after EXIF orientation, from the header only."""
+        width, height = img.size
+        if orientation is None:
+            try:
+                orientation = img.getexif().get(0x0112, 1)
+            except Exception:
+                orientation = 1
+        # Orientations 5-8 are rotated by 90 degrees
+        return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+    @staticmethod
+    def estimate_nbytes(img: Image.Image) -> int:
+        """Size of the decoded RGB buffer for an opened (not yet loaded) image."""
+        width, height = img.size
+        return width * height * 3
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def nbytes(self) -> int:
+        return self.pixels.nbytes
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """BGR view (no copy) for OpenCV/YOLO, which expect BGR numpy input."""
+        return self.pixels[:, :, ::-1]
+
+    def crop(self, box: List[float], padding: int = 0) -> Image.Image:
+        """Cut a padded box [x1, y1, x2, y2] out of the shared buffer."""
+        x1, y1, x2, y2 = box
+        # Same rounding as PIL's Image.crop
+        x1 = int(round(max(0, x1 - padding)))
+        y1 = int(round(max(0, y1 - padding)))
+        x2 = int(round(min(self.width, x2 + padding)))
+        y2 = int(round(min(self.height, y2 + padding)))
+        return Image.fromarray(self.pixels[y1:y2, x1:x2])
+
+    def close(self):
+        self.pixels = None
+        if self._shm is not None:
+            shm, self._shm = self._shm, None
+            try:
+                shm.close()
+            except BufferError:
+                # A view is still alive somewhere; the block goes away with it
+                logging.debug(f"Shared pixel buffer {shm.name} still referenced at close")
+            shm.unlink()
@@ -12,7 +12,10 @@ class FileSystemManager:
         
         # Initialize Local Provider with security limits
         allowed = config.get('allowed_roots', [])
-        self.local_provider = LocalProvider(allowed_roots=allowed)
+        self.local_provider = LocalProvider(
+            allowed_roots=allowed,
+            scan_workers=config.get('scan_workers', 8)
+        )
 
     @classmethod
     def get_instance(cls, config: dict = None):
@@ -1,6 +1,8 @@
 import os
 import shutil
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Generator, Optional, List
 from .provider import StorageProvider, FileEntry
@@ -18,12 +20,15 @@ class LocalProvider(StorageProvider):
         '#snapshot' # Snapshots
     }
 
-    def __init__(self, allowed_roots: List[str] = None):
+    def __init__(self, allowed_roots: List[str] = None, scan_workers: int = 8):
         """
         allowed_roots: List of absolute paths that are allowed to be accessed.
                        If None, no restriction (use with caution).
+        scan_workers: Number of directories listed concurrently by recursive list_dir.
+                      Listing latency on NAS shares is dominated by round-trips.
         """
         self.allowed_roots = [Path(r).resolve() for r in allowed_roots] if allowed_roots else None
+        self.scan_workers = max(1, int(scan_workers))
 
     def _validate_path(self, path_str: str) -> Path:
         path = Path(path_str).resolve()
@@ -42,32 +47,66 @@ class LocalProvider(StorageProvider):
         if not p.exists() or not p.is_dir():
             return
 
-        # Use rglob for recursive, iterdir for non-recursive
-        iterator = p.rglob("*") if recursive else p.iterdir()
-        
-        for item in iterator:
-            try:
-                # Skip hidden files or system dirs if needed
-                if item.name.startswith('.'): continue
-                
-                # Check for ignored directories in path parts
-                # If any part of the relative path (from root p) matches an ignored dir, skip it
-                try:
-                    rel_parts = item.relative_to(p).parts
-                    if any(part in self.IGNORED_DIRS for part in rel_parts):
+        if not recursive:
+            entries, _ = self._scan_dir(str(p))
+            yield from entries
+            return
+
+        yield from self._walk(str(p))
+
+    def _scan_dir(self, dir_path: str):
+        """
+        List one directory with os.scandir.
+        Returns (entries, subdirs_to_descend). Ignored directories are pruned
+        here, so their contents are never listed.
+        """
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for item in it:
+                    if item.name in self.IGNORED_DIRS:
                         continue
-                except ValueError:
-                    pass # Should not happen usually
-                
-                yield FileEntry(
-                    path=str(item.absolute()),
-                    name=item.name,
-                    is_dir=item.is_dir(),
-                    size=item.stat().st_size if item.is_file() else 0
-                )
-            except PermissionError:
-                logging.warning(f"Permission denied accessing {item}")
-                continue
+                    try:
+                        is_dir = item.is_dir()
+                        # Like rglob: do not descend into symlinked directories
+                        if is_dir and not item.is_symlink():
+                            subdirs.append(item.path)
+
+                        # Skip hidden files or system dirs if needed
+                        if item.name.startswith('.'): continue
+
+                        # DirEntry caches stat (free on Windows, one call on POSIX)
+                        entries.append(FileEntry.from_stat(item.path, item.stat(), is_dir=is_dir, name=item.name))
+                    except OSError as e:
+                        logging.warning(f"Cannot stat {item.path}: {e}")
+        except PermissionError:
+            logging.warning(f"Permission denied accessing {dir_path}")
+        except OSError as e:
+            logging.warning(f"Failed to list {dir_path}: {e}")
+        return entries, subdirs
+
+    def _walk(self, root: str) -> Generator[FileEntry, None, None]:
+        """
+        Breadth-first walk that lists sibling directories concurrently on a
+        bounded thread pool. Results are yielded in submission order, so the
+        output order is deterministic for a given tree.
+        """
+        max_in_flight = self.scan_workers * 2
+        pool = ThreadPoolExecutor(max_workers=self.scan_workers, thread_name_prefix="scandir")
+        try:
+            pending = deque([pool.submit(self._scan_dir, root)])
+            backlog = deque()
+            while pending:
+                entries, subdirs = pending.popleft().result()
+                backlog.extend(subdirs)
+                # Keep the pool busy while the consumer handles this batch
+                while backlog and len(pending) < max_in_flight:
+                    pending.append(pool.submit(self._scan_dir, backlog.popleft()))
+                yield from entries
+        finally:
+            # Consumer may stop early; do not list the rest of the tree
+            pool.shutdown(wait=False, cancel_futures=True)
 
     def exists(self, path: str) -> bool:
         try:
@@ -80,6 +119,28 @@ class LocalProvider(StorageProvider):
         p = self._validate_path(path)
         return p.read_bytes()
 
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        p = self._validate_path(path)
+        fd = os.open(str(p), os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            if not hasattr(os, 'pread'):
+                # Windows has no pread
+                os.lseek(fd, offset, os.SEEK_SET)
+            # Short reads are legal (NFS/SMB, FUSE): keep reading until length or EOF
+            chunks, remaining = [], length
+            while remaining > 0:
+                if hasattr(os, 'pread'):
+                    chunk = os.pread(fd, remaining, offset + length - remaining)
+                else:
+                    chunk = os.read(fd, remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            return b''.join(chunks)
+        finally:
+            os.close(fd)
+
     def write_bytes(self, path: str, data: bytes):
         p = self._validate_path(path)
         p.parent.mkdir(parents=True, exist_ok=True)
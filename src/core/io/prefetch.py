@@ -0,0 +1,40 @@
+import threading
+
+
+class ByteBudget:
+    """
+    Counting semaphore over bytes. Bounds how much source data is held in
+    memory between the pipeline's read stage and the stage that releases it,
+    so reads run ahead of detection without unbounded memory use.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit = max(1, int(limit_bytes))
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, n: int) -> bool:
+        # A single file larger than the whole budget is still allowed alone
+        return self.used + n <= self.limit or self.used == 0
+
+    def try_acquire(self, n: int) -> bool:
+        with self._cond:
+            if self._fits(n):
+                self.used += n
+                return True
+            return False
+
+    def acquire(self, n: int):
+        with self._cond:
+            while not self._fits(n):
+                self._cond.wait()
+            self.used += n
+
+    def release(self, n: int):
+        with self._cond:
+            self.used = max(0, self.used - n)
+            self._cond.notify_all()
+
+
+# For reads that must not wait (e.g. downstream of the stage that fills a budget)
+ByteBudget.UNBOUNDED = ByteBudget(1 << 62)
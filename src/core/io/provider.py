@@ -5,11 +5,26 @@ import os
 
 class FileEntry:
     """Represents a file or directory in the VFS"""
-    def __init__(self, path: str, is_dir: bool, size: int = 0, name: str = ""):
+    def __init__(self, path: str, is_dir: bool, size: int = 0, name: str = "",
+                 mtime_ns: int = 0, inode: int = 0):
         self.path = path # Full path or URI
         self.name = name or os.path.basename(path)
         self.is_dir = is_dir
         self.size = size
+        self.mtime_ns = mtime_ns # Modification time (ns), 0 if unknown
+        self.inode = inode # Inode / file index, 0 if the backend has none
+
+    @classmethod
+    def from_stat(cls, path: str, st: os.stat_result, is_dir: bool = False, name: str = ""):
+        """Build an entry from an os.stat() result (e.g. a cached DirEntry.stat())"""
+        return cls(
+            path=path,
+            name=name,
+            is_dir=is_dir,
+            size=st.st_size if not is_dir else 0,
+            mtime_ns=st.st_mtime_ns,
+            inode=st.st_ino or 0
+        )
 
 class StorageProvider(ABC):
     """Abstract base class for storage backends (Local, SMB, WebDAV)"""
@@ -29,6 +44,14 @@ class StorageProvider(ABC):
         """Read file content as bytes"""
         pass
 
+    @abstractmethod
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        """
+        Read up to `length` bytes starting at `offset` without loading the
+        whole file. Returns fewer bytes if the range runs past EOF.
+        """
+        pass
+
     @abstractmethod
     def write_bytes(self, path: str, data: bytes):
         """Write bytes to file"""
@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .local import LocalProvider
+
+# Filesystem types that do not deliver inotify events for remote changes
+NETWORK_FS_TYPES = {
+    'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'davfs', 'fuse.sshfs',
+    'fuse.rclone', '9p', 'fuse.gvfsd-fuse'
+}
+
+def is_network_mount(path: str) -> bool:
+    """
+    Best-effort check (Linux only) whether `path` lives on a network mount,
+    by finding the longest matching mount point in /proc/self/mounts.
+    """
+    try:
+        with open('/proc/self/mounts', 'r', encoding='utf-8', errors='replace') as f:
+            mounts = [line.split()[:3] for line in f if line.strip()]
+    except OSError:
+        return False
+
+    target = os.path.realpath(path)
+    best_point, best_type = '', ''
+    for _, mount_point, fs_type in mounts:
+        # /proc/mounts escapes spaces as \040
+        mount_point = mount_point.replace('\\040', ' ')
+        if target == mount_point or target.startswith(mount_point.rstrip('/') + '/'):
+            if len(mount_point) > len(best_point):
+                best_point, best_type = mount_point, fs_type
+    return best_type in NETWORK_FS_TYPES
+
+
+class _InotifyBackend:
+    """Recursive inotify watch implemented with ctypes (no extra dependency)."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, roots: List[str], is_wanted: Callable[[str], bool]):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.is_wanted = is_wanted
+        self.roots = roots
+        self.wd_to_dir: Dict[int, str] = {}
+        self.initial: List[str] = []
+        for root in roots:
+            self._add_tree(root, emit_files=False)
+
+    def _add_watch(self, dir_path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.WATCH_MASK)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            logging.warning(f"Cannot watch {dir_path}: {os.strerror(err)}")
+            return
+        self.wd_to_dir[wd] = dir_path
+
+    def _add_tree(self, root: str, emit_files: bool) -> List[str]:
+        """Watch `root` and every sub-directory. Optionally return existing files."""
+        found = []
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            self._add_watch(current)
+            try:
+                with os.scandir(current) as it:
+                    for item in it:
+                        if item.name in LocalProvider.IGNORED_DIRS:
+                            continue
+                        if item.is_dir(follow_symlinks=False):
+                            stack.append(item.path)
+                        elif emit_files and self.is_wanted(item.path):
+                            found.append(item.path)
+            except OSError as e:
+                logging.warning(f"Cannot list {current}: {e}")
+        return found
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        """
+        Wait up to `timeout` seconds for events.
+        Returns (changed_files, overflowed). On overflow the caller should rescan.
+        """
+        changed = []
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, overflow
+
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed, overflow
+
+        offset = 0
+        header = struct.Struct('iIII')
+        while offset + header.size <= len(buf):
+            wd, mask, _cookie, name_len = header.unpack_from(buf, offset)
+            offset += header.size
+            name = buf[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+
+            if mask & self.IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & self.IN_IGNORED:
+                self.wd_to_dir.pop(wd, None)
+                continue
+
+            parent = self.wd_to_dir.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+
+            if mask & self.IN_ISDIR:
+                if os.path.basename(path) in LocalProvider.IGNORED_DIRS:
+                    continue
+                # New directory (created or moved in): watch it and pick up files
+                # that may have landed before the watch was in place
+                changed.extend(self._add_tree(path, emit_files=True))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                if self.is_wanted(path):
+                    changed.append(path)
+        return changed, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _PollingBackend:
+    """
+    Periodic scandir-diff for mounts that do not deliver events (SMB/NFS).
+    A changed file is reported once its (size, mtime) is stable across two
+    consecutive polls, so half-copied files are not picked up.
+    """
+
+    def __init__(self, roots: List[str], is_wanted: Callable[[str], bool],
+                 provider: LocalProvider, interval: float):
+        self.roots = roots
+        self.is_wanted = is_wanted
+        self.provider = provider
+        self.interval = interval
+        self.snapshot = self._take_snapshot()
+        self.unstable: Dict[str, Tuple[int, int]] = {}
+        self.next_poll = time.monotonic() + interval
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for entry in self.provider.list_dir(root, recursive=True):
+                if not entry.is_dir and self.is_wanted(entry.path):
+                    snapshot[entry.path] = (entry.size, entry.mtime_ns)
+        return snapshot
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        if time.monotonic() < self.next_poll:
+            return [], False
+        self.next_poll = time.monotonic() + self.interval
+
+        current = self._take_snapshot()
+        changed = []
+
+        # Files seen changing last time: report once they have settled
+        for path, stat in list(self.unstable.items()):
+            if current.get(path) == stat:
+                changed.append(path)
+            del self.unstable[path]
+
+        for path, stat in current.items():
+            if self.snapshot.get(path) != stat and path not in changed:
+                self.unstable[path] = stat
+
+        self.snapshot = current
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class DirectoryWatcher:
+    """
+    Watches source roots and hands debounced batches of new/modified files to
+    `on_batch`. Uses inotify on local Linux filesystems and a periodic
+    scandir-diff for network mounts or other platforms.
+
+    A batch is flushed once no new event arrived for `debounce_seconds`
+    (so a card dump becomes one batch), or after `max_batch_delay` seconds
+    even if events keep coming.
+    """
+
+    def __init__(self,
+                 roots: Iterable[str],
+                 on_batch: Callable[[List[str]], None],
+                 extensions: Tuple[str, ...] = ('.jpg', '.jpeg'),
+                 debounce_seconds: float = 5.0,
+                 max_batch_delay: float = 120.0,
+                 poll_interval: float = 60.0,
+                 backend: str = 'auto',
+                 provider: Optional[LocalProvider] = None):
+        self.roots = [str(r) for r in roots]
+        self.on_batch = on_batch
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.debounce_seconds = debounce_seconds
+        self.max_batch_delay = max_batch_delay
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.provider = provider or LocalProvider()
+
+        self.pending: Set[str] = set()
+        self.first_event = 0.0
+        self.last_event = 0.0
+
+    def _is_wanted(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not name.startswith('.') and name.lower().endswith(self.extensions)
+
+    def _create_backends(self):
+        if self.backend not in ('auto', 'inotify', 'poll'):
+            raise ValueError(f"Unknown watch backend: {self.backend}")
+
+        event_roots, poll_roots = [], []
+        for root in self.roots:
+            if self.backend == 'poll' or not sys.platform.startswith('linux'):
+                poll_roots.append(root)
+            elif self.backend == 'auto' and is_network_mount(root):
+                logging.info(f"Watch: {root} is a network mount, using periodic scan")
+                poll_roots.append(root)
+            else:
+                event_roots.append(root)
+
+        backends = []
+        if event_roots:
+            try:
+                backends.append(_InotifyBackend(event_roots, self._is_wanted))
+                logging.info(f"Watch: inotify on {len(event_roots)} root(s)")
+            except OSError as e:
+                logging.warning(f"inotify unavailable ({e}), falling back to periodic scan")
+                poll_roots.extend(event_roots)
+        if poll_roots:
+            backends.append(_PollingBackend(poll_roots, self._is_wanted, self.provider, self.poll_interval))
+            logging.info(f"Watch: polling {len(poll_roots)} root(s) every {self.poll_interval}s")
+        return backends
+
+    def _add(self, paths: List[str]):
+        if not paths:
+            return
+        now = time.monotonic()
+        if not self.pending:
+            self.first_event = now
+        self.last_event = now
+        self.pending.update(paths)
+
+    def _should_flush(self) -> bool:
+        if not self.pending:
+            return False
+        now = time.monotonic()
+        return (now - self.last_event >= self.debounce_seconds or
+                now - self.first_event >= self.max_batch_delay)
+
+    def _flush(self):
+        batch = sorted(self.pending)
+        self.pending = set()
+        logging.info(f"Watch: processing batch of {len(batch)} file(s)")
+        try:
+            self.on_batch(batch)
+        except Exception as e:
+            logging.error(f"Watch batch failed: {e}", exc_info=True)
+
+    def run(self, stop_event: Optional[threading.Event] = None):
+        """Block until `stop_event` is set, dispatching batches as they settle."""
+        stop_event = stop_event or threading.Event()
+        backends = self._create_backends()
+        tick = min(1.0, self.debounce_seconds) if self.debounce_seconds > 0 else 0.5
+        try:
+            while not stop_event.is_set():
+                for backend in backends:
+                    changed, overflow = backend.poll(tick if isinstance(backend, _InotifyBackend) else 0)
+                    if overflow:
+                        # Kernel queue overflowed: events were lost, rescan everything
+                        logging.warning("Watch: inotify queue overflow, rescanning roots")
+                        for root in backend.roots:
+                            changed.extend(backend._add_tree(root, emit_files=True))
+                    self._add(changed)
+
+                if not any(isinstance(b, _InotifyBackend) for b in backends):
+                    stop_event.wait(tick)
+
+                if self._should_flush():
+                    self._flush()
+        finally:
+            for backend in backends:
+                backend.close()
+            if self.pending and not stop_event.is_set():
+                self._flush()
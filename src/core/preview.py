@@ -0,0 +1,185 @@
+import struct
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Enough to cover SOI + APP1 (EXIF, max 64 KB) + APP2 (MPF) + SOF on camera JPEGs
+HEAD_BYTES = 256 * 1024
+
+# SOF markers carrying the frame size (excludes DHT/JPG/DAC at C4/C8/CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class JpegHeaderInfo:
+    """
+    What the header segments of a JPEG say about it, without decoding:
+    frame size (SOF), EXIF orientation and capture time, and the (offset,
+    length) in the file of every embedded preview JPEG (EXIF IFD1 thumbnail,
+    MPF preview images).
+    """
+
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.orientation = 1
+        self.captured_at: Optional[float] = None
+        self.previews: List[Tuple[int, int]] = []
+
+    @property
+    def oriented_size(self) -> Tuple[int, int]:
+        """Full-resolution size after EXIF orientation (5-8 are rotated by 90 degrees)."""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+    def largest_preview(self) -> Optional[Tuple[int, int]]:
+        return max(self.previews, key=lambda p: p[1]) if self.previews else None
+
+
+class _Tiff:
+    """Minimal TIFF/IFD reader over a byte buffer (offsets relative to `base`)."""
+
+    def __init__(self, data: bytes, base: int):
+        self.data = data
+        self.base = base
+        order = data[base:base + 2]
+        if order == b'II':
+            self.endian = '<'
+        elif order == b'MM':
+            self.endian = '>'
+        else:
+            raise ValueError("Not a TIFF header")
+        if self._unpack('H', 2) != 42:
+            raise ValueError("Bad TIFF magic")
+
+    def _unpack(self, fmt: str, offset: int):
+        return struct.unpack_from(self.endian + fmt, self.data, self.base + offset)[0]
+
+    @property
+    def first_ifd(self) -> int:
+        return self._unpack('I', 4)
+
+    def read_ifd(self, offset: int):
+        """Returns ({tag: (type, count, value_or_offset_field_offset)}, next_ifd_offset)."""
+        count = self._unpack('H', offset)
+        entries = {}
+        for i in range(count):
+            pos = offset + 2 + i * 12
+            tag = self._unpack('H', pos)
+            typ = self._unpack('H', pos + 2)
+            num = self._unpack('I', pos + 4)
+            entries[tag] = (typ, num, pos + 8)
+        next_ifd = self._unpack('I', offset + 2 + count * 12)
+        return entries, next_ifd
+
+    def value(self, entry) -> int:
+        """Scalar SHORT/LONG value of an IFD entry."""
+        typ, _, field = entry
+        return self._unpack('H', field) if typ == 3 else self._unpack('I', field)
+
+    def text(self, entry) -> str:
+        """ASCII value of an IFD entry (inline up to 4 bytes, else at the offset)."""
+        _, count, field = entry
+        start = self.base + (field if count <= 4 else self._unpack('I', field))
+        return self.data[start:start + count].decode('ascii', 'replace')
+
+
+def exif_datetime(stamp, subsec=None) -> Optional[float]:
+    """EXIF 'YYYY:MM:DD HH:MM:SS' (+ SubSec digits) as a timestamp, or None."""
+    try:
+        seconds = datetime.strptime(str(stamp).strip('\x00 '), "%Y:%m:%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return None
+    subsec = str(subsec or '').strip('\x00 ')
+    if subsec.isdigit():
+        seconds += int(subsec) / (10 ** len(subsec))
+    return seconds
+
+
+def tiff_capture_time(data: bytes, exif_ifd0: bool = False) -> Optional[float]:
+    """
+    DateTimeOriginal (+ SubSecTimeOriginal) of the TIFF structure starting at
+    data[0]: read from its Exif IFD, or from IFD0 itself when that is the
+    Exif IFD (exif_ifd0, e.g. the CMT2 box of CR3). None if absent.
+    """
+    tiff = _Tiff(data, 0)
+    ifd, _ = tiff.read_ifd(tiff.first_ifd)
+    if not exif_ifd0:
+        if 0x8769 not in ifd:
+            return None
+        ifd, _ = tiff.read_ifd(tiff.value(ifd[0x8769]))
+    if 0x9003 not in ifd:
+        return None
+    subsec = tiff.text(ifd[0x9291]) if 0x9291 in ifd else None
+    return exif_datetime(tiff.text(ifd[0x9003]), subsec)
+
+
+def _parse_exif(info: JpegHeaderInfo, data: bytes, base: int):
+    tiff = _Tiff(data, base)
+    ifd0, next_ifd = tiff.read_ifd(tiff.first_ifd)
+    if 0x0112 in ifd0:
+        info.orientation = tiff.value(ifd0[0x0112])
+    if 0x8769 in ifd0:
+        # Exif IFD: DateTimeOriginal + SubSecTimeOriginal
+        exif, _ = tiff.read_ifd(tiff.value(ifd0[0x8769]))
+        if 0x9003 in exif:
+            subsec = tiff.text(exif[0x9291]) if 0x9291 in exif else None
+            info.captured_at = exif_datetime(tiff.text(exif[0x9003]), subsec)
+    if next_ifd:
+        # IFD1: the EXIF thumbnail (JPEGInterchangeFormat / ...Length)
+        ifd1, _ = tiff.read_ifd(next_ifd)
+        if 0x0201 in ifd1 and 0x0202 in ifd1:
+            info.previews.append((base + tiff.value(ifd1[0x0201]), tiff.value(ifd1[0x0202])))
+
+
+def _parse_mpf(info: JpegHeaderInfo, data: bytes, base: int):
+    tiff = _Tiff(data, base)
+    index_ifd, _ = tiff.read_ifd(tiff.first_ifd)
+    if 0xB002 not in index_ifd:
+        return
+    _, size, field = index_ifd[0xB002]
+    entries_at = tiff._unpack('I', field)
+    # MP Entry: attribute, size, offset (from the MPF header), 2 dependent-image entries
+    for i in range(size // 16):
+        pos = entries_at + i * 16
+        length = tiff._unpack('I', pos + 4)
+        offset = tiff._unpack('I', pos + 8)
+        if offset:  # offset 0 is the primary image itself
+            info.previews.append((base + offset, length))
+
+
+def parse_jpeg_header(head: bytes) -> Optional[JpegHeaderInfo]:
+    """
+    Walk the marker segments in the first bytes of a JPEG up to the scan
+    (SOS) and collect size, orientation and embedded previews. Returns None
+    if `head` is not a JPEG. Malformed EXIF/MPF segments are ignored.
+    """
+    if head[:2] != b'\xff\xd8':
+        return None
+    info = JpegHeaderInfo()
+    pos = 2
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            break
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            break
+        length = struct.unpack_from('>H', head, pos + 2)[0]
+        start = pos + 4
+        try:
+            if marker == 0xE1 and head[start:start + 6] == b'Exif\x00\x00':
+                _parse_exif(info, head, start + 6)
+            elif marker == 0xE2 and head[start:start + 4] == b'MPF\x00':
+                _parse_mpf(info, head, start + 4)
+            elif marker in _SOF_MARKERS and start + 5 <= len(head):
+                info.height, info.width = struct.unpack_from('>HH', head, start + 1)
+        except (ValueError, struct.error):
+            pass
+        pos += 2 + length
+    return info
@@ -1,7 +1,7 @@
 from PIL import Image
 import logging
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 class ImageProcessor:
     @staticmethod
@@ -29,20 +29,45 @@ class ImageProcessor:
                 
                 # Crop
                 cropped = img.crop((x1, y1, x2, y2))
-                
-                # Resize (maintain aspect ratio and pad if necessary, or just resize to square?)
-                # Documentation says "缩放到目标尺寸（默认 640px）以供归档"
-                # We'll use thumbnail/resize while maintaining aspect ratio or force square
-                # BioCLIP usually expects 224x224, but YOLO/archiving might want larger.
-                # Let's resize so the long edge is target_size.
-                
-                cropped.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
-                
-                # Create directory if it doesn't exist
-                Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-                
-                cropped.save(output_path, quality=95)
+                ImageProcessor.save_crop(ImageProcessor._resize(cropped, target_size), output_path)
                 return True
         except Exception as e:
             logging.error(f"Failed to process image {image_path}: {e}")
             return False
+
+    @staticmethod
+    def crop_decoded(
+        image,
+        box: List[float],
+        target_size: int = 640,
+        padding: int = 10
+    ) -> Optional[Image.Image]:
+        """
+        Same as crop_and_resize, but cuts the crop from an already decoded
+        DecodedImage and keeps the result in memory (no temp file).
+        Use save_crop() to encode it once at its final location.
+        """
+        try:
+            return ImageProcessor._resize(image.crop(box, padding), target_size)
+        except Exception as e:
+            logging.error(f"Failed to crop decoded image: {e}")
+            return None
+
+    @staticmethod
+    def save_crop(cropped: Image.Image, output_path: str):
+        """Encode a crop at output_path (JPEG quality 95) (creating parent dirs)."""
+        # Create directory if it doesn't exist
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        
+        cropped.save(output_path, quality=95)
+
+    @staticmethod
+    def _resize(cropped: Image.Image, target_size: int) -> Image.Image:
+        # Resize (maintain aspect ratio and pad if necessary, or just resize to square?)
+        # Documentation says "缩放到目标尺寸（默认 640px）以供归档"
+        # We'll use thumbnail/resize while maintaining aspect ratio or force square
+        # BioCLIP usually expects 224x224, but YOLO/archiving might want larger.
+        # Let's resize so the long edge is target_size.
+        
+        cropped.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
+        return cropped
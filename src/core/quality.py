@@ -1,5 +1,8 @@
 import cv2
 import logging
+import numpy as np
+from typing import List
+from PIL import Image
 
 class QualityChecker:
     @staticmethod
@@ -26,3 +29,35 @@ class QualityChecker:
         """Check if the image is sharp enough based on a threshold."""
         score = QualityChecker.calculate_blur_score(image_path)
         return score >= threshold
+
+    @staticmethod
+    def sharpness_scores(crops: List[Image.Image]) -> List[float]:
+        """
+        Variance of Laplacian of several in-memory crops at once (same scale as
+        calculate_blur_score: 3x3 Laplacian of 8-bit luma). The crops are
+        zero-padded into one (N, H, W) array and the Laplacian and per-crop
+        variance are computed for the whole batch; a mask keeps the padding
+        out of each crop's statistics. Border pixels are not scored.
+        """
+        if not crops:
+            return []
+        grays = [np.asarray(crop.convert('L'), dtype=np.float32) for crop in crops]
+        height = max(g.shape[0] for g in grays)
+        width = max(g.shape[1] for g in grays)
+        if height < 3 or width < 3:
+            return [0.0] * len(crops)
+
+        batch = np.zeros((len(grays), height, width), dtype=np.float32)
+        mask = np.zeros((len(grays), height - 2, width - 2), dtype=bool)
+        for i, gray in enumerate(grays):
+            h, w = gray.shape
+            batch[i, :h, :w] = gray
+            mask[i, :max(0, h - 2), :max(0, w - 2)] = True
+
+        lap = (batch[:, :-2, 1:-1] + batch[:, 2:, 1:-1] + batch[:, 1:-1, :-2] + batch[:, 1:-1, 2:]
+               - 4 * batch[:, 1:-1, 1:-1])
+        lap = np.where(mask, lap, 0).astype(np.float64)
+        count = np.maximum(mask.sum(axis=(1, 2)), 1)
+        mean = lap.sum(axis=(1, 2)) / count
+        variance = (lap ** 2).sum(axis=(1, 2)) / count - mean ** 2
+        return [float(v) for v in variance]
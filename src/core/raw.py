@@ -0,0 +1,302 @@
+import struct
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from src.core.preview import HEAD_BYTES, parse_jpeg_header, tiff_capture_time
+
+# RAW containers whose embedded JPEGs are used instead of demosaicing
+RAW_EXTENSIONS = ('.cr3', '.nef', '.arw', '.raf')
+
+# How much of an embedded JPEG is read to learn its size (SOF)
+_JPEG_PROBE_BYTES = 64 * 1024
+
+# A largest preview whose long edge is below this share of the sensor's is "reduced"
+REDUCED_PREVIEW_RATIO = 0.75
+
+
+class EmbeddedJpeg:
+    """An embedded JPEG inside a RAW file: byte range plus pixel size (if probed)."""
+
+    def __init__(self, offset: int, length: int):
+        self.offset = offset
+        self.length = length
+        self.width = 0
+        self.height = 0
+
+    def __repr__(self):
+        return f"EmbeddedJpeg(offset={self.offset}, length={self.length}, size={self.width}x{self.height})"
+
+
+class RawPreviews:
+    """
+    The embedded JPEGs of a RAW file, its EXIF orientation (None when the
+    container does not say; then the JPEG's own EXIF applies), the sensor
+    size (width, height) if the container records it, and the EXIF capture
+    time (DateTimeOriginal + SubSecTimeOriginal, seconds) if found.
+    """
+
+    def __init__(self, jpegs: List[EmbeddedJpeg], orientation: Optional[int] = None,
+                 sensor_size: Optional[Tuple[int, int]] = None, captured_at: Optional[float] = None):
+        self.jpegs = [j for j in jpegs if j.width and j.height]
+        self.orientation = orientation
+        self.sensor_size = sensor_size
+        self.captured_at = captured_at
+
+    @property
+    def largest(self) -> Optional[EmbeddedJpeg]:
+        """The biggest preview: used as the full-resolution source for cropping."""
+        return max(self.jpegs, key=lambda j: j.width * j.height) if self.jpegs else None
+
+    def smallest_at_least(self, min_edge: int) -> Optional[EmbeddedJpeg]:
+        """The cheapest preview whose short edge is still >= min_edge (detection input)."""
+        usable = [j for j in self.jpegs if min(j.width, j.height) >= min_edge]
+        return min(usable, key=lambda j: j.width * j.height) if usable else None
+
+    @property
+    def reduced(self) -> bool:
+        """
+        True if even the largest preview is well below the sensor resolution
+        (e.g. ARW and RAF embed ~1616-1920 px JPEGs), so crops lose detail.
+        """
+        largest = self.largest
+        if largest is None or not self.sensor_size:
+            return False
+        return max(largest.width, largest.height) < REDUCED_PREVIEW_RATIO * max(self.sensor_size)
+
+
+class _RangeReader:
+    """Serves small reads from a cached head buffer, falling back to ranged reads."""
+
+    def __init__(self, read_range: Callable[[int, int], bytes], size: int):
+        self.read_range = read_range
+        self.size = size
+        self.head = read_range(0, min(size, HEAD_BYTES))
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < 0 or offset >= self.size:
+            raise ValueError(f"Offset {offset} outside file")
+        length = min(length, self.size - offset)
+        if offset + length <= len(self.head):
+            return self.head[offset:offset + length]
+        return self.read_range(offset, length)
+
+
+# (embedded JPEGs, orientation, sensor (width, height)) as found by a container parser
+_Parsed = Tuple[List[EmbeddedJpeg], Optional[int], Optional[Tuple[int, int]]]
+
+# --- TIFF based: NEF, ARW ---
+
+def _tiff_jpegs(reader: _RangeReader, base: int = 0) -> _Parsed:
+    header = reader.read(base, 8)
+    endian = {b'II': '<', b'MM': '>'}.get(header[:2])
+    if endian is None:
+        raise ValueError("Not a TIFF container")
+    first_ifd = struct.unpack(endian + 'I', header[4:8])[0]
+
+    jpegs, orientation, sensor_size = [], None, None
+    queue, seen = [first_ifd], set()
+    while queue and len(seen) < 32:
+        ifd = queue.pop(0)
+        if not ifd or ifd in seen:
+            continue
+        seen.add(ifd)
+        count = struct.unpack(endian + 'H', reader.read(base + ifd, 2))[0]
+        raw = reader.read(base + ifd + 2, count * 12 + 4)
+        tags = {}
+        for i in range(count):
+            tag, typ, num = struct.unpack_from(endian + 'HHI', raw, i * 12)
+            if typ == 3 and num == 1:
+                value = struct.unpack_from(endian + 'H', raw, i * 12 + 8)[0]
+            else:
+                value = struct.unpack_from(endian + 'I', raw, i * 12 + 8)[0]
+            tags[tag] = (typ, num, value)
+
+        if 0x0112 in tags and orientation is None:
+            orientation = tags[0x0112][2]
+        # Sensor size: ImageWidth / ImageLength of the raw data (JPEG-compressed IFDs are previews)
+        if 0x0100 in tags and 0x0101 in tags and tags.get(0x0103, (0, 0, 0))[2] not in (6, 7):
+            size = (tags[0x0100][2], tags[0x0101][2])
+            if sensor_size is None or size[0] * size[1] > sensor_size[0] * sensor_size[1]:
+                sensor_size = size
+        # JPEGInterchangeFormat / Length: preview or full-size JpgFromRaw
+        if 0x0201 in tags and 0x0202 in tags:
+            jpegs.append(EmbeddedJpeg(base + tags[0x0201][2], tags[0x0202][2]))
+        # Old-style JPEG compression stored as a single strip
+        if tags.get(0x0103, (0, 0, 0))[2] in (6, 7) and 0x0111 in tags and 0x0117 in tags:
+            if tags[0x0111][1] == 1 and tags[0x0117][1] == 1:
+                jpegs.append(EmbeddedJpeg(base + tags[0x0111][2], tags[0x0117][2]))
+        # SubIFDs (NEF keeps the full-size preview there)
+        if 0x014A in tags:
+            _, num, value = tags[0x014A]
+            if num == 1:
+                queue.append(value)
+            else:
+                offsets = reader.read(base + value, 4 * num)
+                queue.extend(struct.unpack(endian + 'I' * num, offsets))
+        next_ifd = struct.unpack_from(endian + 'I', raw, count * 12)[0]
+        queue.append(next_ifd)
+    return jpegs, orientation, sensor_size
+
+
+# --- ISO BMFF based: CR3 ---
+
+def _boxes(reader: _RangeReader, start: int, end: int):
+    """Yield (type, payload_start, box_end) for the boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack('>I4s', reader.read(pos, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', reader.read(pos + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        if kind == b'uuid':
+            header += 16
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find_box(reader, start, end, kind):
+    for k, payload, box_end in _boxes(reader, start, end):
+        if k == kind:
+            return payload, box_end
+    return None
+
+
+def _cr3_jpegs(reader: _RangeReader) -> _Parsed:
+    moov = _find_box(reader, 0, reader.size, b'moov')
+    if moov is None:
+        raise ValueError("CR3 without moov box")
+
+    jpegs, orientation = [], None
+    for kind, payload, box_end in _boxes(reader, *moov):
+        if kind == b'uuid':
+            # Canon metadata box: CMT1 is a TIFF IFD0 (holds the orientation)
+            cmt1 = _find_box(reader, payload, box_end, b'CMT1')
+            if cmt1 is not None:
+                try:
+                    _, orientation, _ = _tiff_jpegs(reader, cmt1[0])
+                except (ValueError, struct.error):
+                    pass
+        elif kind == b'trak' and not jpegs:
+            # First track is the full-size JPEG: one sample, located by stsz/co64
+            path = [b'mdia', b'minf', b'stbl']
+            box = (payload, box_end)
+            for name in path:
+                box = _find_box(reader, box[0], box[1], name)
+                if box is None:
+                    break
+            if box is None:
+                continue
+            stsz = _find_box(reader, box[0], box[1], b'stsz')
+            co64 = _find_box(reader, box[0], box[1], b'co64')
+            if stsz is None or co64 is None:
+                continue
+            sample_size, sample_count = struct.unpack('>II', reader.read(stsz[0] + 4, 8))
+            if sample_size == 0 and sample_count:
+                sample_size = struct.unpack('>I', reader.read(stsz[0] + 12, 4))[0]
+            entries = struct.unpack('>I', reader.read(co64[0] + 4, 4))[0]
+            if entries and sample_size:
+                offset = struct.unpack('>Q', reader.read(co64[0] + 8, 8))[0]
+                jpegs.append(EmbeddedJpeg(offset, sample_size))
+
+    # PRVW: ~1620x1080 preview inside a top-level uuid box
+    for kind, payload, box_end in _boxes(reader, 0, reader.size):
+        if kind == b'uuid':
+            prvw = _find_box(reader, payload + 8, box_end, b'PRVW')
+            if prvw is not None:
+                # PRVW payload: 6 unknown, width/height (2 each), 2 unknown, size (4), JPEG
+                length = struct.unpack('>I', reader.read(prvw[0] + 12, 4))[0]
+                jpegs.append(EmbeddedJpeg(prvw[0] + 16, length))
+    # The first track is already full size
+    return jpegs, orientation, None
+
+
+# --- RAF ---
+
+def _raf_sensor_size(reader: _RangeReader, offset: int, length: int) -> Optional[Tuple[int, int]]:
+    """RawImageFullSize (tag 0x100: height, width) from the RAF directory."""
+    if not offset or length < 4:
+        return None
+    directory = reader.read(offset, min(length, 4096))
+    count, pos = struct.unpack_from('>I', directory)[0], 4
+    for _ in range(count):
+        if pos + 4 > len(directory):
+            break
+        tag, size = struct.unpack_from('>HH', directory, pos)
+        if tag == 0x100 and size == 4 and pos + 8 <= len(directory):
+            height, width = struct.unpack_from('>HH', directory, pos + 4)
+            return width, height
+        pos += 4 + size
+    return None
+
+
+def _raf_jpegs(reader: _RangeReader) -> _Parsed:
+    header = reader.read(0, 100)
+    if not header.startswith(b'FUJIFILMCCD-RAW'):
+        raise ValueError("Not a RAF file")
+    offset, length = struct.unpack('>II', header[84:92])
+    sensor_size = None
+    if len(header) >= 100:
+        try:
+            sensor_size = _raf_sensor_size(reader, *struct.unpack('>II', header[92:100]))
+        except (ValueError, struct.error):
+            pass
+    # Orientation lives in the embedded JPEG's own EXIF
+    return [EmbeddedJpeg(offset, length)], None, sensor_size
+
+
+def _container_capture_time(reader: _RangeReader, extension: str) -> Optional[float]:
+    """EXIF capture time stored in the RAW container itself (RAF keeps it in the JPEG only)."""
+    try:
+        if extension in ('.nef', '.arw'):
+            return tiff_capture_time(reader.read(0, HEAD_BYTES))
+        if extension == '.cr3':
+            moov = _find_box(reader, 0, reader.size, b'moov')
+            for kind, payload, box_end in _boxes(reader, *moov) if moov else ():
+                if kind == b'uuid':
+                    # Canon metadata box: CMT2 is the Exif IFD
+                    cmt2 = _find_box(reader, payload, box_end, b'CMT2')
+                    if cmt2 is not None:
+                        return tiff_capture_time(reader.read(cmt2[0], cmt2[1] - cmt2[0]), exif_ifd0=True)
+    except (ValueError, IndexError, struct.error):
+        pass
+    return None
+
+
+def locate_raw_previews(read_range: Callable[[int, int], bytes], size: int, extension: str) -> Optional[RawPreviews]:
+    """
+    Find the embedded JPEGs of a RAW file using only small ranged reads
+    (container header plus the first bytes of each JPEG for its size).
+    Returns None if the format is unknown or nothing usable was found.
+    """
+    parsers = {'.nef': _tiff_jpegs, '.arw': _tiff_jpegs, '.cr3': _cr3_jpegs, '.raf': _raf_jpegs}
+    parser = parsers.get(extension.lower())
+    if parser is None:
+        return None
+    try:
+        reader = _RangeReader(read_range, size)
+        jpegs, orientation, sensor_size = parser(reader)
+    except (ValueError, struct.error) as e:
+        logging.warning(f"Cannot parse RAW container: {e}")
+        return None
+
+    captured_at = _container_capture_time(reader, extension.lower())
+    for jpeg in jpegs:
+        if jpeg.length <= 0 or jpeg.offset + jpeg.length > size:
+            continue
+        try:
+            info = parse_jpeg_header(reader.read(jpeg.offset, min(jpeg.length, _JPEG_PROBE_BYTES)))
+        except ValueError:
+            continue
+        if info is not None:
+            jpeg.width, jpeg.height = info.width, info.height
+            if captured_at is None:
+                # Otherwise from the preview's own EXIF (RAF, some ARW)
+                captured_at = info.captured_at
+
+    previews = RawPreviews(jpegs, orientation, sensor_size, captured_at)
+    return previews if previews.jpegs else None
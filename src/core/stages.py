@@ -0,0 +1,136 @@
+import queue
+import logging
+import threading
+from typing import Any, Callable, Iterable, List, Optional
+
+# End-of-stream marker passed between stage queues
+_EOS = object()
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    fn(item) returns an iterable of outputs for the next stage (empty/None to
+    drop the item, several outputs to fan out). `workers` threads run fn
+    concurrently, fed from a bounded queue of `queue_size` items so a slow
+    stage applies backpressure to the ones before it.
+
+    flush() is called once after the last item has gone through the stage
+    (e.g. to emit a partially filled batch). on_error(item, exc) is called
+    when fn raises, so resources held by the item can be released.
+
+    on_idle() is called whenever no item arrived for `idle_timeout` seconds,
+    and its outputs are passed on like fn's (e.g. time-based batch flushes).
+    """
+
+    def __init__(self,
+                 name: str,
+                 fn: Callable[[Any], Optional[Iterable[Any]]],
+                 workers: int = 1,
+                 queue_size: int = 16,
+                 flush: Optional[Callable[[], Optional[Iterable[Any]]]] = None,
+                 on_error: Optional[Callable[[Any, Exception], None]] = None,
+                 on_idle: Optional[Callable[[], Optional[Iterable[Any]]]] = None,
+                 idle_timeout: float = 0.1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.flush = flush
+        self.on_error = on_error
+        self.on_idle = on_idle
+        self.idle_timeout = idle_timeout
+        self.processed = 0
+
+
+class StagedPipeline:
+    """
+    Producer/consumer chain: source -> stage[0] -> stage[1] -> ... -> stage[n-1].
+    Each stage has its own worker threads and bounded input queue.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        self.stages = stages
+
+    def run(self, source: Iterable[Any]):
+        """Feed `source` into the first stage and block until every stage has drained."""
+        queues = [queue.Queue(maxsize=s.queue_size) for s in self.stages]
+        threads = []
+
+        for idx, stage in enumerate(self.stages):
+            in_q = queues[idx]
+            out_q = queues[idx + 1] if idx + 1 < len(queues) else None
+            next_workers = self.stages[idx + 1].workers if out_q is not None else 0
+            remaining = [stage.workers]
+            lock = threading.Lock()
+
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(stage, in_q, out_q, next_workers, remaining, lock),
+                    name=f"stage-{stage.name}-{n}",
+                    daemon=True
+                )
+                t.start()
+                threads.append(t)
+
+        try:
+            for item in source:
+                queues[0].put(item)
+        finally:
+            # Always shut the chain down, even if the source raised
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_EOS)
+            for t in threads:
+                t.join()
+
+    @staticmethod
+    def _emit(out_q, outputs):
+        if out_q is None or outputs is None:
+            return
+        for out in outputs:
+            out_q.put(out)
+
+    def _worker(self, stage: Stage, in_q, out_q, next_workers, remaining, lock):
+        while True:
+            if stage.on_idle is None:
+                item = in_q.get()
+            else:
+                try:
+                    item = in_q.get(timeout=stage.idle_timeout)
+                except queue.Empty:
+                    try:
+                        self._emit(out_q, stage.on_idle())
+                    except Exception as e:
+                        logging.error(f"Stage '{stage.name}' idle hook failed: {e}", exc_info=True)
+                    continue
+            if item is _EOS:
+                break
+            try:
+                self._emit(out_q, stage.fn(item))
+                stage.processed += 1
+            except Exception as e:
+                logging.error(f"Stage '{stage.name}' failed: {e}", exc_info=True)
+                if stage.on_error is not None:
+                    try:
+                        stage.on_error(item, e)
+                    except Exception:
+                        pass
+
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+
+        if last:
+            # Last worker out: flush leftovers, then close the next stage
+            if stage.flush is not None:
+                try:
+                    self._emit(out_q, stage.flush())
+                except Exception as e:
+                    logging.error(f"Stage '{stage.name}' flush failed: {e}", exc_info=True)
+            if out_q is not None:
+                for _ in range(next_workers):
+                    out_q.put(_EOS)
@@ -3,8 +3,16 @@ import subprocess
 import tempfile
 import shutil
 import os
+from pathlib import Path
 from typing import List, Dict, Any
 
+# Tags written to XMP sidecars under their XMP names
+XMP_EQUIVALENTS = {
+    'Keywords': 'XMP-dc:Subject',
+    'IPTC:Keywords': 'XMP-dc:Subject',
+    'UserComment': 'XMP-exif:UserComment',
+}
+
 class ExifWriter:
     def __init__(self, exiftool_path: str = "exiftool"):
         """
@@ -95,6 +103,24 @@ class ExifWriter:
                 except:
                     pass
 
+    @staticmethod
+    def sidecar_path(image_path: str) -> str:
+        """XMP sidecar next to the image, Adobe style: IMG_0001.CR3 -> IMG_0001.xmp"""
+        return str(Path(image_path).with_suffix('.xmp'))
+
+    def write_sidecar(self, image_path: str, tags: Dict[str, Any]):
+        """
+        Write tags to the image's XMP sidecar instead of the image itself
+        (RAW files). ExifTool creates the sidecar if it does not exist yet.
+        Tags without an XMP form (EXIF/XP*) are dropped.
+        """
+        xmp_tags = {}
+        for tag, value in tags.items():
+            tag = XMP_EQUIVALENTS.get(tag, tag)
+            if tag.upper().startswith('XMP'):
+                xmp_tags[tag] = value
+        return self.write_metadata(self.sidecar_path(image_path), xmp_tags)
+
     def rename_photo(self, current_path: str, new_name: str) -> str:
         """
         Rename/move the photo to a new filename in the same directory.
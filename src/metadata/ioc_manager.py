@@ -1,9 +1,33 @@
+import os
+import json
 import sqlite3
 import logging
+import functools
+import threading
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Optional
 
+from src.core.hashing import BKTree, same_capture
+
+# Bound parameters per statement: SQLite builds before 3.32 allow at most 999
+MAX_SQL_VARIABLES = 900
+
+
+def _chunks(values, size=MAX_SQL_VARIABLES):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _serialized(method):
+    """Run under the manager's lock: pipeline stage threads share one connection."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class IOCManager:
     def __init__(self, db_path: str):
         self.db_path = db_path
@@ -12,6 +36,8 @@ class IOCManager:
         db_file.parent.mkdir(parents=True, exist_ok=True)
         self.conn = sqlite3.connect(str(db_file), check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        # Statements and their commit must not interleave across threads
+        self.lock = threading.RLock()
         # Removed persistent self.cursor for thread safety
         self._init_db()
 
@@ -67,6 +93,86 @@ class IOCManager:
             )
         ''')
 
+        # Scan Manifest Table
+        # One row per source file seen by the pipeline. Lets re-runs skip
+        # unchanged files at stat time and re-attach moved/renamed files
+        # to their previous fingerprint without reading them again.
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS scan_manifest (
+                source_path TEXT PRIMARY KEY,
+                filename TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                file_hash TEXT,
+                state TEXT,
+                updated_at TEXT
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_manifest_stat ON scan_manifest(size, mtime_ns)')
+
+        # Directory Index Table
+        # Parsed folder dates + listing mtime per source directory, so date-range
+        # runs can jump to matching folders and only re-list changed ones.
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS dir_index (
+                path TEXT PRIMARY KEY,
+                source_root TEXT,
+                parent TEXT,
+                date_start TEXT,
+                date_end TEXT,
+                location_part TEXT,
+                mtime_ns INTEGER,
+                file_count INTEGER,
+                scanned_at TEXT
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_dir_root ON dir_index(source_root)')
+
+        # Run Journal Tables
+        # Write-ahead record of files in flight (queued -> detected -> cropped ->
+        # recognized -> archived), so an interrupted run can resume where it
+        # stopped. A file's row is removed once all of its crops are archived.
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS run_journal (
+                source_path TEXT PRIMARY KEY,
+                run_id TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                file_hash TEXT,
+                stage TEXT,
+                detections_json TEXT,
+                updated_at TEXT
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS run_journal_crops (
+                source_path TEXT,
+                detection_index INTEGER,
+                stage TEXT,
+                results_json TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (source_path, detection_index)
+            )
+        ''')
+
+        # Detection Cache Table
+        # YOLO boxes per file content and detector settings: re-classifying
+        # or re-archiving the corpus skips detection. No-bird files are
+        # cached too (empty list).
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS detection_cache (
+                file_hash TEXT,
+                model_hash TEXT,
+                confidence REAL,
+                detections_json TEXT,
+                width INTEGER,
+                height INTEGER,
+                created_at TEXT,
+                PRIMARY KEY (file_hash, model_hash, confidence)
+            )
+        ''')
+
         # Migration - Photos table
         try:
             self.conn.execute("SELECT file_hash, original_path, candidates_json FROM photos LIMIT 1")
@@ -89,6 +195,46 @@ class IOCManager:
             try: self.conn.execute("ALTER TABLE photos ADD COLUMN web_raw_path TEXT")
             except: pass
 
+        # Migration - Add sharpness (variance of Laplacian of the crop)
+        try:
+            self.conn.execute("SELECT sharpness FROM photos LIMIT 1")
+        except sqlite3.OperationalError:
+            logging.info("Migrating database: Adding sharpness column to photos...")
+            try: self.conn.execute("ALTER TABLE photos ADD COLUMN sharpness REAL")
+            except: pass
+
+        # Migration - Perceptual hashes of source and crop (near-duplicate lookup), EXIF capture time
+        try:
+            self.conn.execute("SELECT source_phash, crop_phash, captured_at FROM photos LIMIT 1")
+        except sqlite3.OperationalError:
+            logging.info("Migrating database: Adding perceptual hash columns to photos...")
+            try: self.conn.execute("ALTER TABLE photos ADD COLUMN source_phash TEXT")
+            except: pass
+            try: self.conn.execute("ALTER TABLE photos ADD COLUMN crop_phash TEXT")
+            except: pass
+            try: self.conn.execute("ALTER TABLE photos ADD COLUMN captured_at REAL")
+            except: pass
+
+        # Migration - Scan manifest (add source_dir for per-directory listings)
+        try:
+            self.conn.execute("SELECT source_dir FROM scan_manifest LIMIT 1")
+        except sqlite3.OperationalError:
+            logging.info("Migrating database: Adding source_dir to scan_manifest...")
+            self.conn.execute("ALTER TABLE scan_manifest ADD COLUMN source_dir TEXT")
+            rows = self.conn.execute("SELECT source_path FROM scan_manifest").fetchall()
+            self.conn.executemany(
+                "UPDATE scan_manifest SET source_dir = ? WHERE source_path = ?",
+                [(os.path.dirname(r[0]), r[0]) for r in rows])
+            self.conn.commit()
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_manifest_dir ON scan_manifest(source_dir)')
+
+        # Migration - Scan manifest (detector settings behind a 'no_bird' verdict)
+        try:
+            self.conn.execute("SELECT detect_key FROM scan_manifest LIMIT 1")
+        except sqlite3.OperationalError:
+            logging.info("Migrating database: Adding detect_key to scan_manifest...")
+            self.conn.execute("ALTER TABLE scan_manifest ADD COLUMN detect_key TEXT")
+
         # Migration - Taxonomy table (add genus, family_sci, order_sci, english_name)
         try:
             self.conn.execute("SELECT genus_cn, genus_sci, family_sci, order_sci, english_name FROM taxonomy LIMIT 1")
@@ -283,6 +429,7 @@ class IOCManager:
         except Exception as e:
             logging.error(f"Failed to import Excel: {e}")
 
+    @_serialized
     def get_bird_info(self, scientific_name: str) -> Optional[Dict]:
         cursor = self.conn.execute("SELECT * FROM taxonomy WHERE scientific_name=?", (scientific_name,))
         row = cursor.fetchone()
@@ -567,11 +714,78 @@ class IOCManager:
 
         return results[:limit]
 
+    @_serialized
     def check_hash_exists(self, file_hash: str) -> bool:
         if not file_hash: return False
         cursor = self.conn.execute("SELECT 1 FROM photos WHERE file_hash = ? LIMIT 1", (file_hash,))
         return cursor.fetchone() is not None
 
+    @_serialized
+    def get_source_hashes(self) -> List[Dict]:
+        """Perceptual hash and EXIF capture time of every archived source (one row per source)."""
+        cursor = self.conn.execute('''
+            SELECT original_path, source_phash, MAX(captured_at) AS captured_at
+            FROM photos WHERE source_phash IS NOT NULL
+            GROUP BY original_path, source_phash
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+    @_serialized
+    def find_near_duplicates(self, max_distance: int = 4) -> List[List[int]]:
+        """
+        Groups of photo ids whose sources are near-duplicates: source hashes
+        within `max_distance` bits and, where both are known, the same capture
+        time (burst frames are not duplicates). Crops of one source are not
+        duplicates of each other, so a group spans at least two sources.
+        """
+        sources = self.get_source_hashes()
+        tree = BKTree()
+        for i, source in enumerate(sources):
+            tree.add(int(source['source_phash'], 16), i)
+
+        # Union-find over the sources; a group keeps the capture time of its dated
+        # members, so an undated copy does not chain two burst frames together
+        parent = list(range(len(sources)))
+        captured = [source['captured_at'] for source in sources]
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for i, source in enumerate(sources):
+            for _, _, j in tree.search(int(source['source_phash'], 16), max_distance):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j and same_capture(captured[root_i], captured[root_j]):
+                    parent[root_j] = root_i
+                    if captured[root_i] is None:
+                        captured[root_i] = captured[root_j]
+
+        members = {}
+        for i, source in enumerate(sources):
+            members.setdefault(find(i), set()).add(source['original_path'])
+        groups = []
+        for paths in members.values():
+            if len(paths) < 2:
+                continue
+            ids = []
+            for chunk in _chunks(paths):
+                placeholders = ', '.join(['?'] * len(chunk))
+                ids.extend(row[0] for row in self.conn.execute(
+                    f"SELECT id FROM photos WHERE original_path IN ({placeholders})", chunk))
+            groups.append(sorted(ids))
+        return groups
+
+    @_serialized
+    def get_photos(self, ids: List[int]) -> List[Dict]:
+        """Photo rows for `ids`, ordered by id (any number of ids)."""
+        rows = []
+        for chunk in _chunks(ids):
+            placeholders = ', '.join(['?'] * len(chunk))
+            rows.extend(dict(row) for row in self.conn.execute(
+                f"SELECT * FROM photos WHERE id IN ({placeholders})", chunk))
+        return sorted(rows, key=lambda row: row['id'])
+
+    @_serialized
     def add_photo_record(self, record: Dict):
         keys = ', '.join(record.keys())
         placeholders = ', '.join(['?'] * len(record))
@@ -582,6 +796,7 @@ class IOCManager:
         self.conn.commit()
         return cursor.lastrowid
         
+    @_serialized
     def update_photo_species(self, photo_id: int, scientific_name: str, chinese_name: str):
         self.conn.execute('''
             UPDATE photos 
@@ -590,14 +805,291 @@ class IOCManager:
         ''', (scientific_name, chinese_name, photo_id))
         self.conn.commit()
 
-    def add_scan_history(self, record: Dict):
+    # --- Scan Manifest ---
+
+    # Manifest states that mean "nothing left to do for this file"
+    MANIFEST_DONE_STATES = ('archived', 'no_bird', 'duplicate')
+
+    @_serialized
+    def get_manifest_entry(self, source_path: str) -> Optional[Dict]:
+        cursor = self.conn.execute("SELECT * FROM scan_manifest WHERE source_path = ?", (source_path,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    @_serialized
+    def find_manifest_match(self, size: int, mtime_ns: int, inode: int = 0, filename: str = None) -> Optional[Dict]:
+        """
+        Find a manifest row for a file that was moved or renamed.
+        Matches on (size, mtime_ns, inode) when the backend reports inodes,
+        otherwise on (size, mtime_ns, filename).
+        """
+        if not size or not mtime_ns:
+            return None
+        if inode:
+            cursor = self.conn.execute(
+                "SELECT * FROM scan_manifest WHERE size = ? AND mtime_ns = ? AND inode = ? LIMIT 1",
+                (size, mtime_ns, inode))
+        elif filename:
+            cursor = self.conn.execute(
+                "SELECT * FROM scan_manifest WHERE size = ? AND mtime_ns = ? AND filename = ? LIMIT 1",
+                (size, mtime_ns, filename))
+        else:
+            return None
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    @_serialized
+    def upsert_manifest(self, source_path: str, size: int, mtime_ns: int, inode: int = 0,
+                        file_hash: str = None, state: str = 'pending'):
+        self.conn.execute('''
+            INSERT OR REPLACE INTO scan_manifest
+            (source_path, source_dir, filename, size, mtime_ns, inode, file_hash, state, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', (source_path, os.path.dirname(source_path), Path(source_path).name,
+              size, mtime_ns, inode, file_hash, state))
+        self.conn.commit()
+
+    @_serialized
+    def relink_manifest(self, old_path: str, new_path: str):
+        """Point an existing manifest row at the file's new location."""
+        self.conn.execute('''
+            UPDATE scan_manifest
+            SET source_path = ?, source_dir = ?, filename = ?, updated_at = datetime('now')
+            WHERE source_path = ?
+        ''', (new_path, os.path.dirname(new_path), Path(new_path).name, old_path))
+        # Keep write-back targets in the photos index pointing at the live file
+        self.conn.execute("UPDATE photos SET original_path = ? WHERE original_path = ?", (new_path, old_path))
+        self.conn.commit()
+
+    @_serialized
+    def set_manifest_state(self, source_path: str, state: str, file_hash: str = None, detect_key: str = None):
+        """
+        detect_key: the detector model and threshold a 'no_bird' verdict was
+        reached with (the file is detected again when they change).
+        """
+        if file_hash:
+            self.conn.execute('''
+                UPDATE scan_manifest SET state = ?, file_hash = ?, detect_key = ?, updated_at = datetime('now')
+                WHERE source_path = ?
+            ''', (state, file_hash, detect_key, source_path))
+        else:
+            self.conn.execute('''
+                UPDATE scan_manifest SET state = ?, detect_key = ?, updated_at = datetime('now')
+                WHERE source_path = ?
+            ''', (state, detect_key, source_path))
+        self.conn.commit()
+
+    @_serialized
+    def get_manifest_entries_in_dir(self, source_dir: str) -> List[Dict]:
+        cursor = self.conn.execute("SELECT * FROM scan_manifest WHERE source_dir = ?", (source_dir,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    @_serialized
+    def reset_processing(self):
+        """
+        Forget what was ingested (photos, manifest, directory index, journal,
+        scan history) so every source is processed again. The taxonomy and the
+        detection cache are kept: known files skip YOLO on the next run.
+        """
+        with self.conn:
+            for table in ('photos', 'scan_manifest', 'dir_index', 'run_journal_crops', 'run_journal', 'scan_history'):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    # --- Directory Index ---
+
+    @_serialized
+    def get_dir_index(self, source_root: str) -> List[Dict]:
+        cursor = self.conn.execute("SELECT * FROM dir_index WHERE source_root = ?", (source_root,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    @_serialized
+    def upsert_dir_index(self, records: List[Dict]):
+        """
+        Insert or update directory index rows. Each record needs: path, source_root,
+        parent, date_start, date_end, location_part, mtime_ns, file_count.
+        mtime_ns/file_count are None for folders that were seen but not listed yet.
+        """
+        if not records:
+            return
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO dir_index
+            (path, source_root, parent, date_start, date_end, location_part, mtime_ns, file_count, scanned_at)
+            VALUES (:path, :source_root, :parent, :date_start, :date_end, :location_part,
+                    :mtime_ns, :file_count, datetime('now'))
+        ''', records)
+        self.conn.commit()
+
+    @_serialized
+    def delete_dir_index_tree(self, path: str):
+        """Forget a directory and everything below it (it was removed or renamed)."""
+        # Children were built with os.path.join(parent, name)
+        prefix = os.path.join(path, '')
+        self.conn.execute(
+            "DELETE FROM dir_index WHERE path = ? OR substr(path, 1, ?) = ?",
+            (path, len(prefix), prefix))
+        self.conn.commit()
+
+    # --- Run Journal ---
+
+    @_serialized
+    def journal_queue(self, source_path: str, run_id: str, size: int, mtime_ns: int, file_hash: str = None):
+        """Start (or restart from scratch) the journal for a file entering the pipeline."""
+        with self.conn:
+            self.conn.execute("DELETE FROM run_journal_crops WHERE source_path = ?", (source_path,))
+            self.conn.execute('''
+                INSERT OR REPLACE INTO run_journal
+                (source_path, run_id, size, mtime_ns, file_hash, stage, detections_json, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'queued', NULL, datetime('now'))
+            ''', (source_path, run_id, size, mtime_ns, file_hash))
+
+    @_serialized
+    def get_journal(self, source_path: str) -> Optional[Dict]:
+        """
+        Journal row for a file, with detections decoded to [(box, score), ...]
+        and 'crops' as {detection_index: {'stage': ..., 'results': [...]}}.
+        """
+        row = self.conn.execute("SELECT * FROM run_journal WHERE source_path = ?", (source_path,)).fetchone()
+        if not row:
+            return None
+        entry = dict(row)
+        detections = json.loads(entry.pop('detections_json') or 'null')
+        entry['detections'] = [(d[0], d[1]) for d in detections] if detections is not None else None
+        entry['crops'] = {}
+        cursor = self.conn.execute(
+            "SELECT detection_index, stage, results_json FROM run_journal_crops WHERE source_path = ?",
+            (source_path,))
+        for r in cursor.fetchall():
+            entry['crops'][r['detection_index']] = {
+                'stage': r['stage'],
+                'results': json.loads(r['results_json'] or '[]')
+            }
+        return entry
+
+    @_serialized
+    def journal_resume(self, source_path: str, run_id: str):
+        self.conn.execute(
+            "UPDATE run_journal SET run_id = ?, updated_at = datetime('now') WHERE source_path = ?",
+            (run_id, source_path))
+        self.conn.commit()
+
+    @_serialized
+    def journal_set_stage(self, source_path: str, stage: str, detections: List = None, file_hash: str = None):
+        """Advance a file's stage. detections ([(box, score), ...]) is stored once detected."""
+        sets = ["stage = ?", "updated_at = datetime('now')"]
+        params = [stage]
+        if detections is not None:
+            sets.append("detections_json = ?")
+            params.append(json.dumps([[list(map(float, box)), float(score)] for box, score in detections]))
+        if file_hash:
+            sets.append("file_hash = ?")
+            params.append(file_hash)
+        params.append(source_path)
+        self.conn.execute(f"UPDATE run_journal SET {', '.join(sets)} WHERE source_path = ?", params)
+        self.conn.commit()
+
+    @_serialized
+    def journal_crops_recognized(self, records: List[tuple]):
+        """Store recognition results before archiving. records: [(source_path, detection_index, results), ...]"""
+        if not records:
+            return
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO run_journal_crops
+            (source_path, detection_index, stage, results_json, updated_at)
+            VALUES (?, ?, 'recognized', ?, datetime('now'))
+        ''', [(path, idx, json.dumps(results, ensure_ascii=False)) for path, idx, results in records])
+        self.conn.commit()
+
+    @_serialized
+    def journal_crop_closed(self, source_path: str, detection_index: int, detections_count: int,
+                            stage: str = 'archived') -> Optional[str]:
+        """
+        Close one crop as 'archived' or 'failed' (could not be cropped,
+        recognized or archived). Once every crop is closed, the file leaves the
+        journal. Returns None while crops are open, else the file's outcome:
+        'archived' if all of its crops were, otherwise 'failed'.
+        """
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO run_journal_crops (source_path, detection_index, stage, updated_at)
+                VALUES (?, ?, ?, datetime('now'))
+                ON CONFLICT(source_path, detection_index) DO UPDATE SET
+                    stage = excluded.stage, updated_at = excluded.updated_at
+            ''', (source_path, detection_index, stage))
+            archived, failed = self.conn.execute('''
+                SELECT count(CASE WHEN stage = 'archived' THEN 1 END), count(CASE WHEN stage = 'failed' THEN 1 END)
+                FROM run_journal_crops WHERE source_path = ?
+            ''', (source_path,)).fetchone()
+            if archived + failed < detections_count:
+                return None
+            self.journal_discard(source_path, commit=False)
+        return 'failed' if failed else 'archived'
+
+    @_serialized
+    def journal_discard(self, source_path: str, commit: bool = True):
+        """Drop a file from the journal (finished, no bird, failed, or its source changed)."""
+        self.conn.execute("DELETE FROM run_journal_crops WHERE source_path = ?", (source_path,))
+        self.conn.execute("DELETE FROM run_journal WHERE source_path = ?", (source_path,))
+        if commit:
+            self.conn.commit()
+
+    @_serialized
+    def count_journal(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM run_journal").fetchone()[0]
+
+    # --- Detection Cache ---
+
+    @_serialized
+    def get_cached_detections(self, file_hash: str, model_hash: str, confidence: float) -> Optional[Dict]:
+        """Cached {'detections': [(box, score), ...], 'width', 'height'} for this file and detector, or None."""
+        row = self.conn.execute(
+            "SELECT detections_json, width, height FROM detection_cache "
+            "WHERE file_hash = ? AND model_hash = ? AND confidence = ?",
+            (file_hash, model_hash, float(confidence))).fetchone()
+        if not row:
+            return None
+        return {
+            'detections': [(d[0], d[1]) for d in json.loads(row['detections_json'])],
+            'width': row['width'],
+            'height': row['height']
+        }
+
+    @_serialized
+    def cache_detections(self, file_hash: str, model_hash: str, confidence: float,
+                         detections: List, width: int, height: int):
+        self.conn.execute('''
+            INSERT OR REPLACE INTO detection_cache
+            (file_hash, model_hash, confidence, detections_json, width, height, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', (file_hash, model_hash, float(confidence),
+              json.dumps([[list(map(float, box)), float(score)] for box, score in detections]),
+              width, height))
+        self.conn.commit()
+
+    # --- Scan History ---
+
+    @_serialized
+    def add_scan_history(self, record: Dict) -> int:
         keys = ', '.join(record.keys())
         placeholders = ', '.join(['?'] * len(record))
         values = tuple(record.values())
         
         sql = f"INSERT INTO scan_history ({keys}) VALUES ({placeholders})"
-        self.conn.execute(sql, values)
+        cursor = self.conn.execute(sql, values)
+        self.conn.commit()
+        return cursor.lastrowid
+
+    @_serialized
+    def update_scan_history(self, scan_id: int, record: Dict):
+        sets = ', '.join(f"{k} = ?" for k in record.keys())
+        self.conn.execute(f"UPDATE scan_history SET {sets} WHERE id = ?", (*record.values(), scan_id))
+        self.conn.commit()
+
+    @_serialized
+    def mark_interrupted_scans(self) -> int:
+        """Runs still marked 'Running' at startup were cut off by a crash or restart."""
+        cursor = self.conn.execute("UPDATE scan_history SET status = 'Interrupted' WHERE status = 'Running'")
         self.conn.commit()
+        return cursor.rowcount
 
     def get_recent_scans(self, limit: int = 5) -> List[Dict]:
         cursor = self.conn.execute("SELECT * FROM scan_history ORDER BY id DESC LIMIT ?", (limit,))
@@ -6,7 +6,6 @@ import hashlib
 import time
 import json
 import threading
-from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
 
@@ -15,28 +14,47 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.metadata.ioc_manager import IOCManager
 from src.core.detector import BirdDetector
+from src.core.detection_server import DetectionServer
+from src.core.burst import BurstGrouper, exif_capture_time
+from src.core.hashing import BKTree, dhash, same_capture
 from src.core.quality import QualityChecker
 from src.core.processor import ImageProcessor
+from src.core.image import DecodedImage
+from src.core.crop_pool import CropPool
+from src.core.preview import HEAD_BYTES, JpegHeaderInfo, parse_jpeg_header
+from src.core.raw import RAW_EXTENSIONS, locate_raw_previews
 from src.recognition.inference_local import LocalBirdRecognizer
 from src.recognition.inference_dongniao import DongniaoRecognizer
 from src.recognition.inference_api import APIBirdRecognizer
+from src.recognition.batcher import ContextBatcher
 from src.metadata.exif_writer import ExifWriter
 from src.utils.config_loader import load_config
 from src.utils.env_check import check_system_dependencies
 
 from src.core.io.fs_manager import FileSystemManager
 from src.core.io.local import LocalProvider # Import to access IGNORED_DIRS
+from src.core.io.provider import FileEntry
 from src.core.io.temp_manager import TempFileManager
+from src.core.io.watcher import DirectoryWatcher
+from src.core.io.prefetch import ByteBudget
+from src.core.stages import Stage, StagedPipeline
 from src.core.io.path_generator import PathGenerator
 from src.core.io.path_parser import PathParser
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Source files the pipeline ingests. RAW files go through their embedded JPEGs.
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg') + RAW_EXTENSIONS
+
 class SmartScanner:
-    def __init__(self, root_path: Path, start_date: str = None, end_date: str = None):
+    # Source files counted in the directory index (same filter as the pipeline)
+    INDEXED_EXTENSIONS = SOURCE_EXTENSIONS
+
+    def __init__(self, root_path: Path, start_date: str = None, end_date: str = None, db: IOCManager = None):
         self.root_path = root_path
         self.start_date = int(start_date) if start_date else 0
         self.end_date = int(end_date) if end_date else 99999999
+        self.db = db # Optional: enables the persistent directory index
 
     def _is_in_range(self, d_start, d_end):
         if not d_start: return True # No date info, assume safe to explore
@@ -51,6 +69,10 @@ class SmartScanner:
         return not (end_int < self.start_date or start_int > self.end_date)
 
     def scan(self, current_path: Path):
+        if self.db is not None:
+            yield from self._scan_indexed(current_path)
+            return
+
         try:
             # First, process files in current dir
             for entry in os.scandir(current_path):
@@ -72,7 +94,109 @@ class SmartScanner:
         except PermissionError:
             pass
 
+    def _scan_indexed(self, root: Path):
+        """
+        Date-pruned walk backed by the dir_index table.
+        - Folders are selected from the index by their parsed date range, so
+          out-of-range folders are never touched (not even stat'ed).
+        - A folder whose mtime is unchanged is not listed again: its sub-folders
+          come from the index and its files from the scan manifest.
+        - Only new or changed folders are listed with os.scandir and re-indexed.
+        """
+        root_str = str(root)
+        rows = {row['path']: row for row in self.db.get_dir_index(root_str)}
+        children = {}
+        for row in rows.values():
+            children.setdefault(row['parent'], []).append(row)
+
+        stack = [root_str]
+        while stack:
+            dir_path = stack.pop()
+            row = rows.get(dir_path)
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                # Folder was removed or renamed since it was indexed
+                self.db.delete_dir_index_tree(dir_path)
+                continue
+
+            if row and row['mtime_ns'] == mtime_ns and row['file_count'] is not None:
+                known_files = self.db.get_manifest_entries_in_dir(dir_path)
+                if len(known_files) == row['file_count']:
+                    for f in known_files:
+                        yield FileEntry(
+                            path=f['source_path'], is_dir=False, size=f['size'], name=f['filename'],
+                            mtime_ns=f['mtime_ns'], inode=f['inode'] or 0
+                        )
+                    for child in children.get(dir_path, []):
+                        if self._is_in_range(child['date_start'], child['date_end']):
+                            stack.append(child['path'])
+                        else:
+                            logging.debug(f"Pruning skipped: {child['path']}")
+                    continue
+
+            # New or changed folder (or manifest incomplete): list it
+            yield from self._rescan_dir(root_str, dir_path, mtime_ns, children.get(dir_path, []), stack)
+
+    def _rescan_dir(self, root_str, dir_path, mtime_ns, known_children, stack):
+        files = []
+        records = []
+        subdirs = set()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.name in LocalProvider.IGNORED_DIRS:
+                        continue
+                    try:
+                        if entry.is_file():
+                            files.append(FileEntry.from_stat(entry.path, entry.stat(), name=entry.name))
+                        elif entry.is_dir():
+                            d_start, d_end, loc = PathParser.parse_folder_name(entry.name)
+                            subdirs.add(entry.path)
+                            # Index every sub-folder (listing unknown yet) so later
+                            # runs with a different range can jump straight to it
+                            records.append({
+                                'path': entry.path, 'source_root': root_str, 'parent': dir_path,
+                                'date_start': d_start, 'date_end': d_end, 'location_part': loc,
+                                'mtime_ns': None, 'file_count': None
+                            })
+                            if self._is_in_range(d_start, d_end):
+                                stack.append(entry.path)
+                            else:
+                                logging.debug(f"Pruning skipped: {entry.name}")
+                    except OSError as e:
+                        logging.warning(f"Cannot stat {entry.path}: {e}")
+        except PermissionError:
+            return
+
+        # Keep listing state of known sub-folders; they are validated by mtime when visited
+        known = {c['path']: c for c in known_children}
+        for rec in records:
+            old = known.get(rec['path'])
+            if old:
+                rec['mtime_ns'] = old['mtime_ns']
+                rec['file_count'] = old['file_count']
+        for vanished in set(known) - subdirs:
+            self.db.delete_dir_index_tree(vanished)
+
+        d_start, d_end, loc = (None, None, None) if dir_path == root_str else \
+            PathParser.parse_folder_name(os.path.basename(dir_path))
+        records.append({
+            'path': dir_path, 'source_root': root_str,
+            'parent': None if dir_path == root_str else os.path.dirname(dir_path),
+            'date_start': d_start, 'date_end': d_end, 'location_part': loc,
+            'mtime_ns': mtime_ns,
+            'file_count': sum(1 for f in files if f.name.lower().endswith(self.INDEXED_EXTENSIONS))
+        })
+        self.db.upsert_dir_index(records)
+
+        yield from files
+
 class FeatherTracePipeline:
+    # Smallest embedded preview (short edge, px) accepted as detection input;
+    # EXIF thumbnails (160x120) fall back to the reduced decode
+    MIN_PREVIEW_EDGE = 640
+
     def __init__(self, config_path: str = "config/settings.yaml"):
         # Use centralized config loader
         self.config = load_config(config_path)
@@ -82,10 +206,48 @@ class FeatherTracePipeline:
         
         self.db = IOCManager(self.config['paths']['db_path'])
         self.device = self.config['processing'].get('device', 'cpu')
-        self.detector = BirdDetector(
-            self.config['processing']['yolo_model'], 
-            self.config['processing']['confidence_threshold'],
-            device=self.device
+        proc_conf = self.config['processing']
+        self.confidence = proc_conf['confidence_threshold']
+        # Crops below this sharpness skip recognition and go to the blurry bucket (0 = off)
+        self.blur_threshold = float(proc_conf.get('blur_threshold', 0) or 0)
+        # Optional burst stage: recognize only the sharpest frame of each burst
+        self.burst_grouper = None
+        if proc_conf.get('burst_grouping', False):
+            self.burst_grouper = BurstGrouper(
+                max_gap=proc_conf.get('burst_max_gap_seconds', 1.0),
+                max_distance=proc_conf.get('burst_hash_distance', 10),
+                max_wait_ms=proc_conf.get('burst_wait_ms', 1000),
+                max_size=proc_conf.get('burst_max_size', 60)
+            )
+        # Sources within this many dHash bits of an archived one (same capture time,
+        # if known) are skipped as near-duplicates (0 = off; hashes are stored anyway)
+        self.near_duplicate_distance = int(proc_conf.get('near_duplicate_distance', 0) or 0)
+        self.source_hashes = None  # BKTree, loaded per run
+        self.source_hashes_lock = threading.Lock()
+        # RAW formats already warned about for reduced-size previews (once per process)
+        self.reduced_raw_formats = set()
+        # Reuse boxes of files seen before with the same model and threshold
+        self.detection_cache = proc_conf.get('detection_cache', True)
+        # Detection is served by dedicated thread(s), each owning one model replica;
+        # a request merges the batches of all detect workers waiting at that moment.
+        # A detect worker blocks on its request, so replicas beyond the number of
+        # workers would never get work
+        replicas = max(1, int(proc_conf.get('detector_replicas', 1)))
+        self.detect_workers = max(replicas, int((proc_conf.get('stages') or {}).get('detect_workers', replicas)))
+        self.detector = DetectionServer(
+            lambda: BirdDetector(
+                proc_conf['yolo_model'],
+                proc_conf['confidence_threshold'],
+                device=self.device,
+                backend=proc_conf.get('detector_backend', 'torch'),
+                int8=proc_conf.get('detector_int8', False),
+                cache_dir=self.config['paths'].get('model_cache_dir', 'data/models'),
+                cascade=proc_conf.get('detect_cascade', False),
+                candidate_confidence=proc_conf.get('cascade_candidate_confidence', 0.1),
+                max_tiles=proc_conf.get('cascade_max_tiles', 4)
+            ),
+            replicas=replicas,
+            max_batch_size=int(proc_conf.get('detect_batch_size', 4)) * self.detect_workers
         )
         self.recognizer = None # Lazy load later
         self.exif_writer = ExifWriter()
@@ -98,11 +260,36 @@ class FeatherTracePipeline:
         )
         self.write_back_raw = out_conf.get('write_back_to_source', False)
         
-        # Batch Buffer
-        self.batch_buffer = []
-        self.batch_lock = threading.Lock() # Lock for buffer access
-        self.current_candidate_labels = None
-        self.inference_batch_size = self.config.get('recognition', {}).get('local', {}).get('inference_batch_size', 16)
+        # Recognition micro-batcher: one queue per candidate-label context
+        local_conf = self.config.get('recognition', {}).get('local', {})
+        self.inference_batch_size = local_conf.get('inference_batch_size', 16)
+        self.batcher = ContextBatcher(
+            max_batch_size=self.inference_batch_size,
+            max_wait_ms=local_conf.get('batch_max_wait_ms', 250),
+            target_latency_ms=local_conf.get('batch_target_latency_ms'),
+            adaptive=local_conf.get('adaptive_batch_size', True)
+        )
+        self.context_labels = {}
+        self.warm_contexts = set()
+
+        # Stage sizing (workers per stage, bounded queues between stages)
+        self.stage_config = self.config.get('processing', {}).get('stages', {}) or {}
+        # Crop/resize/encode backend: 'thread' (in the stage threads) or 'process'
+        self.crop_backend = self.config.get('processing', {}).get('crop_backend', 'thread')
+        if self.crop_backend not in ('thread', 'process'):
+            raise ValueError(f"Unknown crop backend: {self.crop_backend}")
+        self.crop_pool = None  # Started on first run (process backend only)
+        # Detection input decoded DCT-scaled to at least this many px (0 = full resolution)
+        self.detect_decode_size = int(self.config.get('processing', {}).get('detect_decode_size', 1280) or 0)
+        # Detect on the camera's embedded preview JPEG when there is a large enough one
+        self.detect_preview = bool(self.config.get('processing', {}).get('detect_preview', False))
+        # Detection collector: frames go through YOLO N at a time (single queue, fixed size)
+        self.detect_batch_size = max(1, int(self.config.get('processing', {}).get('detect_batch_size', 4)))
+        self.detect_collector = ContextBatcher(
+            max_batch_size=self.detect_batch_size,
+            max_wait_ms=self.config.get('processing', {}).get('detect_batch_wait_ms', 50),
+            adaptive=False
+        )
 
         # Load taxonomy and config lists (with defaults for backward compatibility)
         paths_config = self.config.get('paths', {})
@@ -120,20 +307,49 @@ class FeatherTracePipeline:
     def _calculate_file_hash(self, provider, file_path: str, size: int) -> str:
         """
         Calculate partial SHA256 hash for fast deduplication.
+        Only the sampled windows (start, middle, end; 12 KB total) are read.
         """
         sha256 = hashlib.sha256()
         
-        data = provider.read_bytes(file_path)
-        
         if size < 12288:
-             sha256.update(data)
+             sha256.update(provider.read_bytes(file_path))
         else:
-             sha256.update(data[:4096])
-             sha256.update(data[size//2 : size//2 + 4096])
-             sha256.update(data[-4096:])
+             sha256.update(provider.read_range(file_path, 0, 4096))
+             sha256.update(provider.read_range(file_path, size//2, 4096))
+             sha256.update(provider.read_range(file_path, size - 4096, 4096))
 
         return f"{size}_{sha256.hexdigest()}"
 
+    def _check_manifest(self, provider, entry):
+        """
+        Stat-time check against the scan manifest (no file content is read, so
+        a file edited in place that kept its size and mtime counts as unchanged;
+        `run(rescan=True)` fingerprints those again).
+        Returns (skip, known_hash):
+        - skip: file is unchanged and was fully handled by a previous run
+        - known_hash: fingerprint from a previous run, if still valid
+        """
+        row = self.db.get_manifest_entry(entry.path)
+        if row is not None:
+            unchanged = (
+                row['size'] == entry.size and
+                row['mtime_ns'] == entry.mtime_ns and
+                (not row['inode'] or not entry.inode or row['inode'] == entry.inode)
+            )
+            if unchanged:
+                return self._manifest_done(row), row['file_hash']
+        else:
+            # Unknown path: maybe a moved/renamed file we have already seen
+            moved = self.db.find_manifest_match(entry.size, entry.mtime_ns, entry.inode, entry.name)
+            if moved and not provider.exists(moved['source_path']):
+                logging.debug(f"Manifest: {moved['source_path']} moved to {entry.path}")
+                self.db.relink_manifest(moved['source_path'], entry.path)
+                return self._manifest_done(moved), moved['file_hash']
+
+        # New or modified file
+        self.db.upsert_manifest(entry.path, entry.size, entry.mtime_ns, entry.inode, None, 'pending')
+        return False, None
+
     def _get_taxonomy_labels(self):
         # Check if DB is empty
         cursor = self.db.conn.execute("SELECT count(*) FROM taxonomy")
@@ -183,29 +399,34 @@ class FeatherTracePipeline:
         logging.info(f"Loaded {len(all_labels)} total labels from DB.")
         return all_labels
 
-    def _select_candidate_labels(self, location_tag: str):
+    def _label_context(self, location_tag: str) -> str:
+        """Which candidate-label set applies to a photo: 'china' or 'global'."""
         mode = self.config.get('recognition', {}).get('region_filter')
         
         if mode == 'china':
-            if not self.china_allowlist:
-                 return self.all_labels
-            return [name for name in self.all_labels if name in self.china_allowlist]
+            return 'china'
             
         if mode == 'auto':
-            is_foreign = False
             for country in self.foreign_countries:
                 if country in location_tag:
-                    is_foreign = True
-                    break
-            
-            if is_foreign:
-                return self.all_labels
+                    return 'global'
+            return 'china'
+
+        return 'global'
+
+    def _labels_for_context(self, context: str):
+        """Candidate labels for a context, filtered once and cached."""
+        labels = self.context_labels.get(context)
+        if labels is None:
+            if context == 'china' and self.china_allowlist:
+                labels = [name for name in self.all_labels if name in self.china_allowlist]
             else:
-                if not self.china_allowlist:
-                    return self.all_labels
-                return [name for name in self.all_labels if name in self.china_allowlist]
+                labels = self.all_labels
+            self.context_labels[context] = labels
+        return labels
 
-        return self.all_labels
+    def _select_candidate_labels(self, location_tag: str):
+        return self._labels_for_context(self._label_context(location_tag))
 
     def _init_recognizer(self):
         """
@@ -218,7 +439,8 @@ class FeatherTracePipeline:
             conf = rec_config.get('local', {})
             self.recognizer = LocalBirdRecognizer(
                 model_name=conf.get('model_type', 'bioclip'),
-                device=self.device
+                device=self.device,
+                cache_dir=self.config['paths'].get('model_cache_dir', 'data/models')
             )
         elif mode == 'dongniao':
             conf = rec_config.get('dongniao', {})
@@ -236,45 +458,71 @@ class FeatherTracePipeline:
             logging.error(f"Unknown recognition mode: {mode}")
             raise ValueError(f"Unknown recognition mode: {mode}")
 
-    def _flush_batch(self):
-        with self.batch_lock:
-            if not self.batch_buffer:
-                return
-            items = self.batch_buffer[:] # Copy
-            self.batch_buffer = [] # Clear buffer immediately
+    @staticmethod
+    def _is_out_of_memory(exc: Exception) -> bool:
+        return isinstance(exc, MemoryError) or 'out of memory' in str(exc).lower()
+
+    def _recognize_batch(self, context, items):
+        """Recognize one batch of crops against its context's labels. Returns [(item, results), ...]."""
+        labels = self._labels_for_context(context)
+        top_k = self.config.get('recognition', {}).get('top_k', 5)
+        # In-memory crops (PIL images)
+        crops = [item['crop'] for item in items]
+        started = time.perf_counter()
         
         try:
-            # Prepare paths
-            image_paths = [item['crop_path'] for item in items]
-            
-            # Batch Predict
-            top_k = self.config.get('recognition', {}).get('top_k', 5)
-            
             if hasattr(self.recognizer, 'predict_batch'):
-                batch_results = self.recognizer.predict_batch(image_paths, self.current_candidate_labels, top_k=top_k)
+                batch_results = self.recognizer.predict_batch(crops, labels, top_k=top_k)
             else:
                 batch_results = [
-                    self.recognizer.predict(p, self.current_candidate_labels, top_k=top_k) 
-                    for p in image_paths
+                    self.recognizer.predict(c, labels, top_k=top_k) 
+                    for c in crops
                 ]
-
-            # Process Results
-            alt_threshold = self.config.get('recognition', {}).get('alternatives_threshold', 70)
-            low_conf_threshold = self.config.get('recognition', {}).get('low_confidence_threshold', 60)
-
-            for item, results in zip(items, batch_results):
-                self._archive_item(item, results, alt_threshold, low_conf_threshold)
-                
         except Exception as e:
+            if self._is_out_of_memory(e) and len(items) > 1:
+                # Shrink for the rest of the run and retry this batch in halves
+                self.batcher.on_oom(len(items))
+                mid = len(items) // 2
+                return self._recognize_batch(context, items[:mid]) + self._recognize_batch(context, items[mid:])
             logging.error(f"Batch processing failed: {e}", exc_info=True)
             for item in items:
-                try: os.remove(item['crop_path'])
-                except: pass
+                for crop_item in [item] + item.pop('burst_members', []):
+                    self._close_failed_crop(crop_item)
+            return []
+
+        # The first batch of a context also encodes its text labels: not representative
+        if context in self.warm_contexts:
+            memory = self.recognizer.memory_fraction() if hasattr(self.recognizer, 'memory_fraction') else None
+            self.batcher.record(len(items), time.perf_counter() - started, memory)
+        self.warm_contexts.add(context)
+
+        pairs = []
+        for item, results in zip(items, batch_results):
+            pairs.append((item, results))
+            # Other frames of the burst take the representative's label and candidates
+            pairs.extend((member, results) for member in item.pop('burst_members', []))
+
+        # Write-ahead: results survive a crash between here and archive
+        self.db.journal_crops_recognized([
+            (item['entry'].path, item['detection_index'], results)
+            for item, results in pairs
+        ])
+        return pairs
+
+    def _run_batches(self, batches):
+        ready = []
+        for context, items in batches:
+            ready.extend(self._recognize_batch(context, items))
+        return ready
+
+    def _flush_batches(self):
+        """End of input: recognize whatever is still queued."""
+        return self._run_batches(self.batcher.drain())
 
     def _archive_item(self, item, results, alt_threshold, low_conf_threshold):
         entry = item['entry']
         meta = item['meta']
-        temp_crop_path = item['crop_path']
+        crop = item.pop('crop')
         detections_len = item['detections_count']
         i_det = item['detection_index']
         img_width = item['width']
@@ -286,6 +534,7 @@ class FeatherTracePipeline:
         cn_name = "Unknown"
         sci_name = "Unknown"
         user_comment = "No recognition results."
+        candidates_data = []
 
         if not results:
             top_result = {"scientific_name": "Unknown", "confidence": 0.0}
@@ -295,7 +544,6 @@ class FeatherTracePipeline:
             is_low_conf = top_conf_pct < low_conf_threshold
             
             comment_lines = []
-            candidates_data = []
             
             show_alternatives = (top_conf_pct <= alt_threshold) or is_low_conf
             display_results = results if show_alternatives else [results[0]]
@@ -319,7 +567,11 @@ class FeatherTracePipeline:
             
             user_comment = "&#xa;".join(comment_lines)
 
-        if is_low_conf:
+        if item.get('blurry'):
+            cn_name = "模糊照片"
+            sci_name = "Blurry"
+            user_comment = f"Skipped recognition: sharpness {item['sharpness']:.1f} below {self.blur_threshold:g}."
+        elif is_low_conf:
             cn_name = "待确认鸟种"
             sci_name = "Uncertain"
         else:
@@ -349,10 +601,19 @@ class FeatherTracePipeline:
         Path(final_path).parent.mkdir(parents=True, exist_ok=True)
         
         try:
-            import shutil
-            shutil.move(temp_crop_path, final_path)
+            jpeg = item.pop('crop_jpeg', None)
+            if jpeg is not None:
+                # Already encoded by the crop pool
+                with open(final_path, 'wb') as f:
+                    f.write(jpeg)
+            else:
+                # The only JPEG encode of this crop
+                ImageProcessor.save_crop(crop, str(final_path))
             
-            if is_low_conf:
+            if item.get('blurry'):
+                description = "Blurry Bird (Not Recognized)"
+                keywords = ["FeatherTrace", "Blurry", meta.get('location_tag')]
+            elif is_low_conf:
                 description = "Uncertain Bird (Low Confidence)"
                 keywords = ["FeatherTrace", "LowConfidence", meta.get('location_tag')]
             else:
@@ -362,14 +623,18 @@ class FeatherTracePipeline:
             # Filter out None values from keywords
             keywords = [k for k in keywords if k is not None]
 
-            self.exif_writer.write_metadata(str(final_path), {
+            tags = {
                 'ImageDescription': description,
                 'XMP:Description': description,
                 'XPTitle': description,
                 'XPSubject': "",
                 'Keywords': keywords,
                 'UserComment': user_comment
-            })
+            }
+            self.exif_writer.write_metadata(str(final_path), tags)
+            if self.write_back_raw and i_det == 0 and entry.name.lower().endswith(RAW_EXTENSIONS):
+                # The sidecar carries the most confident bird (boxes are sorted by score)
+                self._write_back_sidecar(entry, tags)
             
             self.db.add_photo_record({
                 'file_path': str(final_path),
@@ -383,8 +648,16 @@ class FeatherTracePipeline:
                 'confidence_score': confidence,
                 'width': img_width,
                 'height': img_height,
+                'sharpness': item.get('sharpness'),
+                'source_phash': item.get('source_phash'),
+                'crop_phash': f"{item['crop_phash']:016x}" if item.get('crop_phash') is not None else None,
+                'captured_at': item.get('captured_at'),
                 'candidates_json': json.dumps(candidates_data, ensure_ascii=False)
             })
+            # The file counts as archived once its last crop is
+            outcome = self.db.journal_crop_closed(entry.path, i_det, detections_len)
+            if outcome is not None:
+                self.db.set_manifest_state(entry.path, outcome)
             
             log_name = cn_name if not is_low_conf else f"Uncertain ({top_result['scientific_name']})"
             logging.info(f"Processed: {entry.name} -> {log_name} ({confidence*100:.1f}%)")
@@ -394,206 +667,817 @@ class FeatherTracePipeline:
             # Log more details for debugging
             import traceback
             logging.debug(traceback.format_exc())
+            self._close_failed_crop(item)
 
-    def process_image(self, provider, entry, meta):
-        # 1. Deduplication
-        file_hash = self._calculate_file_hash(provider, entry.path, entry.size)
-        if self.db.check_hash_exists(file_hash):
+    def _close_failed_crop(self, item):
+        """
+        Close a crop that could not be cropped, recognized or archived, so its
+        file leaves the run journal instead of being resumed forever. A file
+        with a failed crop ends up 'failed' (retried by the next scan).
+        """
+        entry = item['entry']
+        try:
+            outcome = self.db.journal_crop_closed(
+                entry.path, item['detection_index'], item['detections_count'], 'failed')
+            if outcome is not None:
+                self.db.set_manifest_state(entry.path, outcome)
+        except Exception as e:
+            logging.error(f"Cannot close journal entry of {entry.name}: {e}")
+
+    def _write_back_sidecar(self, entry, tags):
+        """
+        Tag a RAW source through its XMP sidecar. Sources themselves are never
+        rewritten: a changed size/mtime/fingerprint would make every later scan
+        (and the watcher) ingest the file again.
+        """
+        if not os.path.exists(entry.path):
+            # Remote source without a local path
+            return
+        self.exif_writer.write_sidecar(entry.path, tags)
+
+    # --- Pipeline stages ---
+    # scan -> fingerprint/dedup -> read -> decode -> detect -> crop [-> burst] -> recognize -> archive
+    # Each stage works on a job dict for one source file; crop fans out one item per bird.
+
+    def _release_job(self, job):
+        """Free the job's source bytes/pixels and give their budget back."""
+        for release in job.pop('releases', {}).values():
+            release()
+        job.pop('data', None)
+        job.pop('preview_data', None)
+        for key in ('preview', 'image'):
+            image = job.pop(key, None)
+            if image is not None:
+                image.close()
+
+    def _on_stage_error(self, job, exc):
+        if isinstance(job, dict) and 'entry' in job:
+            self._release_job(job)
+            try:
+                self.db.set_manifest_state(job['entry'].path, 'failed')
+                # Retried from scratch by the next scan, not resumed
+                self.db.journal_discard(job['entry'].path)
+            except Exception: pass
+
+    def _stage_fingerprint(self, job):
+        """Fingerprint + dedup. Reuses the manifest fingerprint when the file is unchanged."""
+        provider, entry = job['provider'], job['entry']
+        if not job.get('file_hash'):
+            job['file_hash'] = self._calculate_file_hash(provider, entry.path, entry.size)
+            if job['file_hash'] == job.get('rescan_hash'):
+                # Rescan: same content as when it was handled, nothing to redo
+                self.db.journal_discard(entry.path)
+                return None
+            self.db.set_manifest_state(entry.path, 'pending', job['file_hash'])
+            self.db.journal_set_stage(entry.path, 'queued', file_hash=job['file_hash'])
+        resume = job.get('resume')
+        if resume and resume['file_hash'] == job['file_hash']:
+            # Resumed file: photos with this hash are its own already-archived crops
+            return [job]
+        if self.db.check_hash_exists(job['file_hash']):
              logging.debug(f"Skipping duplicate: {entry.name}")
-             return
+             self.db.set_manifest_state(entry.path, 'duplicate')
+             self.db.journal_discard(entry.path)
+             return None
+        if self.detection_cache and job.get('detections') is None:
+            cached = self.db.get_cached_detections(job['file_hash'], self._detection_key(), self.confidence)
+            if cached is not None:
+                # Same content, model and threshold as a previous pass: skip detection
+                if not cached['detections']:
+                    self.db.set_manifest_state(entry.path, 'no_bird', detect_key=self._no_bird_key())
+                    self.db.journal_discard(entry.path)
+                    return None
+                job['detections'] = cached['detections']
+                self.db.journal_set_stage(entry.path, 'detected', detections=job['detections'])
+        return [job]
 
-        local_source_path = provider.get_local_path(entry.path)
-        if not local_source_path: return
+    def _read_source(self, job, budget=None):
+        """
+        Read the source JPEG into job['data'], bounded by `budget` (default:
+        the read-ahead budget): the whole file, or for RAW files the embedded
+        JPEG range.
+        """
+        entry = job['entry']
+        offset, length = job.get('source_range') or (0, entry.size)
+        budget = budget or self.read_budget
+        budget.acquire(length)
+        job.setdefault('releases', {})['read'] = lambda: budget.release(length)
+        if 'source_range' in job:
+            job['data'] = job['provider'].read_range(entry.path, offset, length)
+        else:
+            job['data'] = job['provider'].read_bytes(entry.path)
 
-        # 2. Detect (Thread-safe if YOLO is)
-        # Note: YOLO instantiation might need lock if not thread-safe, but predict is usually ok
+    def _locate_raw_source(self, job):
+        """
+        RAW files are not demosaiced: the largest embedded JPEG stands in for
+        the source (detection, size, crops). Only the container header and the
+        JPEG headers are read here. Returns the RawPreviews, or None.
+        """
+        provider, entry = job['provider'], job['entry']
         try:
-            detections = self.detector.detect(local_source_path)
+            previews = locate_raw_previews(
+                lambda offset, length: provider.read_range(entry.path, offset, length),
+                entry.size, Path(entry.name).suffix
+            )
         except Exception as e:
-            logging.error(f"Detection failed for {entry.name}: {e}")
-            return
-            
-        if not detections: return
-        
-        # Init recognizer if needed (double check locking if lazily init)
-        if self.recognizer is None: 
-            with self.batch_lock:
-                if self.recognizer is None: self._init_recognizer()
-
-        # 3. Context Check (Batching)
-        location_tag = meta.get('location_tag', 'Unknown')
-        candidates = self._select_candidate_labels(location_tag)
-        
-        with self.batch_lock:
-            # If context changed, flush previous batch
-            if self.current_candidate_labels is not None and candidates != self.current_candidate_labels:
-                # We release lock inside flush? No, _flush_batch uses lock.
-                # Recursive locking? Lock is RLock? Default is Lock.
-                # We need to be careful.
-                # Better: Queue everything, flush if needed.
-                # But flush needs to clear buffer.
-                # If we are holding lock, we can't call a function that acquires lock.
-                pass 
-            
-            # Simple strategy: If labels change, we must flush.
-            # But in multi-threaded env, multiple threads might be processing different locations?
-            # If so, they fight over 'current_candidate_labels'.
-            # Ideally, batch should be homogeneous.
-            # For now, let's assume one run mostly has one context or we accept flushing often.
-            
-            if self.current_candidate_labels is not None and candidates != self.current_candidate_labels:
-                 # Manually flush logic here to avoid re-acquiring lock
-                 items = self.batch_buffer[:]
-                 self.batch_buffer = []
-                 # Processing must happen OUTSIDE the lock to avoid blocking detectors
-                 # But we need to update current_labels.
-                 pass # Complex.
-            
-            # SIMPLIFICATION:
-            # We skip flushing on context change inside thread for now, 
-            # assuming the run is mostly consistent or we handle mixed batches later.
-            # OR, we just update the global labels?
-            self.current_candidate_labels = candidates # This is risky if threads mix.
-
-        # 4. Crop & Queue
-        img_width, img_height = 0, 0
+            logging.debug(f"Cannot read RAW header of {entry.name}: {e}")
+            previews = None
+        if previews is None:
+            return None
+        largest = previews.largest
+        job['source_range'] = (largest.offset, largest.length)
+        job['orientation'] = previews.orientation
+        # From the container's EXIF: embedded JPEGs often carry none
+        job['captured_at'] = previews.captured_at
+        if previews.reduced:
+            sensor_w, sensor_h = previews.sensor_size
+            message = (f"{entry.name}: largest embedded JPEG is {largest.width}x{largest.height}, "
+                       f"sensor is {sensor_w}x{sensor_h}; crops are cut from the reduced preview")
+            extension = Path(entry.name).suffix.lower()
+            if extension not in self.reduced_raw_formats:
+                self.reduced_raw_formats.add(extension)
+                logging.warning(message + f" (further {extension} files are logged at debug level)")
+            else:
+                logging.debug(message)
+        return previews
+
+    def _read_raw_preview(self, job, previews) -> bool:
+        """
+        Read the smallest embedded JPEG that is still big enough to detect on.
+        Returns False if that is the full-size one anyway (read as the source).
+        """
+        provider, entry = job['provider'], job['entry']
+        preview, largest = previews.smallest_at_least(self.MIN_PREVIEW_EDGE), previews.largest
+        if preview is None or preview is largest:
+            return False
+        self.read_budget.acquire(preview.length)
+        job.setdefault('releases', {})['read'] = lambda: self.read_budget.release(preview.length)
+        job['preview_data'] = provider.read_range(entry.path, preview.offset, preview.length)
+
+        # Describe the full-size JPEG the way the JPEG header parser would
+        info = JpegHeaderInfo()
+        info.width, info.height = largest.width, largest.height
+        info.orientation = previews.orientation
+        info.captured_at = previews.captured_at
+        job['header'] = info
+        return True
+
+    def _read_embedded_preview(self, job) -> bool:
+        """
+        Read only the JPEG header and the largest embedded preview it points to
+        (EXIF thumbnail / MPF preview). The full file is read later, and only
+        if detection finds a bird. Returns False if there is no usable preview.
+        """
+        provider, entry = job['provider'], job['entry']
+        if entry.size <= HEAD_BYTES or not entry.name.lower().endswith(('.jpg', '.jpeg')):
+            return False
         try:
-            from PIL import Image
-            with Image.open(local_source_path) as tmp_img:
-                img_width, img_height = tmp_img.size
-        except: pass
-
-        for i, (box, score) in enumerate(detections):
-            temp_crop_path = Path("data/processed/temp") / f"temp_{entry.name}_{i}.jpg"
-            Path("data/processed/temp").mkdir(parents=True, exist_ok=True) 
-            
-            success = ImageProcessor.crop_and_resize(
-                local_source_path, box, str(temp_crop_path), 
-                target_size=self.config['processing']['target_size'],
-                padding=self.config['processing']['crop_padding']
-            )
-            
-            if success:
-                should_flush = False
-                with self.batch_lock:
-                    self.batch_buffer.append({
-                        'entry': entry,
-                        'meta': meta,
-                        'crop_path': str(temp_crop_path),
-                        'file_hash': file_hash,
-                        'width': img_width,
-                        'height': img_height,
-                        'detection_index': i,
-                        'detections_count': len(detections)
-                    })
-                    if len(self.batch_buffer) >= self.inference_batch_size:
-                        should_flush = True
-                
-                if should_flush:
-                    self._flush_batch()
+            head = provider.read_range(entry.path, 0, HEAD_BYTES)
+            info = parse_jpeg_header(head)
+            preview = info.largest_preview() if info else None
+            if preview is None or not info.width:
+                return False
+            offset, length = preview
+            if length <= 0 or offset + length > entry.size:
+                return False
+            if offset + length <= len(head):
+                data = head[offset:offset + length]
+            else:
+                data = provider.read_range(entry.path, offset, length)
+        except Exception as e:
+            logging.debug(f"No embedded preview for {entry.name}: {e}")
+            return False
 
-    def run(self, start_date: str = None, end_date: str = None):
-        t_start = time.time()
-        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        processed_count = 0
-        
-        if start_date:
-            logging.info(f"Pipeline Filter: Range [{start_date} - {end_date or 'Max'}]")
-        
+        self.read_budget.acquire(length)
+        job.setdefault('releases', {})['read'] = lambda: self.read_budget.release(length)
+        job['preview_data'] = data
+        job['header'] = info
+        return True
+
+    def _stage_read(self, job):
+        """Read the file into memory (read-ahead bounded by the byte budget)."""
+        entry = job['entry']
+        try:
+            if entry.name.lower().endswith(RAW_EXTENSIONS):
+                previews = self._locate_raw_source(job)
+                if previews is None:
+                    logging.warning(f"No embedded JPEG found in RAW file {entry.name}")
+                    self._release_job(job)
+                    self.db.set_manifest_state(entry.path, 'failed')
+                    return None
+                if job.get('detections') is None and self._read_raw_preview(job, previews):
+                    return [job]
+            elif self.detect_preview and job.get('detections') is None and self._read_embedded_preview(job):
+                return [job]
+            self._read_source(job)
+        except Exception as e:
+            logging.error(f"Failed to read {entry.name}: {e}")
+            self._release_job(job)
+            self.db.set_manifest_state(entry.path, 'failed')
+            return None
+        return [job]
+
+    def _decode_full(self, job, budget=None):
+        """
+        Decode the source at full resolution, once. The pixel buffer is shared
+        by crop (and detect, when no reduced input is used); the encoded bytes
+        are dropped right after decoding.
+
+        Bytes are taken from `budget` (default: the decoded-pixel budget). The
+        crop stage passes its own budget: waiting there on a budget held by
+        jobs queued upstream of it would deadlock the pipeline.
+        """
+        if 'data' not in job:
+            # Detection ran on the embedded preview: read the full file now
+            self._read_source(job, budget)
+        budget = budget or self.decode_budget
+        with DecodedImage.open(job['data']) as img:
+            nbytes = DecodedImage.estimate_nbytes(img)
+            budget.acquire(nbytes)
+            job['releases']['decoded'] = lambda: budget.release(nbytes)
+            # Shared memory lets crop pool workers attach instead of copying
+            job['image'] = DecodedImage.from_image(
+                img, shared=self.crop_pool is not None, orientation=job.get('orientation'))
+            if job.get('captured_at') is None:
+                job['captured_at'] = exif_capture_time(img)
+
+        # Encoded bytes are no longer needed: return them to the read budget
+        job.pop('data', None)
+        job['releases'].pop('read')()
+        job['width'], job['height'] = job['image'].size
+
+    def _stage_decode(self, job):
+        """
+        Decode the detection input. With detect_decode_size set, JPEGs are
+        decoded DCT-scaled (1/2 to 1/8) for detection, and the full-resolution
+        decode is left to the crop stage, which only sees photos with birds.
+        """
+        if 'preview_data' in job:
+            preview = self._decode_embedded_preview(job)
+            if preview is not None:
+                job['preview'] = preview
+                return self._check_near_duplicate(job)
+            # Unusable preview: fall back to the full file. Not bounded by the read
+            # budget: jobs queued for this stage hold it, waiting here could deadlock
+            self._read_source(job, ByteBudget.UNBOUNDED)
+
+        if job.get('detections') is not None or not self.detect_decode_size:
+            # Resumed with known boxes, or reduced decoding disabled
+            self._decode_full(job)
+            return self._check_near_duplicate(job)
+
+        with DecodedImage.open(job['data']) as img:
+            orientation = job.get('orientation')
+            job['width'], job['height'] = DecodedImage.oriented_size(img, orientation)
+            if job.get('captured_at') is None:
+                job['captured_at'] = exif_capture_time(img)
+            preview = DecodedImage.reduced(img, self.detect_decode_size, orientation)
+        nbytes = preview.nbytes
+        self.decode_budget.acquire(nbytes)
+        job['releases']['preview'] = lambda: self.decode_budget.release(nbytes)
+        job['preview'] = preview
+        return self._check_near_duplicate(job)
+
+    def _decode_embedded_preview(self, job):
+        """
+        Decode the embedded preview as the detection input, upright per the
+        main image's EXIF orientation. Returns None if it is too small or its
+        aspect ratio does not match the main image (e.g. letterboxed).
+        """
+        info = job.pop('header')
+        data = job.pop('preview_data')
+        job['releases'].pop('read')()
+        if info.captured_at is not None:
+            job['captured_at'] = info.captured_at
+        try:
+            with DecodedImage.open(data) as img:
+                preview = DecodedImage.from_image(img, orientation=info.orientation)
+        except Exception as e:
+            logging.debug(f"Embedded preview of {job['entry'].name} not decodable: {e}")
+            return None
+
+        full_width, full_height = info.oriented_size
+        if (min(preview.size) < self.MIN_PREVIEW_EDGE or
+                abs(preview.width / preview.height - full_width / full_height) > 0.02):
+            preview.close()
+            return None
+
+        nbytes = preview.nbytes
+        self.decode_budget.acquire(nbytes)
+        job['releases']['preview'] = lambda: self.decode_budget.release(nbytes)
+        job['width'], job['height'] = full_width, full_height
+        return preview
+
+    def _check_near_duplicate(self, job):
+        """
+        Perceptual hash of the detection input (any rendition of the frame
+        hashes alike). With near_duplicate_distance set, a source that is a
+        re-export / resized / re-saved copy of one already seen is dropped
+        here, before detection and recognition.
+        """
+        entry = job['entry']
+        image = job['preview'] if 'preview' in job else job['image']
+        source_hash = dhash(image.pixels)
+        job['source_phash'] = f"{source_hash:016x}"
+        if self.source_hashes is None or job.get('resume'):
+            return [job]
+
+        with self.source_hashes_lock:
+            match = next((
+                path for _, _, (path, captured) in self.source_hashes.search(source_hash, self.near_duplicate_distance)
+                if path != entry.path and same_capture(captured, job.get('captured_at'))
+            ), None)
+            if match is None:
+                # Later copies in this run match against this one
+                self.source_hashes.add(source_hash, (entry.path, job.get('captured_at')))
+        if match is None:
+            return [job]
+        logging.debug(f"Skipping near-duplicate: {entry.name} (of {os.path.basename(match)})")
+        self._release_job(job)
+        self.db.set_manifest_state(entry.path, 'duplicate')
+        self.db.journal_discard(entry.path)
+        return None
+
+    def _release_preview(self, job):
+        preview = job.pop('preview', None)
+        if preview is not None:
+            preview.close()
+            job['releases'].pop('preview')()
+
+    @staticmethod
+    def _scale_detections(detections, image, full_width, full_height):
+        """Map boxes found on a reduced image back to full-resolution coordinates."""
+        sx = full_width / image.width
+        sy = full_height / image.height
+        if sx == 1 and sy == 1:
+            return detections
+        scaled = []
+        for (x1, y1, x2, y2), score in detections:
+            scaled.append(([
+                min(full_width, max(0.0, x1 * sx)), min(full_height, max(0.0, y1 * sy)),
+                min(full_width, max(0.0, x2 * sx)), min(full_height, max(0.0, y2 * sy))
+            ], score))
+        return scaled
+
+    def _detection_key(self) -> str:
+        """Detection cache key for the model: weights hash, plus the cascade settings if on."""
+        proc_conf = self.config['processing']
+        key = self.detector.model_hash
+        if proc_conf.get('detect_cascade', False):
+            key += (f"+cascade:{proc_conf.get('cascade_candidate_confidence', 0.1)}"
+                    f":{proc_conf.get('cascade_max_tiles', 4)}")
+        return key
+
+    def _no_bird_key(self) -> str:
+        """Detector settings behind a 'no_bird' verdict: model (with cascade) and threshold."""
+        return f"{self._detection_key()}@{self.confidence}"
+
+    def _manifest_done(self, row) -> bool:
+        """Whether a manifest row needs no further work with the current settings."""
+        if row['state'] == 'no_bird':
+            # A new model or threshold may find birds: detect again (the cache answers if it can)
+            return row.get('detect_key') == self._no_bird_key()
+        return row['state'] in IOCManager.MANIFEST_DONE_STATES
+
+    def _stage_detect(self, job):
+        """
+        Collect frames for batched detection; run the batch once it is full or
+        its oldest frame has waited detect_batch_wait_ms.
+        """
+        if job.get('detections') is not None:
+            # Resumed from the run journal: boxes are already known
+            return [job]
+        return self._detect_batches(self.detect_collector.add('detect', job) + self.detect_collector.due())
+
+    def _detect_idle(self):
+        """No new frames for a moment: run the batch whose wait has expired."""
+        return self._detect_batches(self.detect_collector.due())
+
+    def _flush_detect(self):
+        """End of input: detect whatever is still collected."""
+        return self._detect_batches(self.detect_collector.drain())
+
+    def _detect_batches(self, batches):
+        ready = []
+        for _, jobs in batches:
+            images = [job['preview'] if 'preview' in job else job['image'] for job in jobs]
+            try:
+                batch_detections = self.detector.detect_batch([image.bgr for image in images])
+            except Exception as e:
+                logging.error(f"Detection failed for a batch of {len(jobs)}: {e}")
+                # Nothing is cached: the files are detected again by the next scan
+                for job in jobs:
+                    self._release_job(job)
+                    self.db.set_manifest_state(job['entry'].path, 'failed')
+                    self.db.journal_discard(job['entry'].path)
+                continue
+            for job, image, detections in zip(jobs, images, batch_detections):
+                if self._finish_detection(job, image, detections):
+                    ready.append(job)
+        return ready
+
+    def _finish_detection(self, job, image, detections) -> bool:
+        """Map boxes to full resolution and journal them. False if the photo has no bird."""
+        entry = job['entry']
+        detections = self._scale_detections(detections, image, job['width'], job['height'])
+        self._release_preview(job)
+        if self.detection_cache:
+            self.db.cache_detections(job['file_hash'], self._detection_key(), self.confidence,
+                                     detections, job['width'], job['height'])
+
+        if not detections:
+            self._release_job(job)
+            self.db.set_manifest_state(entry.path, 'no_bird', detect_key=self._no_bird_key())
+            self.db.journal_discard(entry.path)
+            return False
+        job['detections'] = detections
+        self.db.journal_set_stage(entry.path, 'detected', detections=detections)
+        return True
+
+    def _stage_crop(self, job):
+        entry = job['entry']
+        detections = job['detections']
+        items = []
+        target_size = self.config['processing']['target_size']
+        padding = self.config['processing']['crop_padding']
+        # Resumed file: skip crops that were archived before the interruption
+        journal_crops = job['resume']['crops'] if job.get('resume') else {}
+        pending = [
+            (i, box) for i, (box, _) in enumerate(detections)
+            if journal_crops.get(i, {}).get('stage') != 'archived'
+        ]
+        try:
+            if 'image' not in job:
+                # Full-resolution decode, only for photos that have birds
+                self._decode_full(job, self.crop_budget)
+            if self.crop_pool is not None:
+                # Crop, resize and JPEG-encode every box in the worker processes
+                crops = self.crop_pool.crop(job['image'], [box for _, box in pending], target_size, padding)
+            else:
+                # Crops stay in memory until archive encodes them once
+                crops = []
+                for _, box in pending:
+                    crop = ImageProcessor.crop_decoded(job['image'], box, target_size=target_size, padding=padding)
+                    crops.append((crop, None) if crop is not None else None)
+
+            for (i, _), result in zip(pending, crops):
+                if result is None:
+                    # Degenerate box: nothing to archive for this crop
+                    self._close_failed_crop({'entry': entry, 'detection_index': i,
+                                             'detections_count': len(detections)})
+                    continue
+                crop, jpeg = result
+                item = {
+                    'entry': entry,
+                    'meta': job['meta'],
+                    'crop': crop,
+                    'crop_jpeg': jpeg,
+                    'file_hash': job['file_hash'],
+                    'width': job['width'],
+                    'height': job['height'],
+                    'detection_index': i,
+                    'detections_count': len(detections),
+                    'captured_at': job.get('captured_at'),
+                    'source_phash': job.get('source_phash'),
+                    'crop_phash': dhash(crop)
+                }
+                if journal_crops.get(i, {}).get('stage') == 'recognized':
+                    # Recognized before the interruption: go straight to archive
+                    item['results'] = journal_crops[i]['results']
+                items.append(item)
+
+            # Sharpness of all crops of the photo in one vectorized pass
+            for item, score in zip(items, QualityChecker.sharpness_scores([it['crop'] for it in items])):
+                item['sharpness'] = score
+                item['blurry'] = score < self.blur_threshold
+            self.db.journal_set_stage(entry.path, 'cropped')
+        finally:
+            # Source pixels/bytes are no longer needed past this point
+            self._release_job(job)
+        return items
+
+    def _stage_burst(self, item):
+        """Hold crops until their burst closes; pass on one representative per burst."""
+        if 'results' in item or item.get('blurry'):
+            return [item]
+        groups = self.burst_grouper.add(item) + self.burst_grouper.due()
+        return [BurstGrouper.representative(group) for group in groups]
+
+    def _burst_idle(self):
+        return [BurstGrouper.representative(group) for group in self.burst_grouper.due()]
+
+    def _flush_bursts(self):
+        return [BurstGrouper.representative(group) for group in self.burst_grouper.drain()]
+
+    def _stage_recognize(self, item):
+        """
+        Queue the crop under its label context; run the batches that are full
+        or have waited long enough (single worker, so the model is used serially).
+        """
+        if self.recognizer is None:
+            self._init_recognizer()
+
+        if 'results' in item:
+            # Results restored from the run journal
+            return [(item, item.pop('results'))] + self._run_batches(self.batcher.due())
+        if item.get('blurry'):
+            # Too soft to identify: archive without a recognition call
+            return [(item, [])] + self._run_batches(self.batcher.due())
+
+        context = self._label_context(item['meta'].get('location_tag', 'Unknown'))
+        return self._run_batches(self.batcher.add(context, item) + self.batcher.due())
+
+    def _recognize_idle(self):
+        """No new crops for a moment: run batches whose wait has expired."""
+        return self._run_batches(self.batcher.due())
+
+    def _stage_archive(self, pair):
+        item, results = pair
+        rec_conf = self.config.get('recognition', {})
+        self._archive_item(
+            item, results,
+            rec_conf.get('alternatives_threshold', 70),
+            rec_conf.get('low_confidence_threshold', 60)
+        )
+        return None
+
+    def _build_stages(self):
+        conf = self.stage_config
+        proc_conf = self.config.get('processing', {})
+        queue_size = conf.get('queue_size', 16)
+        # Read-ahead budget (encoded bytes, read -> decode)
+        self.read_budget = ByteBudget(int(proc_conf.get('prefetch_budget_mb', 512)) * 1024 * 1024)
+        # Decoded pixel buffers in flight (decode -> detect -> crop)
+        self.decode_budget = ByteBudget(int(proc_conf.get('decoded_budget_mb', 1024)) * 1024 * 1024)
+        # Full-resolution sources decoded by the crop stage itself (bytes + pixels):
+        # held only by crop workers and freed before they emit, so it cannot deadlock
+        self.crop_budget = ByteBudget(int(proc_conf.get('decoded_budget_mb', 1024)) * 1024 * 1024)
+        io_workers = proc_conf.get('prefetch_workers', 4)
+        if self.near_duplicate_distance:
+            # Near-duplicate index over the archive, as of the start of this run
+            self.source_hashes = BKTree()
+            for row in self.db.get_source_hashes():
+                self.source_hashes.add(int(row['source_phash'], 16), (row['original_path'], row['captured_at']))
+
+        crop_workers = conf.get('crop_workers', 2)
+        if self.crop_backend == 'process':
+            if self.crop_pool is None:
+                self.crop_pool = CropPool(proc_conf.get('crop_processes'))
+            # Stage threads only wait on the pool: one per process keeps it busy
+            crop_workers = conf.get('crop_workers', self.crop_pool.processes)
+
+        stages = [
+            Stage('fingerprint', self._stage_fingerprint, conf.get('fingerprint_workers', io_workers), queue_size),
+            Stage('read', self._stage_read, conf.get('read_workers', io_workers), queue_size,
+                  on_error=self._on_stage_error),
+            Stage('decode', self._stage_decode, conf.get('decode_workers', 2), queue_size,
+                  on_error=self._on_stage_error),
+            Stage('detect', self._stage_detect, self.detect_workers, queue_size,
+                  on_error=self._on_stage_error, flush=self._flush_detect, on_idle=self._detect_idle,
+                  idle_timeout=max(0.01, self.detect_collector.max_wait / 2)),
+            Stage('crop', self._stage_crop, crop_workers, queue_size,
+                  on_error=self._on_stage_error),
+        ]
+        if self.burst_grouper is not None:
+            # Single worker: owns the open burst groups
+            stages.append(Stage('burst', self._stage_burst, 1, queue_size, flush=self._flush_bursts,
+                                on_idle=self._burst_idle,
+                                idle_timeout=max(0.01, self.burst_grouper.max_wait / 2)))
+        return stages + [
+            # Single worker: owns the per-context batch queues and the lazily loaded recognizer
+            Stage('recognize', self._stage_recognize, 1, queue_size, flush=self._flush_batches,
+                  on_idle=self._recognize_idle, idle_timeout=max(0.01, self.batcher.max_wait / 2)),
+            Stage('archive', self._stage_archive, conf.get('archive_workers', 2), queue_size),
+        ]
+
+    def _get_sources(self):
+        """
+        Resolve enabled sources to (provider, rel_path, source_root_abs, parser, recursive).
+        """
         sources = self.config['paths'].get('sources', [])
         # Fallback for old config
         if not sources and 'raw_dir' in self.config['paths']:
              sources = [{'path': self.config['paths']['raw_dir'], 'recursive': False}]
 
-        # Use ThreadPool for detection/cropping
-        # 4 workers is a good start for IO/CPU bound mix
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = []
-            
-            for source in sources:
-                if not source.get('enabled', True):
-                    continue
-                    
-                path_str = source['path']
-                recursive = source.get('recursive', True)
-                structure_pattern = source.get('structure_pattern', None)
+        resolved = []
+        for source in sources:
+            if not source.get('enabled', True):
+                continue
+
+            path_str = source['path']
+            provider, rel_path = self.fs_manager.resolve_path(path_str)
+            if not provider.exists(rel_path):
+                logging.warning(f"Source path not found: {path_str}")
+                continue
+
+            source_root_abs = Path(provider.get_local_path(rel_path))
+            parser = PathParser(source_root_abs, source.get('structure_pattern', None))
+            resolved.append((provider, rel_path, source_root_abs, parser, source.get('recursive', True)))
+        return resolved
+
+    def _iter_source_entries(self, start_date: str = None, end_date: str = None, rescan: bool = False):
+        """
+        Walk all sources and yield (provider, FileEntry, meta) for candidate JPEGs
+        inside the optional date range. `rescan` lists every folder again
+        instead of trusting the directory index.
+        """
+        for provider, rel_path, source_root_abs, parser, recursive in self._get_sources():
+            logging.info(f"Scanning source: {source_root_abs} (Recursive: {recursive})")
+
+            iterator = []
+            if recursive and (start_date or end_date):
+                scanner = SmartScanner(source_root_abs, start_date, end_date, db=None if rescan else self.db)
+                iterator = scanner.scan(source_root_abs)
+            else:
+                iterator = provider.list_dir(rel_path, recursive=recursive)
+
+            for entry in iterator:
+                is_dir = entry.is_dir() if callable(entry.is_dir) else entry.is_dir
+                if is_dir: continue
                 
-                logging.info(f"Scanning source: {path_str} (Recursive: {recursive})")
+                entry_name = entry.name
+                entry_path = entry.path 
                 
-                provider, rel_path = self.fs_manager.resolve_path(path_str)
-                if not provider.exists(rel_path):
-                    logging.warning(f"Source path not found: {path_str}")
+                if not entry_name.lower().endswith(SOURCE_EXTENSIONS):
                     continue
                 
-                source_root_abs = Path(provider.get_local_path(rel_path))
-                parser = PathParser(source_root_abs, structure_pattern)
+                meta = parser.parse(entry_path)
                 
-                iterator = []
-                if recursive and (start_date or end_date):
-                    scanner = SmartScanner(source_root_abs, start_date, end_date)
-                    iterator = scanner.scan(source_root_abs)
+                c_date = meta.get('captured_date')
+                if start_date and c_date:
+                    if int(c_date) < int(start_date): continue
+                if end_date and c_date:
+                    if int(c_date) > int(end_date): continue
+
+                if not isinstance(entry, FileEntry):
+                    # os.DirEntry from SmartScanner (stat is cached by scandir)
+                    entry_obj = FileEntry.from_stat(entry.path, entry.stat(), name=entry.name)
                 else:
-                    iterator = provider.list_dir(rel_path, recursive=recursive)
+                    entry_obj = entry
 
-                for entry in iterator:
-                    is_dir = entry.is_dir() if callable(entry.is_dir) else entry.is_dir
-                    if is_dir: continue
-                    
-                    entry_name = entry.name
-                    entry_path = entry.path 
-                    
-                    if not entry_name.lower().endswith(('.jpg', '.jpeg')):
-                        continue
-                    
-                    meta = parser.parse(entry_path)
-                    
-                    c_date = meta.get('captured_date')
-                    if start_date and c_date:
-                        if int(c_date) < int(start_date): continue
-                    if end_date and c_date:
-                        if int(c_date) > int(end_date): continue
-
-                    if not hasattr(entry, 'size'):
-                        class Adapter:
-                            def __init__(self, e):
-                                self.path = e.path
-                                self.name = e.name
-                                self.size = e.stat().st_size
-                        entry_obj = Adapter(entry)
-                    else:
-                        entry_obj = entry
-                        
-                    processed_count += 1
-                    # Submit task to pool
-                    futures.append(executor.submit(self.process_image, provider, entry_obj, meta))
-                    
-                    # Prevent memory explosion from too many futures
-                    if len(futures) > 500:
-                        done, not_done = wait(futures, timeout=0.1)
-                        futures = list(not_done)
+                yield provider, entry_obj, meta
+
+    def _journal_start(self, job, run_id):
+        """
+        Record the file in the run journal, or pick up where an interrupted run
+        left it: known boxes skip detection, stored results skip recognition
+        and archived crops are not redone.
+        """
+        entry = job['entry']
+        journal = self.db.get_journal(entry.path)
+        if (journal and journal['stage'] != 'queued'
+                and journal['size'] == entry.size and journal['mtime_ns'] == entry.mtime_ns):
+            logging.info(f"Resuming {entry.name} from stage '{journal['stage']}'")
+            self.db.journal_resume(entry.path, run_id)
+            job['resume'] = journal
+            job['file_hash'] = job['file_hash'] or journal['file_hash']
+            job['detections'] = journal['detections']
+        else:
+            self.db.journal_queue(entry.path, run_id, entry.size, entry.mtime_ns, job['file_hash'])
+
+    def _process_entries(self, items, rescan: bool = False):
+        """
+        Run (provider, entry, meta) items through the staged pipeline.
+        With `rescan`, files the manifest considers unchanged and done are
+        fingerprinted again and only processed if their content changed.
+        Returns (processed_count, skipped_count).
+        """
+        counts = {'processed': 0, 'skipped': 0}
+        run_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+        def jobs():
+            for provider, entry, meta in items:
+                # Stat-time skip for unchanged files
+                skip, known_hash = self._check_manifest(provider, entry)
+                if skip and not rescan:
+                    counts['skipped'] += 1
+                    continue
+                counts['processed'] += 1
+                job = {'provider': provider, 'entry': entry, 'meta': meta, 'file_hash': known_hash}
+                if skip:
+                    job.update(file_hash=None, rescan_hash=known_hash)
+                self._journal_start(job, run_id)
+                yield job
+
+        StagedPipeline(self._build_stages()).run(jobs())
+        return counts['processed'], counts['skipped']
+
+    def run(self, start_date: str = None, end_date: str = None, rescan: bool = False):
+        t_start = time.time()
+        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        if start_date:
+            logging.info(f"Pipeline Filter: Range [{start_date} - {end_date or 'Max'}]")
 
-            # Wait for all tasks to complete
-            if futures:
-                wait(futures)
+        # A previous run that never reached 'Completed' was interrupted
+        if self.db.mark_interrupted_scans():
+            logging.warning("Previous run was interrupted.")
+        in_flight = self.db.count_journal()
+        if in_flight:
+            logging.info(f"Run journal: {in_flight} file(s) left in flight will be resumed when scanned.")
+
+        scan_id = self.db.add_scan_history({
+            'start_time': start_time_str,
+            'range_start': start_date or "All",
+            'range_end': end_date or "All",
+            'status': 'Running'
+        })
+        
+        processed_count, skipped_count = self._process_entries(
+            self._iter_source_entries(start_date, end_date, rescan), rescan
+        )
 
-        # Process any remaining items in the buffer
-        self._flush_batch()
         t_end = time.time()
         duration = t_end - t_start
         end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        self.db.add_scan_history({
-            'start_time': start_time_str,
+        self.db.update_scan_history(scan_id, {
             'end_time': end_time_str,
-            'range_start': start_date or "All",
-            'range_end': end_date or "All",
             'processed_count': processed_count,
             'duration_seconds': round(duration, 2),
             'status': 'Completed'
         })
-        logging.info(f"Pipeline completed. Processed: {processed_count}. Duration: {duration:.2f}s")
+        logging.info(f"Pipeline completed. Processed: {processed_count}. Unchanged (skipped): {skipped_count}. Duration: {duration:.2f}s")
+
+    def close(self):
+        """Release the detector threads and crop pool. The pipeline can't run after this."""
+        self.detector.close()
+        if self.crop_pool is not None:
+            self.crop_pool.shutdown()
+            self.crop_pool = None
+
+    def _entries_for_paths(self, paths, sources):
+        """Map changed file paths from the watcher back to (provider, entry, meta)."""
+        for path in paths:
+            for provider, rel_path, source_root_abs, parser, recursive in sources:
+                try:
+                    rel = Path(path).relative_to(source_root_abs)
+                except ValueError:
+                    continue
+                if not recursive and len(rel.parts) > 1:
+                    continue
+                try:
+                    entry = FileEntry.from_stat(path, os.stat(path))
+                except OSError:
+                    break # Deleted again before we got to it
+                yield provider, entry, parser.parse(path)
+                break
+
+    def watch(self, stop_event: threading.Event = None):
+        """
+        Continuous ingestion: watch all sources and process new or modified
+        JPEGs in debounced batches. Models stay loaded between batches.
+        Blocks until `stop_event` is set (or forever).
+        """
+        watch_conf = self.config.get('watch', {}) or {}
+
+        # Catch up on anything that arrived while we were not watching
+        if watch_conf.get('initial_scan', True):
+            self.run()
+
+        sources = self._get_sources()
+        if not sources:
+            logging.error("Watch mode: no enabled sources found.")
+            return
+
+        def on_batch(paths):
+            t_start = time.time()
+            start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            processed_count, skipped_count = self._process_entries(self._entries_for_paths(paths, sources))
+            duration = time.time() - t_start
+            if processed_count:
+                self.db.add_scan_history({
+                    'start_time': start_time_str,
+                    'end_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'range_start': "Watch",
+                    'range_end': "Watch",
+                    'processed_count': processed_count,
+                    'duration_seconds': round(duration, 2),
+                    'status': 'Completed'
+                })
+            logging.info(f"Watch batch done. Processed: {processed_count}. Unchanged (skipped): {skipped_count}. Duration: {duration:.2f}s")
+
+        watcher = DirectoryWatcher(
+            roots=[str(root) for _, _, root, _, _ in sources],
+            on_batch=on_batch,
+            debounce_seconds=watch_conf.get('debounce_seconds', 5.0),
+            max_batch_delay=watch_conf.get('max_batch_delay', 120.0),
+            poll_interval=watch_conf.get('poll_interval', 60.0),
+            backend=watch_conf.get('backend', 'auto'),
+            provider=self.fs_manager.local_provider,
+            extensions=SOURCE_EXTENSIONS
+        )
+        logging.info("Watch mode started. Waiting for new photos...")
+        watcher.run(stop_event)
 
 if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="FeatherTrace ingestion pipeline")
+    arg_parser.add_argument("--watch", action="store_true", help="Keep running and ingest new photos as they appear")
+    arg_parser.add_argument("--rescan", action="store_true",
+                            help="Fingerprint files again even if size and mtime are unchanged (finds in-place edits)")
+    args = arg_parser.parse_args()
+
     config_path = "config/settings.yaml"
     config = load_config(config_path)
     
@@ -602,4 +1486,10 @@ if __name__ == "__main__":
         sys.exit(1)
         
     runner = FeatherTracePipeline(config_path)
-    runner.run()
\ No newline at end of file
+    try:
+        if args.watch:
+            runner.watch()
+        else:
+            runner.run(rescan=args.rescan)
+    finally:
+        runner.close()
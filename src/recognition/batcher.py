@@ -0,0 +1,110 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+Batch = Tuple[Hashable, List[Any]]
+
+
+class ContextBatcher:
+    """
+    Micro-batcher for recognition, keyed by candidate-label context.
+
+    Every context (e.g. 'china', 'global') has its own queue, so a batch is
+    always classified against the label set of its own crops, even when
+    photos from different regions are interleaved. A queue is flushed when it
+    reaches the current batch size, or once its oldest item has waited
+    `max_wait_ms`, so a half-full batch does not sit until the end of the run.
+
+    The batch size adapts to feedback from record()/on_oom(): it shrinks when
+    a batch was slower than `target_latency_ms` or device memory use passed
+    `memory_high_water`, and grows back (up to `max_batch_size`) when full
+    batches run comfortably. An out-of-memory error also lowers the ceiling,
+    so the size does not grow back into the same OOM.
+    """
+
+    def __init__(self,
+                 max_batch_size: int = 16,
+                 max_wait_ms: float = 250,
+                 min_batch_size: int = 1,
+                 target_latency_ms: Optional[float] = None,
+                 memory_high_water: float = 0.85,
+                 adaptive: bool = True):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.min_batch_size = max(1, min(int(min_batch_size), self.max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.target_latency = float(target_latency_ms) / 1000.0 if target_latency_ms else None
+        self.memory_high_water = memory_high_water
+        self.adaptive = adaptive
+
+        self.batch_size = self.max_batch_size
+        self.ceiling = self.max_batch_size
+
+        self.queues: Dict[Hashable, List[Any]] = {}
+        self.first_added: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    # --- Queueing ---
+
+    def _take(self, key) -> Batch:
+        items = self.queues.pop(key)
+        self.first_added.pop(key, None)
+        return key, items
+
+    def add(self, key: Hashable, item: Any) -> List[Batch]:
+        """Queue `item` under `key`. Returns the batches that became ready."""
+        with self._lock:
+            queue = self.queues.setdefault(key, [])
+            if not queue:
+                self.first_added[key] = time.monotonic()
+            queue.append(item)
+            if len(queue) >= self.batch_size:
+                return [self._take(key)]
+            return []
+
+    def due(self, now: Optional[float] = None) -> List[Batch]:
+        """Batches whose oldest item has waited at least max_wait_ms."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            keys = [k for k, t in self.first_added.items() if now - t >= self.max_wait]
+            return [self._take(k) for k in keys]
+
+    def drain(self) -> List[Batch]:
+        """Everything still queued (end of input)."""
+        with self._lock:
+            return [self._take(k) for k in list(self.queues)]
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self.queues.values())
+
+    # --- Adaptive sizing ---
+
+    def _set_size(self, size: int, reason: str):
+        size = max(self.min_batch_size, min(size, self.ceiling))
+        if size != self.batch_size:
+            logging.info(f"Recognition batch size {self.batch_size} -> {size} ({reason})")
+            self.batch_size = size
+
+    def record(self, size: int, seconds: float, memory_fraction: Optional[float] = None):
+        """Feed back one batch's wall time and device memory use (0..1, if known)."""
+        if not self.adaptive or size <= 0:
+            return
+        with self._lock:
+            if memory_fraction is not None and memory_fraction >= self.memory_high_water:
+                self._set_size(int(self.batch_size * 0.75), f"memory at {memory_fraction:.0%}")
+            elif self.target_latency and seconds > self.target_latency:
+                # Scale to what would have met the target
+                self._set_size(int(size * self.target_latency / seconds), f"{seconds * 1000:.0f} ms per batch")
+            elif size >= self.batch_size and self.batch_size < self.ceiling:
+                # Full batch with headroom on both latency and memory: grow
+                fast = self.target_latency is None or seconds < self.target_latency * 0.5
+                roomy = memory_fraction is None or memory_fraction < self.memory_high_water * 0.8
+                if fast and roomy:
+                    self._set_size(self.batch_size + max(1, self.batch_size // 4), "headroom")
+
+    def on_oom(self, size: int):
+        """A batch of `size` ran out of memory: halve and never grow past it again."""
+        with self._lock:
+            self.ceiling = max(self.min_batch_size, min(self.ceiling, size // 2))
+            self._set_size(min(self.batch_size, self.ceiling), "out of memory")
@@ -1,20 +1,43 @@
+import io
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
+from PIL import Image
+
+# A recognizer input: a file path, or an in-memory crop from the pipeline
+ImageInput = Union[str, Image.Image]
+
+
+def open_image(image: ImageInput) -> Image.Image:
+    """Return a PIL image for a path or an already decoded image."""
+    if isinstance(image, Image.Image):
+        return image
+    return Image.open(image)
+
+
+def read_image_bytes(image: ImageInput) -> bytes:
+    """Encoded JPEG bytes for upload. In-memory crops are encoded without touching disk."""
+    if isinstance(image, Image.Image):
+        buf = io.BytesIO()
+        image.save(buf, format='JPEG', quality=95)
+        return buf.getvalue()
+    with open(image, 'rb') as f:
+        return f.read()
+
 
 class BirdRecognizer(ABC):
     """旧版同步识别器接口（保留兼容）"""
     @abstractmethod
-    def predict(self, image_path: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def predict(self, image_path: ImageInput, top_k: int = 5) -> List[Dict[str, Any]]:
         """
-        Predict the bird species in the image.
+        Predict the bird species in the image (a path or a PIL image).
         Returns a list of dicts: [{"scientific_name": "...", "confidence": 0.9}, ...]
         """
         pass
 
     @abstractmethod
-    def predict_batch(self, image_paths: List[str], candidate_labels: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+    def predict_batch(self, image_paths: List[ImageInput], candidate_labels: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
         """
-        Batch predict.
+        Batch predict. Items may be paths or PIL images.
         Returns a list of result lists (one result list per image).
         """
         pass
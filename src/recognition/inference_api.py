@@ -2,14 +2,14 @@ import requests
 import base64
 import logging
 from typing import List, Dict, Any
-from .bioclip_base import BirdRecognizer
+from .bioclip_base import BirdRecognizer, ImageInput, read_image_bytes
 
 class APIBirdRecognizer(BirdRecognizer):
     def __init__(self, api_url: str, api_key: str):
         self.api_url = api_url
         self.headers = {"Authorization": f"Bearer {api_key}"}
 
-    def predict(self, image_path: str, candidate_labels: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
+    def predict(self, image_path: ImageInput, candidate_labels: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Call Hugging Face Inference API for Zero-Shot Classification.
         """
@@ -18,8 +18,7 @@ class APIBirdRecognizer(BirdRecognizer):
             return []
 
         try:
-            with open(image_path, "rb") as f:
-                image_data = f.read()
+            image_data = read_image_bytes(image_path)
                 
             # HF API expects base64 inputs for some endpoints, or binary for others.
             # For zero-shot-image-classification with specific candidates, JSON is often safer.
@@ -5,7 +5,7 @@ import logging
 import uuid
 import hashlib
 from typing import List, Dict, Any
-from .bioclip_base import BirdRecognizer
+from .bioclip_base import BirdRecognizer, ImageInput, read_image_bytes
 
 class DongniaoRecognizer(BirdRecognizer):
     def __init__(self, api_key: str, api_url: str = "https://ai.open.hhodata.com/api/v2/dongniao"):
@@ -16,7 +16,7 @@ class DongniaoRecognizer(BirdRecognizer):
         if not self.api_key:
             logging.warning("Dongniao API Key is missing! Recognition will fail.")
 
-    def predict(self, image_path: str, candidate_labels: List[str] = None, top_k: int = 5) -> List[Dict[str, Any]]:
+    def predict(self, image_path: ImageInput, candidate_labels: List[str] = None, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Predict using Dongniao API.
         Note: candidate_labels is ignored as Dongniao doesn't support zero-shot candidate restriction.
@@ -42,48 +42,48 @@ class DongniaoRecognizer(BirdRecognizer):
             logging.error(f"Dongniao API error: {e}")
             return []
 
-    def _upload_image(self, image_path: str) -> str:
+    def _upload_image(self, image_path: ImageInput) -> str:
         headers = {"api_key": self.api_key}
+        filename = os.path.basename(image_path) if isinstance(image_path, str) else 'crop.jpg'
         
-        with open(image_path, 'rb') as f:
-            files = {
-                'image': (os.path.basename(image_path), f, 'image/jpeg'),
-                'upload': (None, '1'),
-                'class': (None, 'B'), # Birds only
-                'did': (None, self.did)
-            }
-            
-            response = requests.post(self.api_url, headers=headers, files=files, timeout=30)
-            
-            try:
-                resp_json = response.json()
-            except Exception:
-                logging.error(f"Dongniao Upload Response is not JSON: {response.text}")
-                return None
+        files = {
+            'image': (filename, read_image_bytes(image_path), 'image/jpeg'),
+            'upload': (None, '1'),
+            'class': (None, 'B'), # Birds only
+            'did': (None, self.did)
+        }
+        
+        response = requests.post(self.api_url, headers=headers, files=files, timeout=30)
+        
+        try:
+            resp_json = response.json()
+        except Exception:
+            logging.error(f"Dongniao Upload Response is not JSON: {response.text}")
+            return None
 
-            # Handle flat list format: [1000, "ID"]
-            if isinstance(resp_json, list):
-                if len(resp_json) >= 2 and str(resp_json[0]) == '1000':
-                    return resp_json[1]
-                logging.error(f"Cannot parse root list response: {resp_json}")
-                return None
+        # Handle flat list format: [1000, "ID"]
+        if isinstance(resp_json, list):
+            if len(resp_json) >= 2 and str(resp_json[0]) == '1000':
+                return resp_json[1]
+            logging.error(f"Cannot parse root list response: {resp_json}")
+            return None
 
-            if not isinstance(resp_json, dict):
-                logging.error(f"Dongniao response is not a dict or list: {type(resp_json)}")
-                return None
+        if not isinstance(resp_json, dict):
+            logging.error(f"Dongniao response is not a dict or list: {type(resp_json)}")
+            return None
 
-            # Handle dict format: {"status": "1000", "data": ...}
-            if str(resp_json.get('status')) != '1000':
-                logging.error(f"Dongniao API returned error: {resp_json.get('message')} (Status: {resp_json.get('status')})")
-                return None
-                
-            data = resp_json.get('data')
-            if isinstance(data, list) and len(data) >= 2:
-                return data[1]
-            elif isinstance(data, dict):
-                return data.get('recognitionId')
-            
+        # Handle dict format: {"status": "1000", "data": ...}
+        if str(resp_json.get('status')) != '1000':
+            logging.error(f"Dongniao API returned error: {resp_json.get('message')} (Status: {resp_json.get('status')})")
             return None
+            
+        data = resp_json.get('data')
+        if isinstance(data, list) and len(data) >= 2:
+            return data[1]
+        elif isinstance(data, dict):
+            return data.get('recognitionId')
+        
+        return None
 
     def _poll_result(self, rec_id: str, max_retries: int = 10, interval: float = 1.5) -> Dict:
         headers = {"api_key": self.api_key}
@@ -3,12 +3,15 @@ import torch
 import open_clip
 from pathlib import Path
 from PIL import Image
-from .bioclip_base import BirdRecognizer
+from .bioclip_base import BirdRecognizer, ImageInput, open_image
+from .text_cache import TextEmbeddingCache
 from typing import List, Dict, Any
 import logging
 
 class LocalBirdRecognizer(BirdRecognizer):
-    def __init__(self, model_name: str = "bioclip", device: str = None):
+    PROMPT_TEMPLATE = "a photo of {label}, a type of bird."
+
+    def __init__(self, model_name: str = "bioclip", device: str = None, cache_dir: str = "data/models"):
         if device is None or device == "auto":
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
@@ -25,8 +28,11 @@ class LocalBirdRecognizer(BirdRecognizer):
 
         logging.info(f"Loading {model_name} ({self.model_id}) on {self.device}...")
         
-        self.cached_labels = None
-        self.cached_text_features = None
+        # One text-feature matrix for every label seen; a candidate-label set
+        # (e.g. china / global) is an index into it, so switching sets is free
+        self._reset_label_features()
+        # Per-label embeddings on disk: later runs only encode labels they have not seen
+        self.text_cache = TextEmbeddingCache(cache_dir, self.model_id, self.PROMPT_TEMPLATE)
 
         try:
             self._load_model()
@@ -124,23 +130,53 @@ class LocalBirdRecognizer(BirdRecognizer):
 
         logging.info("Model loaded successfully.")
 
-    def _get_text_features(self, candidate_labels):
-        # Check if cache is valid
-        if self.cached_labels == candidate_labels and self.cached_text_features is not None:
-            logging.debug("Text features cache hit.")
-            return self.cached_text_features
+    def _reset_label_features(self):
+        """Forget the in-memory label matrix (e.g. after moving to another device)."""
+        self.label_matrix = None
+        self.label_rows = {}
+        self.label_indices = {}
+
+    def _label_index(self, candidate_labels):
+        """Rows of the label matrix for a candidate-label set, as an index tensor (cached per set)."""
+        key = tuple(candidate_labels)
+        index = self.label_indices.get(key)
+        if index is not None:
+            return index
+
+        new = [label for label in dict.fromkeys(candidate_labels) if label not in self.label_rows]
+        if new:
+            missing = self.text_cache.missing(new)
+            if missing:
+                logging.info(f"Encoding {len(missing)} new text labels (this may take a moment)...")
+                self.text_cache.add(missing, self._encode_labels(missing).float().cpu().numpy())
+            features = torch.from_numpy(self.text_cache.get(new)).to(self.device)
+            self.label_matrix = features if self.label_matrix is None else torch.cat([self.label_matrix, features])
+            for label in new:
+                self.label_rows[label] = len(self.label_rows)
+
+        index = torch.tensor([self.label_rows[label] for label in candidate_labels],
+                             dtype=torch.long, device=self.device)
+        self.label_indices[key] = index
+        return index
+
+    def _label_logits(self, image_features, index):
+        """
+        Scaled cosine similarity of normalized image features to each candidate
+        label: [B, N_Labels]. index: the candidates' rows, from _label_index.
+        """
+        # One matmul against every known label, then pick the candidate columns
+        return (100.0 * image_features @ self.label_matrix.T).index_select(1, index)
+
+    def _encode_labels(self, labels):
+        """Normalized text-tower embeddings of the prompted labels."""
+        tokens = self.tokenizer([self.PROMPT_TEMPLATE.format(label=label) for label in labels]) # CPU tensor first
 
-        logging.info(f"Cache miss. Encoding {len(candidate_labels)} text labels (this may take a moment)...")
-        
-        prompted_labels = [f"a photo of {label}, a type of bird." for label in candidate_labels]
-        tokens = self.tokenizer(prompted_labels) # CPU tensor first
-        
         # Batch processing to avoid OOM
         batch_size = 512 # Conservative batch size
         text_features_list = []
-        
+
         device_type = 'cuda' if 'cuda' in self.device else 'cpu'
-        
+
         with torch.no_grad(), torch.amp.autocast(device_type=device_type, enabled=(device_type == 'cuda')):
             for i in range(0, len(tokens), batch_size):
                 batch_tokens = tokens[i : i + batch_size].to(self.device)
@@ -148,20 +184,12 @@ class LocalBirdRecognizer(BirdRecognizer):
                 # Normalize immediately to save memory and prep for cosine sim
                 batch_features /= batch_features.norm(dim=-1, keepdim=True)
                 text_features_list.append(batch_features)
-                
-        # Concatenate all features
-        all_text_features = torch.cat(text_features_list, dim=0)
-        
-        # Update Cache
-        self.cached_labels = candidate_labels
-        self.cached_text_features = all_text_features
-        logging.info("Text features encoded and cached.")
-        
-        return all_text_features
 
-    def predict_batch(self, image_paths: List[str], candidate_labels: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        return torch.cat(text_features_list, dim=0)
+
+    def predict_batch(self, image_paths: List[ImageInput], candidate_labels: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
         """
-        Predict a batch of images.
+        Predict a batch of images (paths or in-memory PIL crops).
         Returns a list of result lists (one result list per image).
         """
         if not candidate_labels:
@@ -169,19 +197,33 @@ class LocalBirdRecognizer(BirdRecognizer):
             
         try:
             return self._do_predict_batch(image_paths, candidate_labels, top_k)
+        except torch.cuda.OutOfMemoryError:
+            # Let the caller retry with a smaller batch instead of moving to CPU
+            torch.cuda.empty_cache()
+            raise
         except RuntimeError as e:
             if "CUDA" in str(e) and self.device != "cpu":
                 logging.warning(f"CUDA batch prediction failed: {e}. Falling back to CPU.")
                 original_device = self.device
                 self.device = "cpu"
                 self.model.to("cpu")
-                self.cached_text_features = None
+                self._reset_label_features()
                 res = self._do_predict_batch(image_paths, candidate_labels, top_k)
                 return res
             else:
                 logging.error(f"Batch recognition error: {e}")
                 return [[] for _ in image_paths]
 
+    def memory_fraction(self):
+        """Share of device memory in use (CUDA only), or None on CPU."""
+        if 'cuda' not in self.device or not torch.cuda.is_available():
+            return None
+        try:
+            free, total = torch.cuda.mem_get_info()
+            return 1.0 - free / total
+        except Exception:
+            return None
+
     def _do_predict_batch(self, image_paths, candidate_labels, top_k):
         # 1. Prepare Images
         images_tensors = []
@@ -189,12 +231,12 @@ class LocalBirdRecognizer(BirdRecognizer):
         
         for idx, path in enumerate(image_paths):
             try:
-                img = Image.open(path)
+                img = open_image(path)
                 tensor = self.preprocess(img)
                 images_tensors.append(tensor)
                 valid_indices.append(idx)
             except Exception as e:
-                logging.error(f"Failed to load image for batch {path}: {e}")
+                logging.error(f"Failed to load image for batch item {idx}: {e}")
         
         if not images_tensors:
             return [[] for _ in image_paths]
@@ -202,17 +244,17 @@ class LocalBirdRecognizer(BirdRecognizer):
         # Stack: [B, C, H, W]
         image_input = torch.stack(images_tensors).to(self.device)
         
-        # 2. Get Text Features (Cached)
-        text_features = self._get_text_features(candidate_labels)
-        
+        # 2. Candidate rows of the label matrix (encodes labels seen for the first time)
+        index = self._label_index(candidate_labels)
+
         # 3. Inference
         device_type = 'cuda' if 'cuda' in self.device else 'cpu'
         with torch.no_grad(), torch.amp.autocast(device_type=device_type, enabled=(device_type == 'cuda')):
             image_features = self.model.encode_image(image_input)
             image_features /= image_features.norm(dim=-1, keepdim=True)
             
-            # MatMul: [B, Dim] @ [Dim, N_Labels] -> [B, N_Labels]
-            text_probs = (100.0 * image_features @ text_features.T).softmax(dim=-1)
+            # MatMul: [B, Dim] @ [Dim, N_All] -> candidate columns [B, N_Labels]
+            text_probs = self._label_logits(image_features, index).softmax(dim=-1)
             
         # 4. Process Results
         batch_results = [[] for _ in image_paths] # Default empty
@@ -234,7 +276,7 @@ class LocalBirdRecognizer(BirdRecognizer):
             
         return batch_results
 
-    def predict(self, image_path: str, candidate_labels: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
+    def predict(self, image_path: ImageInput, candidate_labels: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Predict using zero-shot classification via OpenCLIP.
         """
@@ -252,7 +294,7 @@ class LocalBirdRecognizer(BirdRecognizer):
                 self.device = "cpu"
                 self.model.to("cpu")
                 # Clear cache as device changed
-                self.cached_text_features = None
+                self._reset_label_features()
                 res = self._do_predict(image_path, candidate_labels, top_k)
                 # Restore device (optional, but safer to stay on CPU if CUDA is unstable)
                 # self.device = original_device
@@ -263,11 +305,11 @@ class LocalBirdRecognizer(BirdRecognizer):
                 return []
 
     def _do_predict(self, image_path, candidate_labels, top_k):
-        image = Image.open(image_path)
+        image = open_image(image_path)
         image_input = self.preprocess(image).unsqueeze(0).to(self.device)
         
-        # Get cached or new text features
-        text_features = self._get_text_features(candidate_labels)
+        # Candidate rows of the label matrix (encodes labels seen for the first time)
+        index = self._label_index(candidate_labels)
 
         # Use autocast to handle fp16/fp32 mismatches automatically
         # This is safer than manual casting for complex models like CLIP
@@ -277,9 +319,9 @@ class LocalBirdRecognizer(BirdRecognizer):
             
             # Ensure features are normalized for cosine similarity
             image_features /= image_features.norm(dim=-1, keepdim=True)
-            # Text features are already normalized in _get_text_features
+            # Text features are already normalized in the label matrix
 
-            text_probs = (100.0 * image_features @ text_features.T).softmax(dim=-1)
+            text_probs = self._label_logits(image_features, index).softmax(dim=-1)
 
         # Get top K
         top_probs, top_indices = text_probs[0].topk(min(top_k, len(candidate_labels)))
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TextEmbeddingCache:
+    """
+    Normalized text embeddings of candidate labels, persisted across runs.
+
+    Per (model ID, prompt template), data/models/text-<model slug>-<key hash>.json
+    lists the labels and names the float32 matrix holding their rows,
+    text-<model slug>-<key hash>-<generation>.npy. A matrix file is never
+    rewritten: `add` writes a new generation and then replaces the index, so
+    the index is the only file published and always matches its matrix.
+    The matrix is memory-mapped on first use, so only the rows of the labels
+    asked for are paged in. A lock file serializes writers across processes.
+    """
+
+    def __init__(self, cache_dir: str, model_id: str, template: str):
+        self.cache_dir = Path(cache_dir)
+        key = hashlib.sha256(f"{model_id}\n{template}".encode('utf-8')).hexdigest()[:12]
+        slug = model_id.split(':')[-1].replace('/', '_')
+        self.prefix = f"text-{slug}-{key}"
+        self.index_path = self.cache_dir / f"{self.prefix}.json"
+        self.lock_path = self.cache_dir / f"{self.prefix}.lock"
+        self._matrix: Optional[np.ndarray] = None
+        self._rows: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with other processes using the same cache."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _read(self):
+        """(labels, mapped matrix) as published on disk; empty if missing or inconsistent."""
+        if not self.index_path.exists():
+            return [], None
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            labels = index['labels']
+            matrix = np.load(self.cache_dir / index['matrix'], mmap_mode='r')
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable text embedding cache {self.index_path.name}: {e}")
+            return [], None
+        if len(matrix) != len(labels):
+            # Not written by this class: rebuild rather than guess which rows are whose
+            logging.warning(f"Text embedding cache {self.index_path.name} has {len(labels)} labels "
+                            f"for {len(matrix)} rows; rebuilding it")
+            return [], None
+        return labels, matrix
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        with self._file_lock():
+            labels, self._matrix = self._read()
+        self._rows = {label: i for i, label in enumerate(labels)}
+
+    def missing(self, labels: Sequence[str]) -> List[str]:
+        """Labels without a stored embedding (in order, without repeats)."""
+        with self._lock:
+            self._load()
+            return [label for label in dict.fromkeys(labels) if label not in self._rows]
+
+    def get(self, labels: Sequence[str]) -> np.ndarray:
+        """Embeddings of `labels` (all must be stored) as an in-memory [N, D] float32 array."""
+        with self._lock:
+            self._load()
+            # Fancy indexing copies just these rows out of the mapping
+            return np.asarray(self._matrix[[self._rows[label] for label in labels]], dtype=np.float32)
+
+    def add(self, labels: Sequence[str], features: np.ndarray):
+        """Store embeddings for new labels: write a new matrix generation with the rows appended."""
+        if not len(labels):
+            return
+        features = np.asarray(features, dtype=np.float32)
+        with self._lock, self._file_lock():
+            # Start from what is on disk now: another process may have added labels meanwhile
+            old_labels, old_matrix = self._read()
+            known = set(old_labels)
+            keep = [i for i, label in enumerate(labels) if label not in known]
+            all_labels = old_labels + [labels[i] for i in keep]
+            if old_matrix is not None:
+                matrix = np.concatenate([np.asarray(old_matrix), features[keep]])
+            else:
+                matrix = features[keep]
+            old_matrix = None
+            # Drop our mapping too: old generations are deleted below
+            self._matrix = None
+
+            generation = hashlib.sha256('\n'.join(all_labels).encode('utf-8')).hexdigest()[:12]
+            matrix_name = f"{self.prefix}-{generation}.npy"
+            staging = self.cache_dir / (matrix_name + '.tmp')
+            with open(staging, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(staging, self.cache_dir / matrix_name)
+            staging = self.index_path.with_name(self.index_path.name + '.tmp')
+            with open(staging, 'w', encoding='utf-8') as f:
+                json.dump({'matrix': matrix_name, 'labels': all_labels}, f, ensure_ascii=False)
+            os.replace(staging, self.index_path)
+
+            for stale in self.cache_dir.glob(f"{self.prefix}-*.npy"):
+                if stale.name != matrix_name:
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        # Still mapped by another process (Windows): removed by a later add
+                        pass
+
+            labels, self._matrix = self._read()
+            self._rows = {label: i for i, label in enumerate(labels)}
@@ -26,6 +26,7 @@ from src.metadata.exif_writer import ExifWriter # Added import
 from src.utils.config_loader import load_config
 from src.core.io.fs_manager import FileSystemManager
 from src.pipeline_runner import FeatherTracePipeline # Import Pipeline
+from src.core.raw import RAW_EXTENSIONS
 from src.core.io.path_generator import PathGenerator # Added import
 from src.web.routes.recognition import router as recognition_router
 
@@ -82,7 +83,10 @@ class TaskManager:
             log_capture.addHandler(handler)
             
             runner = FeatherTracePipeline(str(BASE_DIR / "config/settings.yaml"))
-            runner.run(start_date=start_date, end_date=end_date)
+            try:
+                runner.run(start_date=start_date, end_date=end_date)
+            finally:
+                runner.close()
             
             logging.info("Pipeline execution completed.")
         except Exception as e:
@@ -121,6 +125,8 @@ config = load_config(str(BASE_DIR / "config" / "settings.yaml"), str(BASE_DIR /
 
 db_path = BASE_DIR / config['paths']['db_path']
 processed_dir = BASE_DIR / config['paths']['output']['root_dir'] 
+# Hamming distance (dHash bits) within which sources count as near-duplicates in the duplicates view
+duplicate_distance = int(config.get('processing', {}).get('near_duplicate_distance') or 4)
 
 # Initialize FileSystemManager for security checks
 fs_manager = FileSystemManager.get_instance(config['paths'])
@@ -250,6 +256,22 @@ def index(request: Request, q: str = "", filter: str = "", date: str = "", limit
     if date:
         query_parts.append('captured_date = ?')
         params.append(date)
+
+    order_by = 'captured_date DESC, id DESC'
+    if filter == 'duplicates':
+        # Photos whose sources are near-duplicates (re-exported / resized copies)
+        manager = IOCManager(str(db_path))
+        try:
+            ids = [photo_id for group in manager.find_near_duplicates(duplicate_distance) for photo_id in group]
+        finally:
+            manager.close()
+        # Through a temp table: the group can exceed SQLite's bound-parameter limit
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS duplicate_ids (id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM duplicate_ids")
+        cursor.executemany("INSERT OR IGNORE INTO duplicate_ids (id) VALUES (?)", [(i,) for i in ids])
+        query_parts.append("id IN (SELECT id FROM temp.duplicate_ids)")
+        # Keep copies next to each other
+        order_by = 'source_phash, original_path, id'
     
     where_clause = "WHERE " + " AND ".join(query_parts) if query_parts else ""
     
@@ -259,7 +281,7 @@ def index(request: Request, q: str = "", filter: str = "", date: str = "", limit
     total_count = cursor.fetchone()[0]
     
     # Get photos
-    sql = f'SELECT * FROM photos {where_clause} ORDER BY captured_date DESC, id DESC LIMIT ? OFFSET ?'
+    sql = f'SELECT * FROM photos {where_clause} ORDER BY {order_by} LIMIT ? OFFSET ?'
     cursor.execute(sql, params + [limit, offset])
     photos = cursor.fetchall()
     
@@ -378,16 +400,14 @@ def download_raw(path: str):
 @app.post("/api/admin/reset")
 def reset_system():
     try:
-        # 1. Clear DB
-        if db_path.exists():
-            gc.collect()
-            temp_path = db_path.with_suffix(".db.del")
-            try:
-                if temp_path.exists(): os.remove(temp_path)
-                os.rename(db_path, temp_path)
-                os.remove(temp_path)
-            except: pass
-            
+        # 1. Clear ingestion state (photos, manifest, journal); the taxonomy and
+        # the detection cache stay, so reprocessing skips YOLO for known files
+        mgr = IOCManager(str(db_path))
+        try:
+            mgr.reset_processing()
+        finally:
+            mgr.close()
+
         # 2. Clear Processed
         # WARNING: This deletes the entire root output dir!
         if processed_dir.exists():
@@ -533,6 +553,24 @@ def get_photos_by_taxonomy(
         manager.close()
         conn.close()
 
+@app.get("/api/duplicates")
+def get_duplicates(max_distance: Optional[int] = None):
+    """近似重复照片分组 (感知哈希相近的源文件，如重新导出、缩放或重新保存的副本)"""
+    manager = IOCManager(str(db_path))
+    try:
+        groups = manager.find_near_duplicates(duplicate_distance if max_distance is None else max_distance)
+        result = []
+        for ids in groups:
+            photos = []
+            for p_dict in manager.get_photos(ids):
+                p_dict['web_raw_path'] = resolve_web_path(p_dict.get('original_path'))
+                p_dict['web_processed_path'] = resolve_processed_web_path(p_dict.get('file_path'))
+                photos.append(p_dict)
+            result.append(photos)
+        return result
+    finally:
+        manager.close()
+
 @app.get("/api/taxonomy/search")
 def search_taxonomy(q: str, limit: int = 20):
     """搜索分类信息（支持目、科、属、物种）"""
@@ -733,7 +771,11 @@ def update_label(req: UpdateLabelRequest):
         source_tags = tags.copy()
         source_tags["IPTC:Keywords"] = source_tags["IPTC:Keywords"] + ["FeatherTrace"]
         
-        exif_writer.write_metadata(original_path, source_tags)
+        if original_path.lower().endswith(RAW_EXTENSIONS):
+            # RAW originals are left untouched: tags go to the XMP sidecar
+            exif_writer.write_sidecar(original_path, source_tags)
+        else:
+            exif_writer.write_metadata(original_path, source_tags)
 
     return {"status": "success"}
 
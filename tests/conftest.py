@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import yaml
+from PIL import Image
+
+import src.pipeline_runner as pipeline_runner
+from src.core.io.fs_manager import FileSystemManager
+
+
+class FakeDetector:
+    """One bird per photo, without loading YOLO."""
+    model_hash = 'fake'
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def detect_batch(self, images):
+        return [[([100, 100, 300, 300], 0.9)] for _ in images]
+
+
+class FakeRecognizer:
+    def predict_batch(self, images, labels, top_k=5):
+        return [[{'scientific_name': 'Passer montanus', 'confidence': 0.9}] for _ in images]
+
+
+@pytest.fixture
+def make_pipeline(tmp_path, monkeypatch):
+    """
+    Factory for a FeatherTracePipeline over `count` 3000x2000 JPEGs in
+    tmp_path/src/20240501_Park, with fake detection and recognition.
+    Pipelines are closed at teardown.
+    """
+    pipelines = []
+
+    def make(processing=None, count=30, detector=FakeDetector, output=None):
+        source = tmp_path / "src" / "20240501_Park"
+        source.mkdir(parents=True, exist_ok=True)
+        yy, xx = np.mgrid[0:2000, 0:3000]
+        for i in range(count):
+            pixels = np.stack([(xx + i) % 256, yy % 256, (xx + yy) % 256], -1).astype('uint8')
+            Image.fromarray(pixels).save(source / f"IMG_{i}.jpg", quality=80)
+
+        config = {
+            'paths': {'allowed_roots': [str(tmp_path)],
+                      'sources': [{'path': str(tmp_path / "src"), 'recursive': True}],
+                      'output': dict({'root_dir': str(tmp_path / "out")}, **(output or {})),
+                      'db_path': str(tmp_path / "db.sqlite")},
+            'processing': dict({'device': 'cpu', 'yolo_model': 'yolov8n.pt', 'confidence_threshold': 0.5,
+                                'blur_threshold': 0, 'target_size': 320, 'crop_padding': 10},
+                               **(processing or {})),
+            'recognition': {'mode': 'local', 'region_filter': 'global'},
+        }
+        (tmp_path / "settings.yaml").write_text(yaml.safe_dump(config))
+        monkeypatch.setattr(pipeline_runner, 'BirdDetector', detector)
+        monkeypatch.setattr(FileSystemManager, '_instance', None)
+        pipeline = pipeline_runner.FeatherTracePipeline(str(tmp_path / "settings.yaml"))
+        pipeline.all_labels = ['Passer montanus']
+        pipeline._init_recognizer = lambda: setattr(pipeline, 'recognizer', FakeRecognizer())
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        if not getattr(pipeline, 'keep_open', False):
+            pipeline.close()
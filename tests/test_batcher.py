@@ -0,0 +1,34 @@
+from src.recognition.batcher import ContextBatcher
+
+def test_contexts_are_batched_separately():
+    batcher = ContextBatcher(max_batch_size=2, max_wait_ms=10_000)
+    assert batcher.add('china', 1) == []
+    assert batcher.add('global', 'a') == []
+    assert batcher.add('china', 2) == [('china', [1, 2])]
+    assert batcher.pending() == 1
+    assert batcher.drain() == [('global', ['a'])]
+
+def test_partial_batch_flushes_after_max_wait():
+    batcher = ContextBatcher(max_batch_size=8, max_wait_ms=100)
+    batcher.add('china', 1)
+    start = batcher.first_added['china']
+    assert batcher.due(now=start + 0.05) == []
+    assert batcher.due(now=start + 0.11) == [('china', [1])]
+    assert batcher.pending() == 0
+
+def test_batch_size_adapts_to_latency_and_memory():
+    batcher = ContextBatcher(max_batch_size=16, target_latency_ms=100)
+    batcher.record(16, 0.4)
+    assert batcher.batch_size == 4
+    batcher.record(4, 0.01)
+    assert batcher.batch_size == 5
+    batcher.record(5, 0.01, memory_fraction=0.95)
+    assert batcher.batch_size == 3
+
+def test_oom_caps_growth():
+    batcher = ContextBatcher(max_batch_size=16)
+    batcher.on_oom(16)
+    assert batcher.batch_size == 8
+    for _ in range(5):
+        batcher.record(8, 0.01)
+    assert batcher.batch_size == 8
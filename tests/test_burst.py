@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from src.core.burst import BurstGrouper
+
+def _crop(seed, shift=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (16, 16), dtype=np.uint8)
+    pixels = np.roll(pixels, shift, axis=1).repeat(8, axis=0).repeat(8, axis=1)
+    return Image.fromarray(pixels)
+
+def _item(folder, name, captured, crop, sharpness=50.0):
+    entry = SimpleNamespace(path=f"{folder}/{name}", name=name)
+    return {'entry': entry, 'captured_at': captured, 'crop': crop, 'sharpness': sharpness}
+
+def test_out_of_order_frames_form_one_burst():
+    grouper = BurstGrouper(max_gap=1.0, max_distance=10, max_wait_ms=60000)
+    frames = [_item('/lake', f"IMG_{i}.jpg", i * 0.3, _crop(1), sharpness=10.0 + i) for i in range(5)]
+    # Parallel stages deliver the frames out of capture order
+    for i in (3, 1, 4, 0, 2):
+        assert grouper.add(frames[i]) == []
+    groups = grouper.drain()
+    assert len(groups) == 1 and len(groups[0]) == 5
+
+    best = BurstGrouper.representative(groups[0])
+    assert best is frames[4]
+    assert len(best['burst_members']) == 4
+
+def test_other_bird_folder_or_time_start_new_groups():
+    grouper = BurstGrouper(max_gap=1.0, max_distance=10, max_wait_ms=60000)
+    grouper.add(_item('/lake', 'a.jpg', 0.0, _crop(1)))
+    grouper.add(_item('/lake', 'b.jpg', 0.2, _crop(2)))    # a different bird in the same burst
+    grouper.add(_item('/river', 'c.jpg', 0.1, _crop(1)))   # same bird, other folder
+    closed = grouper.add(_item('/lake', 'd.jpg', 5.0, _crop(1)))
+    # Time moved past the first two groups of the folder
+    assert sorted(g[0]['entry'].name for g in closed) == ['a.jpg', 'b.jpg']
+    assert sorted(g[0]['entry'].name for g in grouper.drain()) == ['c.jpg', 'd.jpg']
@@ -46,3 +46,80 @@ def test_taxonomy_search(db_manager):
     
     results_cn = db_manager.search_species("麻雀")
     assert len(results_cn) == 1
+
+def test_scan_manifest_relink(db_manager):
+    db_manager.upsert_manifest("/src/a/IMG_1.jpg", 1000, 123456789, 42, "1000_abc", "archived")
+
+    row = db_manager.get_manifest_entry("/src/a/IMG_1.jpg")
+    assert row["state"] == "archived"
+    assert row["file_hash"] == "1000_abc"
+
+    # Moved file is matched by (size, mtime, inode) without its path
+    moved = db_manager.find_manifest_match(1000, 123456789, 42, "IMG_1.jpg")
+    assert moved["source_path"] == "/src/a/IMG_1.jpg"
+
+    db_manager.relink_manifest("/src/a/IMG_1.jpg", "/src/b/IMG_1.jpg")
+    assert db_manager.get_manifest_entry("/src/a/IMG_1.jpg") is None
+    assert db_manager.get_manifest_entry("/src/b/IMG_1.jpg")["file_hash"] == "1000_abc"
+
+    # Without an inode, fall back to (size, mtime, filename)
+    assert db_manager.find_manifest_match(1000, 123456789, 0, "IMG_1.jpg") is not None
+    assert db_manager.find_manifest_match(1000, 123456789, 0, "IMG_2.jpg") is None
+
+def test_run_journal_lifecycle(db_manager):
+    path = "/src/a.jpg"
+    db_manager.journal_queue(path, "run1", 100, 5)
+    db_manager.journal_set_stage(path, 'detected', detections=[([1, 2, 3, 4], 0.9), ([5, 6, 7, 8], 0.8)],
+                                 file_hash="h1")
+    db_manager.journal_crops_recognized([(path, 0, [{"scientific_name": "Pica pica", "confidence": 0.7}])])
+    assert db_manager.journal_crop_closed(path, 0, 2, 'archived') is None
+
+    journal = db_manager.get_journal(path)
+    assert journal['stage'] == 'detected' and journal['file_hash'] == "h1"
+    assert journal['detections'] == [([1.0, 2.0, 3.0, 4.0], 0.9), ([5.0, 6.0, 7.0, 8.0], 0.8)]
+    assert journal['crops'][0]['stage'] == 'archived'
+
+    assert db_manager.journal_crop_closed(path, 1, 2, 'archived') == 'archived'
+    assert db_manager.get_journal(path) is None
+    assert db_manager.count_journal() == 0
+
+def test_run_journal_failed_crop_closes_entry(db_manager):
+    path = "/photos/b.jpg"
+    db_manager.journal_queue(path, "run1", 100, 5)
+    db_manager.journal_set_stage(path, 'detected', detections=[([1, 2, 3, 4], 0.9), ([5, 6, 7, 8], 0.8)],
+                                 file_hash="h2")
+    assert db_manager.journal_crop_closed(path, 0, 2, 'failed') is None
+    assert db_manager.journal_crop_closed(path, 1, 2) == 'failed'
+    assert db_manager.get_journal(path) is None
+
+def test_detection_cache_keyed_by_model_and_threshold(db_manager):
+    db_manager.cache_detections("h1", "m1", 0.5, [([1, 2, 3, 4], 0.9)], 4000, 3000)
+    db_manager.cache_detections("h2", "m1", 0.5, [], 800, 600)
+
+    cached = db_manager.get_cached_detections("h1", "m1", 0.5)
+    assert cached == {'detections': [([1.0, 2.0, 3.0, 4.0], 0.9)], 'width': 4000, 'height': 3000}
+    assert db_manager.get_cached_detections("h2", "m1", 0.5)['detections'] == []
+    assert db_manager.get_cached_detections("h1", "m2", 0.5) is None
+    assert db_manager.get_cached_detections("h1", "m1", 0.6) is None
+
+def test_near_duplicates_group_copies_but_not_bursts(db_manager):
+    def add(path, phash, captured_at=None):
+        db_manager.add_photo_record({'file_path': f"{path}.out", 'original_path': path,
+                                     'source_phash': phash, 'captured_at': captured_at})
+    add("/a/IMG_1.jpg", "f0f0f0f0f0f0f0f0", 100.0)
+    add("/a/IMG_1.jpg", "f0f0f0f0f0f0f0f0", 100.0)        # second bird of the same source
+    add("/export/IMG_1.jpg", "f0f0f0f0f0f0f0f1")          # re-saved copy without EXIF
+    add("/a/IMG_2.jpg", "f0f0f0f0f0f0f0f3", 100.2)        # next burst frame
+    add("/a/IMG_3.jpg", "0f0f0f0f0f0f0f0f")
+
+    assert db_manager.find_near_duplicates(4) == [[1, 2, 3]]
+
+def test_near_duplicate_groups_beyond_sqlite_variable_limit(db_manager):
+    # Default of SQLite builds before 3.32
+    db_manager.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    for i in range(1200):
+        db_manager.add_photo_record({'file_path': f"/out/{i}.jpg", 'original_path': f"/copies/{i}.jpg",
+                                     'source_phash': "f0f0f0f0f0f0f0f0"})
+    groups = db_manager.find_near_duplicates(4)
+    assert [len(group) for group in groups] == [1200]
+    assert [row['id'] for row in db_manager.get_photos(groups[0])] == list(range(1, 1201))
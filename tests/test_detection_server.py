@@ -0,0 +1,53 @@
+import threading
+from src.core.detection_server import DetectionServer
+
+class FakeDetector:
+    def __init__(self, gate):
+        self.gate = gate
+        self.batches = []
+        self.threads = set()
+        self.busy = threading.Event()
+
+    def detect_batch(self, images):
+        self.busy.set()
+        self.gate.wait()
+        self.batches.append(list(images))
+        self.threads.add(threading.get_ident())
+        return [[([0, 0, image, image], 0.9)] for image in images]
+
+def test_requests_are_merged_and_answered_in_order():
+    gate = threading.Event()
+    server = DetectionServer(lambda: FakeDetector(gate), replicas=1, max_batch_size=8)
+    try:
+        # First request occupies the replica; the next ones queue up meanwhile
+        futures = [server.submit([1])]
+        assert server.replicas[0].busy.wait(5)
+        futures += [server.submit([2, 3]), server.submit([4]), server.submit([5, 6, 7])]
+        gate.set()
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        server.close()
+
+    assert [[boxes[0][0][2] for boxes in r] for r in results] == [[1], [2, 3], [4], [5, 6, 7]]
+    replica = server.replicas[0]
+    assert replica.batches[-1] == [2, 3, 4, 5, 6, 7]
+    assert len(replica.threads) == 1
+
+def test_errors_reach_the_caller():
+    class Broken:
+        def detect_batch(self, images):
+            raise RuntimeError("boom")
+    server = DetectionServer(Broken, replicas=2)
+    try:
+        try:
+            server.detect([1])
+            assert False, "expected the detector error"
+        except RuntimeError as e:
+            assert str(e) == "boom"
+    finally:
+        server.close()
+
+def test_pipeline_runs_a_detect_worker_per_replica(make_pipeline):
+    pipeline = make_pipeline({'detector_replicas': 2, 'stages': {'detect_workers': 1}}, count=0)
+    assert pipeline.detect_workers == 2
+    assert len(pipeline.detector.replicas) == 2
@@ -0,0 +1,126 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+import src.core.detector as detector_module
+from src.core.detector import BirdDetector
+
+class FakeBoxes:
+    def __init__(self, boxes):
+        self.xyxy = torch.tensor([b for b, _, _ in boxes], dtype=torch.float32).reshape(-1, 4)
+        self.conf = torch.tensor([s for _, s, _ in boxes], dtype=torch.float32)
+        self.cls = torch.tensor([c for _, _, c in boxes], dtype=torch.float32)
+
+class FakeResult:
+    def __init__(self, boxes):
+        self.boxes = FakeBoxes(boxes)
+
+class FakeModel:
+    """
+    Per image: a bird spanning its width, a weak bird and a person.
+    Like some exported runtimes, it ignores `classes` and `conf`.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source, **kwargs):
+        self.calls.append(kwargs)
+        return [FakeResult([
+            ([0, 0, im.shape[1], im.shape[0]], 0.8, 14),
+            ([1, 1, 2, 2], 0.3, 14),
+            ([0, 0, 5, 5], 0.95, 0),
+        ]) for im in source]
+
+def _detector(confidence=0.5):
+    detector = BirdDetector.__new__(BirdDetector)
+    detector.confidence = confidence
+    detector.bird_class_id = 14
+    detector.device = 'cpu'
+    detector.reload_count = 0
+    detector.cascade = False
+    detector.model = FakeModel()
+    return detector
+
+def test_detect_batch_keeps_only_birds_in_input_order():
+    detector = _detector()
+    images = [np.zeros((h, w, 3), dtype=np.uint8) for w, h in [(1000, 800), (320, 240), (4000, 3000)]]
+    results = detector.detect_batch(images)
+
+    # One forward pass, restricted to the bird class at the configured threshold
+    assert detector.model.calls == [dict(conf=0.5, classes=[14], verbose=False, device='cpu')]
+    # The person (class 0) is dropped even though the runtime returned it
+    assert [[box for box, _ in boxes] for boxes in results] == [
+        [[0, 0, 1000, 800]], [[0, 0, 320, 240]], [[0, 0, 4000, 3000]]]
+
+def test_threshold_applies_to_every_image_in_the_batch():
+    detector = _detector(confidence=0.25)
+    results = detector.detect_batch([np.zeros((10, 10, 3), dtype=np.uint8)] * 3)
+    # Each image keeps both birds above 0.25, most confident first
+    assert [[score for _, score in boxes] for boxes in results] == [pytest.approx([0.8, 0.3])] * 3
+
+    detector.confidence = 0.9
+    assert detector.detect_batch([np.zeros((10, 10, 3), dtype=np.uint8)] * 2) == [[], []]
+
+
+def _backend_detector(tmp_path, backend='auto', device='cpu', int8=False):
+    weights = tmp_path / "yolov8n.pt"
+    weights.write_bytes(b"weights")
+    detector = BirdDetector.__new__(BirdDetector)
+    detector.backend, detector.device, detector.int8 = backend, device, int8
+    detector.model_path = str(weights)
+    detector.cache_dir = tmp_path / "models"
+    detector._model_hash = None
+    return detector
+
+@pytest.mark.parametrize("backend, device, installed, expected", [
+    ('torch', 'cpu', True, 'torch'),
+    ('auto', 'cpu', True, 'onnx'),
+    ('auto', 'cpu', False, 'torch'),
+    ('onnx', 'cpu', False, 'torch'),
+    ('openvino', 'cpu', True, 'openvino'),
+    ('onnx', 'cuda', True, 'torch'),
+])
+def test_resolve_backend(tmp_path, monkeypatch, backend, device, installed, expected):
+    monkeypatch.setattr(detector_module.importlib.util, 'find_spec', lambda name: object() if installed else None)
+    assert _backend_detector(tmp_path, backend, device)._resolve_backend() == expected
+
+class FakeYolo:
+    exports = []
+
+    def __init__(self, path, task=None):
+        self.path = path
+
+    def export(self, format, imgsz, dynamic, device):
+        FakeYolo.exports.append((format, imgsz))
+        out = Path(self.path).with_suffix('.onnx' if format == 'onnx' else '')
+        if format == 'onnx':
+            out.write_bytes(b"onnx")
+        else:
+            out = Path(str(out) + "_openvino_model")
+            out.mkdir()
+        return str(out)
+
+def test_exported_model_is_cached_per_model_size_and_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(detector_module, 'YOLO', FakeYolo)
+    monkeypatch.setattr(FakeYolo, 'exports', [])
+    detector = _backend_detector(tmp_path)
+    model_hash = detector.model_hash
+
+    onnx = detector._exported_model('onnx')
+    assert onnx == tmp_path / "models" / f"yolov8n-{model_hash}-640.onnx" and onnx.exists()
+    openvino = detector._exported_model('openvino')
+    assert openvino.name == f"yolov8n-{model_hash}-640_openvino_model"
+    # Second use loads the cached export
+    assert detector._exported_model('onnx') == onnx
+    assert FakeYolo.exports == [('onnx', 640), ('openvino', 640)]
+
+def test_failed_export_falls_back_to_torch(tmp_path, monkeypatch):
+    monkeypatch.setattr(detector_module.importlib.util, 'find_spec', lambda name: object())
+    detector = _backend_detector(tmp_path, backend='onnx')
+    def broken_export(backend):
+        raise RuntimeError("export failed")
+    detector._exported_model = broken_export
+    detector._load_torch_model = lambda: "torch model"
+    detector._load_model()
+    assert detector.active_backend == 'torch' and detector.model == "torch model"
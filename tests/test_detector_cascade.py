@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import torch
+from src.core.detector import BirdDetector
+
+class FakeBoxes:
+    def __init__(self, boxes):
+        self.xyxy = torch.tensor([b for b, _ in boxes], dtype=torch.float32).reshape(-1, 4)
+        self.conf = torch.tensor([s for _, s in boxes], dtype=torch.float32)
+        self.cls = torch.full((len(boxes),), 14.0)
+
+class FakeResult:
+    def __init__(self, boxes):
+        self.boxes = FakeBoxes(boxes)
+
+class FakeModel:
+    """Coarse pass: one confident bird and one weak candidate. Windows: a bird near their centre."""
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, source, conf, **kwargs):
+        self.calls.append(([im.shape for im in source], conf))
+        if len(self.calls) == 1:
+            return [FakeResult([([100, 100, 400, 400], 0.9), ([1500, 1000, 1520, 1020], 0.2)])]
+        return [FakeResult([([310, 310, 330, 330], 0.7)]) for _ in source]
+
+def _detector():
+    detector = BirdDetector.__new__(BirdDetector)
+    detector.confidence = 0.5
+    detector.bird_class_id = 14
+    detector.device = 'cpu'
+    detector.reload_count = 0
+    detector.cascade = True
+    detector.candidate_confidence = 0.1
+    detector.max_tiles = 4
+    detector.model = FakeModel()
+    return detector
+
+def test_cascade_refines_only_around_weak_candidates():
+    detector = _detector()
+    image = np.zeros((1500, 2000, 3), dtype=np.uint8)
+    boxes = detector.detect_batch([image])[0]
+
+    coarse, fine = detector.model.calls
+    assert coarse == ([(1500, 2000, 3)], 0.1)
+    # One native-resolution window around the weak candidate, at the normal threshold
+    assert fine == ([(640, 640, 3)], 0.5)
+    # Window for the candidate centred at (1510, 1010) starts at (1190, 690)
+    assert [b for b, _ in boxes] == [[100, 100, 400, 400], [1500, 1000, 1520, 1020]]
+    assert [s for _, s in boxes] == pytest.approx([0.9, 0.7])
+
+def test_small_frames_skip_the_fine_pass():
+    detector = _detector()
+    detector.detect_batch([np.zeros((600, 800, 3), dtype=np.uint8)])
+    assert len(detector.model.calls) == 1
+
+def test_failed_fine_pass_raises_instead_of_dropping_boxes():
+    detector = _detector()
+    coarse_predict = detector.model.predict
+
+    def predict(source, conf, **kwargs):
+        if detector.model.calls:
+            raise RuntimeError("model crashed")
+        return coarse_predict(source, conf, **kwargs)
+
+    detector.model.predict = predict
+    with pytest.raises(RuntimeError):
+        detector.detect_batch([np.zeros((1500, 2000, 3), dtype=np.uint8)])
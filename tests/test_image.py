@@ -0,0 +1,78 @@
+import io
+import os
+import numpy as np
+from PIL import Image
+from src.core.image import DecodedImage
+
+def _jpeg(img, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', **kwargs)
+    return buf.getvalue()
+
+def test_crop_matches_pil_crop():
+    rng = np.random.default_rng(0)
+    src = Image.fromarray(rng.integers(0, 255, (120, 200, 3), dtype=np.uint8))
+    decoded = DecodedImage.from_image(src)
+
+    box = [30.4, 20.6, 110.5, 90.2]
+    ours = decoded.crop(box, padding=10)
+    theirs = src.crop((box[0] - 10, box[1] - 10, box[2] + 10, box[3] + 10))
+    assert ours.size == theirs.size
+    assert np.array_equal(np.asarray(ours), np.asarray(theirs))
+
+def test_exif_orientation_applied_once():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW
+    data = _jpeg(Image.new('RGB', (200, 100), 'white'), exif=exif.tobytes())
+
+    decoded = DecodedImage.from_bytes(data)
+    assert decoded.size == (100, 200)
+    assert decoded.bgr.shape == (200, 100, 3)
+
+def test_crop_decoded_stays_in_memory(tmp_path):
+    from src.core.processor import ImageProcessor
+    decoded = DecodedImage.from_image(Image.new('RGB', (1000, 800), 'white'))
+
+    crop = ImageProcessor.crop_decoded(decoded, [100, 100, 900, 500], target_size=320, padding=0)
+    assert isinstance(crop, Image.Image)
+    assert crop.size == (320, 160)
+    assert list(tmp_path.iterdir()) == []
+
+    out = tmp_path / 'a' / 'crop.jpg'
+    ImageProcessor.save_crop(crop, str(out))
+    with Image.open(out) as img:
+        assert img.format == 'JPEG' and img.size == (320, 160)
+
+def test_crop_pool_matches_thread_crop():
+    from src.core.crop_pool import CropPool
+    from src.core.processor import ImageProcessor
+    rng = np.random.default_rng(1)
+    src = Image.fromarray(rng.integers(0, 255, (300, 400, 3), dtype=np.uint8))
+    decoded = DecodedImage.from_image(src, shared=True)
+    boxes = [[10, 20, 200, 150], [150, 100, 390, 290]]
+
+    pool = CropPool(2)
+    try:
+        results = pool.crop(decoded, boxes, target_size=128, padding=5)
+    finally:
+        pool.shutdown()
+
+    for box, (crop, jpeg) in zip(boxes, results):
+        expected = ImageProcessor.crop_decoded(decoded, box, target_size=128, padding=5)
+        assert np.array_equal(np.asarray(crop), np.asarray(expected))
+        assert jpeg[:2] == b'\xff\xd8'
+
+    name = decoded.shm_name
+    decoded.close()
+    assert not os.path.exists(f'/dev/shm/{name.lstrip("/")}')
+
+def test_reduced_decode_uses_dct_scaling():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = _jpeg(Image.new('RGB', (4000, 3000), 'white'), exif=exif.tobytes())
+
+    with DecodedImage.open(data) as img:
+        assert DecodedImage.oriented_size(img) == (3000, 4000)
+        preview = DecodedImage.reduced(img, 640)
+    # 1/4 scale keeps both edges >= 640, then EXIF rotation is applied
+    assert preview.size == (750, 1000)
@@ -0,0 +1,39 @@
+import pytest
+from pathlib import Path
+from src.core.io.local import LocalProvider
+
+def _make_tree(root: Path):
+    (root / "20240501_Park" / "sub").mkdir(parents=True)
+    (root / "20240502_Lake").mkdir()
+    (root / "@eaDir" / "thumbs").mkdir(parents=True)
+    (root / "#recycle").mkdir()
+    (root / "top.jpg").write_bytes(b"x" * 10)
+    (root / "20240501_Park" / "a.jpg").write_bytes(b"x" * 20)
+    (root / "20240501_Park" / "sub" / "b.jpg").write_bytes(b"x" * 30)
+    (root / "20240502_Lake" / "c.jpg").write_bytes(b"x" * 40)
+    (root / "@eaDir" / "thumbs" / "a.jpg").write_bytes(b"x")
+    (root / "#recycle" / "old.jpg").write_bytes(b"x")
+    (root / ".hidden.jpg").write_bytes(b"x")
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_recursive_walk_prunes_ignored_dirs(tmp_path, workers):
+    _make_tree(tmp_path)
+    provider = LocalProvider(scan_workers=workers)
+
+    entries = list(provider.list_dir(str(tmp_path), recursive=True))
+    files = {Path(e.path).relative_to(tmp_path).as_posix(): e for e in entries if not e.is_dir}
+
+    assert set(files) == {
+        "top.jpg",
+        "20240501_Park/a.jpg",
+        "20240501_Park/sub/b.jpg",
+        "20240502_Lake/c.jpg",
+    }
+    assert files["20240501_Park/sub/b.jpg"].size == 30
+    assert files["20240501_Park/sub/b.jpg"].mtime_ns > 0
+
+def test_non_recursive_list(tmp_path):
+    _make_tree(tmp_path)
+    entries = list(LocalProvider().list_dir(str(tmp_path)))
+    names = {e.name for e in entries}
+    assert names == {"top.jpg", "20240501_Park", "20240502_Lake"}
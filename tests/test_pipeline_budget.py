@@ -0,0 +1,20 @@
+import threading
+
+
+def test_tiny_decode_budget_does_not_deadlock(make_pipeline):
+    # Previews queued for detection fill the decoded-pixel budget; the crop
+    # stage's full-resolution decode must still make progress
+    pipeline = make_pipeline({
+        'decoded_budget_mb': 20, 'detect_decode_size': 640,
+        'stages': {'queue_size': 1, 'crop_workers': 1},
+    })
+    runner = threading.Thread(target=pipeline.run, daemon=True)
+    runner.start()
+    runner.join(120)
+    # A deadlocked pipeline cannot be closed
+    pipeline.keep_open = runner.is_alive()
+    assert not runner.is_alive(), "pipeline deadlocked"
+    archived = pipeline.db.conn.execute(
+        "SELECT count(*) FROM scan_manifest WHERE state = 'archived'").fetchone()[0]
+    assert archived == 30
+    assert pipeline.db.count_journal() == 0
@@ -0,0 +1,30 @@
+import time
+import threading
+from src.core.io.prefetch import ByteBudget
+
+def test_budget_blocks_until_release():
+    budget = ByteBudget(300)
+    for _ in range(3):
+        budget.acquire(100)
+    assert not budget.try_acquire(100)
+
+    acquired = threading.Event()
+    def reader():
+        budget.acquire(100)
+        acquired.set()
+    t = threading.Thread(target=reader)
+    t.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+
+    budget.release(100)
+    t.join(timeout=1)
+    assert acquired.is_set()
+    assert budget.used == 300
+
+def test_oversized_item_allowed_alone():
+    budget = ByteBudget(100)
+    budget.acquire(500)
+    assert not budget.try_acquire(1)
+    budget.release(500)
+    assert budget.try_acquire(100)
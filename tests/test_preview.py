@@ -0,0 +1,39 @@
+import io
+from datetime import datetime
+
+import pytest
+from PIL import Image
+from src.core.preview import HEAD_BYTES, parse_jpeg_header
+
+def test_parse_mpf_preview_and_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buf = io.BytesIO()
+    Image.new('RGB', (4000, 3000), 'red').save(
+        buf, format='MPO', save_all=True,
+        append_images=[Image.new('RGB', (1600, 1200), 'blue')], exif=exif.tobytes())
+    data = buf.getvalue()
+
+    info = parse_jpeg_header(data[:HEAD_BYTES])
+    assert (info.width, info.height) == (4000, 3000)
+    assert info.oriented_size == (3000, 4000)
+
+    offset, length = info.largest_preview()
+    with Image.open(io.BytesIO(data[offset:offset + length])) as preview:
+        assert preview.size == (1600, 1200)
+
+def test_plain_jpeg_has_no_preview():
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 48)).save(buf, format='JPEG')
+    info = parse_jpeg_header(buf.getvalue())
+    assert (info.width, info.height) == (64, 48)
+    assert info.largest_preview() is None
+    assert parse_jpeg_header(b'not a jpeg') is None
+
+def test_capture_time_from_exif():
+    exif = Image.Exif()
+    exif[0x8769] = {0x9003: '2024:07:02 08:00:01', 0x9291: '25'}
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 48)).save(buf, format='JPEG', exif=exif)
+    info = parse_jpeg_header(buf.getvalue())
+    assert info.captured_at == pytest.approx(datetime(2024, 7, 2, 8, 0, 1, 250000).timestamp())
@@ -0,0 +1,19 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageFilter
+from src.core.quality import QualityChecker
+
+def test_batched_sharpness_matches_opencv_and_ranks_blur():
+    rng = np.random.default_rng(0)
+    sharp = Image.fromarray(rng.integers(0, 255, (300, 400, 3), dtype=np.uint8))
+    soft = sharp.filter(ImageFilter.GaussianBlur(3)).resize((200, 150))
+
+    scores = QualityChecker.sharpness_scores([sharp, soft])
+    assert scores[0] > 100 * scores[1]
+    # Different sizes in one batch: padding must not leak into the smaller crop
+    alone = QualityChecker.sharpness_scores([soft])[0]
+    assert abs(scores[1] - alone) < 1e-6
+
+    gray = cv2.cvtColor(np.asarray(sharp), cv2.COLOR_RGB2GRAY)
+    reference = cv2.Laplacian(gray, cv2.CV_64F).var()
+    assert abs(scores[0] - reference) / reference < 0.01
@@ -0,0 +1,135 @@
+import io
+import struct
+from datetime import datetime
+from PIL import Image
+from src.core.raw import locate_raw_previews
+
+def _jpeg(size, captured=None):
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if captured:
+        exif.get_ifd(0x8769)[0x9003] = captured
+    Image.new('RGB', size, 'white').save(buf, format='JPEG', exif=exif)
+    return buf.getvalue()
+
+def _box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+def _reader(data, reads):
+    def read_range(offset, length):
+        reads.append((offset, length))
+        return data[offset:offset + length]
+    return read_range
+
+def test_nef_previews_from_ifd0_and_subifd():
+    small, full = _jpeg((800, 600)), _jpeg((4000, 3000))
+    # IFD0 at 8 (orientation, small preview, SubIFDs -> 64), SubIFD: full-size JPEG
+    small_at = 96
+    full_at = small_at + len(small)
+    ifd0 = struct.pack('<H', 4)
+    ifd0 += struct.pack('<HHIHH', 0x0112, 3, 1, 8, 0)
+    ifd0 += struct.pack('<HHII', 0x014A, 4, 1, 64)
+    ifd0 += struct.pack('<HHII', 0x0201, 4, 1, small_at)
+    ifd0 += struct.pack('<HHII', 0x0202, 4, 1, len(small))
+    ifd0 += struct.pack('<I', 0)
+    sub = struct.pack('<H', 2)
+    sub += struct.pack('<HHII', 0x0201, 4, 1, full_at)
+    sub += struct.pack('<HHII', 0x0202, 4, 1, len(full))
+    sub += struct.pack('<I', 0)
+    data = b'II*\x00' + struct.pack('<I', 8) + ifd0
+    data = data.ljust(64, b'\x00') + sub
+    data = data.ljust(small_at, b'\x00') + small + full
+
+    previews = locate_raw_previews(_reader(data, []), len(data), '.NEF')
+    assert previews.orientation == 8
+    assert previews.largest.offset == full_at
+    assert (previews.largest.width, previews.largest.height) == (4000, 3000)
+    assert previews.smallest_at_least(600).offset == small_at
+    assert previews.sensor_size is None and not previews.reduced
+
+def test_arw_preview_below_sensor_size_is_reduced():
+    preview = _jpeg((1616, 1080))
+    # IFD0: JPEG preview; next IFD: the raw data (6048x4024, Sony compression)
+    preview_at = 200
+    ifd0 = struct.pack('<H', 2)
+    ifd0 += struct.pack('<HHII', 0x0201, 4, 1, preview_at)
+    ifd0 += struct.pack('<HHII', 0x0202, 4, 1, len(preview))
+    ifd0 += struct.pack('<I', 64)
+    raw_ifd = struct.pack('<H', 3)
+    raw_ifd += struct.pack('<HHII', 0x0100, 4, 1, 6048)
+    raw_ifd += struct.pack('<HHII', 0x0101, 4, 1, 4024)
+    raw_ifd += struct.pack('<HHIHH', 0x0103, 3, 1, 32767, 0)
+    raw_ifd += struct.pack('<I', 0)
+    data = b'II*\x00' + struct.pack('<I', 8) + ifd0
+    data = data.ljust(64, b'\x00') + raw_ifd
+    data = data.ljust(preview_at, b'\x00') + preview
+
+    previews = locate_raw_previews(_reader(data, []), len(data), '.ARW')
+    assert previews.sensor_size == (6048, 4024)
+    assert previews.reduced
+
+def test_capture_time_from_container_exif_ifd():
+    preview = _jpeg((1616, 1080))
+    # IFD0: JPEG preview + Exif IFD at 64 (DateTimeOriginal at 100, SubSecTimeOriginal "25")
+    preview_at = 200
+    ifd0 = struct.pack('<H', 3)
+    ifd0 += struct.pack('<HHII', 0x0201, 4, 1, preview_at)
+    ifd0 += struct.pack('<HHII', 0x0202, 4, 1, len(preview))
+    ifd0 += struct.pack('<HHII', 0x8769, 4, 1, 64)
+    ifd0 += struct.pack('<I', 0)
+    exif = struct.pack('<H', 2)
+    exif += struct.pack('<HHII', 0x9003, 2, 20, 100)
+    exif += struct.pack('<HHI', 0x9291, 2, 3) + b'25\x00\x00'
+    exif += struct.pack('<I', 0)
+    data = b'II*\x00' + struct.pack('<I', 8) + ifd0
+    data = data.ljust(64, b'\x00') + exif
+    data = data.ljust(100, b'\x00') + b'2024:05:01 08:00:00\x00'
+    data = data.ljust(preview_at, b'\x00') + preview
+
+    previews = locate_raw_previews(_reader(data, []), len(data), '.nef')
+    assert previews.captured_at == datetime(2024, 5, 1, 8, 0, 0).timestamp() + 0.25
+
+def test_raf_reads_header_only():
+    jpeg = _jpeg((1920, 1280), captured="2024:05:01 08:00:00")
+    header = b'FUJIFILMCCD-RAW 0201FF383501'.ljust(84, b'\x00')
+    header += struct.pack('>II', 200, len(jpeg))
+    # RAF directory: RawImageFullSize (height, width)
+    directory = struct.pack('>IHHHH', 1, 0x100, 4, 4160, 6240)
+    header += struct.pack('>II', 120, len(directory))
+    data = header.ljust(120, b'\x00') + directory
+    data = data.ljust(200, b'\x00') + jpeg + b'\x00' * 1_000_000
+
+    reads = []
+    previews = locate_raw_previews(_reader(data, reads), len(data), '.raf')
+    assert previews.orientation is None
+    assert (previews.largest.width, previews.largest.height) == (1920, 1280)
+    assert previews.sensor_size == (6240, 4160) and previews.reduced
+    # RAF keeps the capture time in the embedded JPEG's EXIF only
+    assert previews.captured_at == datetime(2024, 5, 1, 8, 0, 0).timestamp()
+    assert sum(length for _, length in reads) < 512 * 1024
+
+def test_cr3_track_and_prvw():
+    full, prvw = _jpeg((6000, 4000)), _jpeg((1620, 1080))
+    def layout(full_at):
+        stsz = _box(b'stsz', struct.pack('>III', 0, len(full), 1))
+        co64 = _box(b'co64', struct.pack('>IIQ', 0, 1, full_at))
+        trak = _box(b'trak', _box(b'mdia', _box(b'minf', _box(b'stbl', stsz + co64))))
+        # CMT2: the Exif IFD as a TIFF of its own (DateTimeOriginal at 26)
+        cmt2 = b'II*\x00' + struct.pack('<IH', 8, 1) + struct.pack('<HHII', 0x9003, 2, 20, 26) + struct.pack('<I', 0)
+        cmt2 = _box(b'CMT2', cmt2 + b'2024:05:01 08:00:00\x00')
+        meta = struct.pack('>I4s', 8 + 16 + len(cmt2), b'uuid') + b'\x00' * 16 + cmt2
+        moov = _box(b'moov', meta + trak)
+        prvw_box = _box(b'PRVW', struct.pack('>IHHHHI', 0, 1, 1620, 1080, 1, len(prvw)) + prvw)
+        uuid = struct.pack('>I4s', 8 + 16 + 8 + len(prvw_box), b'uuid') + b'\x00' * 16 + b'\x00' * 8 + prvw_box
+        head = _box(b'ftyp', b'crx ') + moov + uuid
+        return head + _box(b'mdat', full)
+    data = layout(0)
+    data = layout(len(data) - len(full))
+
+    previews = locate_raw_previews(_reader(data, []), len(data), '.cr3')
+    assert (previews.largest.width, previews.largest.height) == (6000, 4000)
+    assert not previews.reduced
+    assert previews.captured_at == datetime(2024, 5, 1, 8, 0, 0).timestamp()
+    small = previews.smallest_at_least(640)
+    assert (small.width, small.height) == (1620, 1080)
+    assert data[small.offset:small.offset + 2] == b'\xff\xd8'
@@ -0,0 +1,80 @@
+import os
+import pytest
+from pathlib import Path
+from src.pipeline_runner import SmartScanner
+from src.metadata.ioc_manager import IOCManager
+
+@pytest.fixture
+def db():
+    mgr = IOCManager(":memory:")
+    yield mgr
+    mgr.close()
+
+def _make_tree(root: Path):
+    for folder, files in {
+        "20240428_Park": ["a.jpg"],
+        "20240505_Lake": ["b.jpg", "c.JPG", "notes.txt"],
+        "20240520-25_Trip/Day1": ["d.jpg"],
+        "20240610_Forest": ["e.jpg"],
+    }.items():
+        (root / folder).mkdir(parents=True)
+        for name in files:
+            (root / folder / name).write_bytes(b"x" * 10)
+
+def _scan(root, db, start="20240501", end="20240531"):
+    scanner = SmartScanner(root, start, end, db=db)
+    entries = list(scanner.scan(root))
+    # Record files the way the pipeline does, so unchanged folders can be served from the manifest
+    for e in entries:
+        if e.name.lower().endswith((".jpg", ".jpeg")):
+            db.upsert_manifest(e.path, e.size, e.mtime_ns, e.inode, None, "archived")
+    return sorted(Path(e.path).name for e in entries)
+
+def test_indexed_scan_prunes_by_date(tmp_path, db):
+    _make_tree(tmp_path)
+    assert _scan(tmp_path, db) == ["b.jpg", "c.JPG", "d.jpg", "notes.txt"]
+
+def test_indexed_scan_skips_unchanged_folders(tmp_path, db, monkeypatch):
+    _make_tree(tmp_path)
+    _scan(tmp_path, db)
+
+    listed = []
+    real_scandir = os.scandir
+    def counting_scandir(path):
+        listed.append(str(path))
+        return real_scandir(path)
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+
+    # Nothing changed: folders are served from the index and manifest
+    assert _scan(tmp_path, db) == ["b.jpg", "c.JPG", "d.jpg"]
+    assert listed == []
+
+    # A new file only forces its own folder to be listed again
+    (tmp_path / "20240505_Lake" / "f.jpg").write_bytes(b"y")
+    os.utime(tmp_path / "20240505_Lake", ns=(1, 1))
+    assert "f.jpg" in _scan(tmp_path, db)
+    assert [Path(p).name for p in listed] == ["20240505_Lake"]
+
+    # Out-of-range folders were indexed too, so another range jumps straight to them
+    listed.clear()
+    assert _scan(tmp_path, db, "20240601", "20240630") == ["e.jpg"]
+    assert [Path(p).name for p in listed] == ["20240610_Forest"]
+
+def test_rescan_finds_in_place_edits(tmp_path, make_pipeline):
+    pipeline = make_pipeline(count=2)
+    pipeline.run()
+    # Same size and mtime, different content
+    edited = tmp_path / "src" / "20240501_Park" / "IMG_0.jpg"
+    stat = edited.stat()
+    data = bytearray(edited.read_bytes())
+    data[-100:-2] = bytes(98)
+    edited.write_bytes(bytes(data))
+    os.utime(edited, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    photos = lambda: pipeline.db.conn.execute("SELECT count(*) FROM photos").fetchone()[0]
+    pipeline.run()
+    assert photos() == 2
+    pipeline.run(rescan=True)
+    assert photos() == 3
+    states = [row[0] for row in pipeline.db.conn.execute("SELECT state FROM scan_manifest")]
+    assert states == ['archived', 'archived']
@@ -0,0 +1,76 @@
+import threading
+from src.core.stages import Stage, StagedPipeline
+
+def test_stages_fan_out_filter_and_flush():
+    collected = []
+    lock = threading.Lock()
+    buffer = []
+
+    def batch(x):
+        buffer.append(x)
+        if len(buffer) == 4:
+            out = [list(buffer)]
+            buffer.clear()
+            return out
+        return None
+
+    def flush():
+        return [list(buffer)] if buffer else None
+
+    def sink(b):
+        with lock:
+            collected.append(sorted(b))
+
+    StagedPipeline([
+        Stage('filter', lambda x: [x] if x % 2 else None, workers=3, queue_size=2),
+        Stage('fan_out', lambda x: [x, x * 10], workers=2, queue_size=2),
+        Stage('batch', batch, workers=1, flush=flush),
+        Stage('sink', sink, workers=2),
+    ]).run(range(10))
+
+    values = sorted(v for b in collected for v in b)
+    assert values == sorted([1, 3, 5, 7, 9] + [10, 30, 50, 70, 90])
+    # 10 items in batches of 4 -> 4 + 4 + flushed remainder of 2
+    assert sorted(len(b) for b in collected) == [2, 4, 4]
+
+def test_stage_errors_call_on_error_and_continue():
+    failed = []
+    done = []
+
+    def boom(x):
+        if x == 3:
+            raise RuntimeError("bad item")
+        return [x]
+
+    StagedPipeline([
+        Stage('boom', boom, workers=2, on_error=lambda item, e: failed.append(item)),
+        Stage('sink', lambda x: done.append(x)),
+    ]).run(range(6))
+
+    assert failed == [3]
+    assert sorted(done) == [0, 1, 2, 4, 5]
+
+def test_idle_hook_emits_between_items():
+    import time
+    collected = []
+    pending = []
+
+    def source():
+        yield 1
+        time.sleep(0.2)
+        yield 2
+
+    def hold(x):
+        pending.append(x)
+        return None
+
+    def idle():
+        out = list(pending)
+        pending.clear()
+        return out
+
+    StagedPipeline([
+        Stage('hold', hold, on_idle=idle, idle_timeout=0.02, flush=idle),
+        Stage('sink', collected.append),
+    ]).run(source())
+    assert collected == [1, 2]
@@ -0,0 +1,70 @@
+import json
+import numpy as np
+import torch
+from src.recognition.inference_local import LocalBirdRecognizer
+from src.recognition.text_cache import TextEmbeddingCache
+
+def test_embeddings_persist_per_model_and_template(tmp_path):
+    cache = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "a photo of {label}.")
+    assert cache.missing(["Pica pica", "Passer montanus", "Pica pica"]) == ["Pica pica", "Passer montanus"]
+    cache.add(["Pica pica", "Passer montanus"], np.eye(2, 4))
+
+    # A new process maps the file and only misses the new label
+    reopened = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "a photo of {label}.")
+    assert reopened.missing(["Passer montanus", "Corvus corax"]) == ["Corvus corax"]
+    reopened.add(["Corvus corax"], np.full((1, 4), 0.5))
+    assert reopened.get(["Corvus corax", "Pica pica"]).tolist() == [[0.5] * 4, [1, 0, 0, 0]]
+
+    other = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    assert other.missing(["Pica pica"]) == ["Pica pica"]
+
+def _recognizer(cache_dir, encoded):
+    rec = LocalBirdRecognizer.__new__(LocalBirdRecognizer)
+    rec.device = 'cpu'
+    rec._reset_label_features()
+    rec.text_cache = TextEmbeddingCache(str(cache_dir), "hf-hub:imageomics/bioclip", rec.PROMPT_TEMPLATE)
+    # Label i of the alphabet -> unit vector i
+    rec._encode_labels = lambda labels: encoded.append(list(labels)) or torch.eye(4)[[ord(l[0]) - ord('A') for l in labels]]
+    return rec
+
+def test_recognizer_encodes_only_new_labels(tmp_path):
+    encoded = []
+    _recognizer(tmp_path, encoded)._label_index(["A a", "B b"])
+    # Next process: the first two come from disk
+    _recognizer(tmp_path, encoded)._label_index(["B b", "C c", "A a"])
+    assert encoded == [["A a", "B b"], ["C c"]]
+
+def test_label_subsets_index_one_matrix(tmp_path):
+    encoded = []
+    rec = _recognizer(tmp_path, encoded)
+    global_labels, china_labels = ["A a", "B b", "C c", "D d"], ["C c", "A a"]
+    image_features = torch.tensor([[0.0, 0.0, 1.0, 0.0]])
+
+    assert rec._label_logits(image_features, rec._label_index(global_labels)).tolist() == [[0, 0, 100, 0]]
+    assert rec._label_logits(image_features, rec._label_index(china_labels)).tolist() == [[100, 0]]
+    rec._label_logits(image_features, rec._label_index(global_labels))
+    # The subset reuses the rows of the global set: encoded once, one matrix
+    assert encoded == [global_labels]
+    assert rec.label_matrix.shape == (4, 4)
+
+def test_concurrent_writers_keep_labels_and_rows_aligned(tmp_path):
+    first = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    second = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    assert second.missing(["B", "A"]) == ["B", "A"]
+    first.add(["A"], np.full((1, 2), 1.0))
+    # Second writer loaded before the first wrote: it must merge, not overwrite
+    second.add(["B", "A"], np.array([[2.0, 2.0], [9.0, 9.0]]))
+
+    reopened = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    assert reopened.get(["A", "B"]).tolist() == [[1.0, 1.0], [2.0, 2.0]]
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+def test_mismatched_index_is_rebuilt(tmp_path):
+    cache = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    cache.add(["A", "B"], np.eye(2))
+    index = json.loads(cache.index_path.read_text())
+    index['labels'].append("C")
+    cache.index_path.write_text(json.dumps(index))
+
+    reopened = TextEmbeddingCache(str(tmp_path), "hf-hub:imageomics/bioclip", "{label}")
+    assert reopened.missing(["A", "C"]) == ["A", "C"]
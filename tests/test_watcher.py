@@ -0,0 +1,34 @@
+import time
+import threading
+from src.core.io.watcher import DirectoryWatcher
+
+def test_polling_watcher_batches_new_jpegs(tmp_path):
+    (tmp_path / "20240501_Park").mkdir()
+    (tmp_path / "existing.jpg").write_bytes(b"x")
+
+    batches = []
+    stop = threading.Event()
+    watcher = DirectoryWatcher(
+        [str(tmp_path)], batches.append,
+        debounce_seconds=0.3, poll_interval=0.1, backend="poll"
+    )
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        time.sleep(0.3)
+        (tmp_path / "20240501_Park" / "a.jpg").write_bytes(b"a")
+        (tmp_path / "20240501_Park" / "b.JPEG").write_bytes(b"b")
+        (tmp_path / "20240501_Park" / "notes.txt").write_bytes(b"c")
+        (tmp_path / "@eaDir").mkdir()
+        (tmp_path / "@eaDir" / "thumb.jpg").write_bytes(b"d")
+
+        deadline = time.time() + 5
+        while not batches and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join()
+
+    # Pre-existing files are not reported; the card dump arrives as one batch
+    assert len(batches) == 1
+    assert [p.replace("\\", "/").split("/")[-1] for p in batches[0]] == ["a.jpg", "b.JPEG"]